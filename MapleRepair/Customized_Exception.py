@@ -1,3 +1,5 @@
+from func_timeout import FunctionTimedOut
+
 class DispatchError(Exception):
     def __init__(self, message=''):
         self.message = message
@@ -21,4 +23,30 @@ class NoSuchTableError(Exception):
 class NoSuchColumnError(Exception):
     def __init__(self, message=''):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+        
+class QueryTimedOut(FunctionTimedOut):
+    """
+    Raised when a SQL query exceeds its deadline (see MapleRepair/utils/deadline.py).
+    Subclass of `FunctionTimedOut`, so existing `except FunctionTimedOut` branches still apply.
+    """
+    def __init__(self, message='', timeout=None):
+        self.message = message
+        super().__init__(msg=message, timedOutAfter=timeout)
+
+class LLMCacheMissError(Exception):
+    """
+    Raised in replay mode (`LLM_CACHE_MODE=replay`) when a request is not in the LLM response cache.
+    """
+    def __init__(self, message=''):
+        self.message = message
+        super().__init__(self.message)
+
+class StoredQueryError(Exception):
+    """
+    Failure of a gold query replayed from the gold result store (see MapleRepair/utils/gold_store.py),
+    the message is the one of the original sqlite error.
+    """
+    def __init__(self, message=''):
+        self.message = message
+        super().__init__(self.message)
@@ -2,13 +2,13 @@ import re
 import csv
 import sqlite3
 from typing import Dict, Any, Tuple
-from qdrant_client import QdrantClient
-from typing import List, Optional, Union, Tuple
+from typing import List, Optional, Union, Tuple, Iterable
 from copy import deepcopy
 import pickle
+import os
 from MapleRepair.utils.format import read_json
 import time
-from MapleRepair.utils.persistence import make_log
+from MapleRepair.utils.persistence import get_log_sink
 import json
 
 from MapleRepair.config import dataset
@@ -18,15 +18,26 @@ from MapleRepair.dataset_utils.science_benchmark import Sciencebenchmark_Initali
 
 from MapleRepair.config import *
 from MapleRepair.utils.nlp import is_date, is_time, is_number
-from MapleRepair.utils.ds import TableColumnPair, DSU
+from MapleRepair.utils.profiler import Table_Profile, Column_Profile, profile_table, sample_columns, infer_format
+from MapleRepair.utils.ds import TableColumnPair, DSU, Value_Index
 from MapleRepair.Customized_Exception import NoSuchTableError, NoSuchColumnError
-from MapleRepair.order_check import _is_orderable
-from func_timeout import func_set_timeout, FunctionTimedOut
+from MapleRepair.utils.sqlite_pool import connection_pool
+from MapleRepair.utils.deadline import Query_Deadline
+from MapleRepair.utils.cache import LRU_Cache, Result_Cache, normalize_sql
+from MapleRepair.utils.result_compare import materialize, query_fingerprint, results_match
+from MapleRepair.utils.gold_store import gold_store
+from MapleRepair.utils.vector_store import make_vector_store, sync_collection
+from func_timeout import FunctionTimedOut
 
 from concurrent.futures.process import ProcessPoolExecutor
-from concurrent.futures import as_completed
+from concurrent.futures import as_completed, ThreadPoolExecutor
+import uuid
 
 import base64
+import hashlib
+
+# most frequent values of a column the schema prompt shows
+PROMPT_TOP_VALUES = 100
 
 def encode_string(input_string):
     # 将字符串转换为字节
@@ -194,10 +205,8 @@ class Schema_Prompt_Builder():
             # FIXME: SPEED UP!!!
             values = self._load_unique_column_values_str(table, column_name)
             if not values:
-                sql = f"SELECT `{column_name}` FROM `{table}` GROUP BY `{column_name}` ORDER BY COUNT(*) DESC LIMIT 100"
-                cursor.execute(sql)
-                values = cursor.fetchall()
-                values = [value[0] for value in values]
+                # SELECT `column_name` FROM `table` GROUP BY `column_name` ORDER BY COUNT(*) DESC LIMIT 100
+                values = DBs[self.db_id].column_profile(table, column_name).top_values(PROMPT_TOP_VALUES)
                 self._save_unique_column_values_str(table, column_name, values)
 
             values_str = ''
@@ -382,6 +391,8 @@ class Schema_Prompt_Builder():
             all_sqlite_column_names_lst, all_sqlite_column_types_lst = self._get_column_attributes(cursor, tb_name)
             col_to_values_str_lst = self._get_unique_column_values_str(cursor, tb_name, all_sqlite_column_names_lst, all_sqlite_column_types_lst, is_key_column_lst)
             table_unique_column_values[tb_name] = col_to_values_str_lst
+            # the prompt is the last consumer of the profile
+            dbs.release_profiles(tb_name)
         
         cursor.close()
         # print table_name and primary keys
@@ -571,7 +582,27 @@ class Schema_Prompt_Builder():
         # print(db_schema)
         # print(db_fk)
         return db_schema, db_fk
+# bump when the content of derived artifacts changes, older snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+# attributes of `Database` stored in its snapshot (the date / time formats are part of `schema`)
+SNAPSHOT_ATTRIBUTES = ('schema', 'pkfk', '_schema4sqlglot', 'disjoint_set', 'fk_relationship', 'value_index', 'schema_prompt', 'fk_prompt')
+
+def _settings_digest() -> str:
+    # settings (see MapleRepair/config.py) the derived artifacts depend on, snapshots built with other values are rebuilt
+    settings = {
+        'date_format_samples': date_format_samples,
+        'date_format_scan_rows': date_format_scan_rows,
+        'date_format_min_coverage': date_format_min_coverage,
+        'nlp_backend': nlp_backend,
+        'profile_max_distinct': profile_max_distinct,
+        'profile_max_length': profile_max_length,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
 class Database():    
+    # (db_id, normalized statement) -> fetched rows, shared by all databases of a process
+    result_cache = Result_Cache(result_cache_mib * 1024 * 1024)
+    
     def __init__(self, db_id:str, _dataset:str, _data_split:str):
         print(f'Initializing database {db_id}...')
         self.db_id = db_id
@@ -581,6 +612,23 @@ class Database():
         self.dataset = _dataset
         self.data_split = _data_split
         
+        # (db_id, normalized statement) -> (exception type, sqlite error) | (None, None) if executable
+        self.explain_cache = LRU_Cache(explain_cache_size)
+        # (distinct value collection, text, top_k) -> [(value, score)], see `val_vec_query_batch`
+        self.val_vec_cache = LRU_Cache(vector_query_cache_size)
+        
+        #HACK: better implementation
+        self.schema_prompt = None
+        self.fk_prompt = None
+        
+        # table -> Table_Profile, shared by the initialization steps, see `table_profile`
+        self._profiles:Dict[str, Table_Profile] = {}
+        
+        # every derived artifact incl. the schema prompt, see `load_snapshot`
+        self.from_snapshot = self.load_snapshot()
+        if self.from_snapshot:
+            return
+        
         if self.dataset == 'BIRD':
             self.schema, self.pkfk = Bird_Initializer(db_id).do_init()
         elif self.dataset == 'SCIENCE_BENCHMARK':
@@ -592,33 +640,73 @@ class Database():
         
         # self.conn:sqlite3.Connection = None
 
-        if not self.load_database():
-            self.init_orderable()
-            self.add_date_time_format()
-            self.add_distinct_value()
-            self.save_database()
+        # one table at a time, only the values the schema prompt needs are kept of a profiled table
+        for table in self.schema.keys():
+            self.init_orderable([table])
+            self.add_date_time_format([table])
+            self.add_distinct_value([table])
+            if table in self._profiles:
+                self._profiles[table].compact(PROMPT_TOP_VALUES)
             
         self._schema4sqlglot = self.init_schema4sqlglot()
-        
-        #HACK: better implementation
-        self.schema_prompt = None
-        self.fk_prompt = None
            
         self.init_disjoint_set()
         assert self.disjoint_set is not None
         self.init_fk_relationship() #NOTE for testing purpose
         assert self.fk_relationship is not None
+        # lowercased distinct value -> [(table, column, value)]
+        self.value_index = Value_Index(self.schema)
         
         # after init, close conn -> Resources like Connection can not be transfer between process
         # self.conn.close()
         # self.conn:sqlite3.Connection = None
         
+    def __getstate__(self) -> dict:
+        # profiles are only needed during initialization, never ship them to other processes
+        state = self.__dict__.copy()
+        state['_profiles'] = {}
+        return state
+    
+    def table_profile(self, table:str) -> Table_Profile:
+        """
+        Profile of `table`, its columns are profiled on first use by `column_profile` (see MapleRepair/utils/profiler.py).
+        """
+        if table not in self._profiles:
+            self._profiles[table] = Table_Profile(table, {})
+        return self._profiles[table]
+    
+    def column_profile(self, table:str, column:str) -> Column_Profile:
+        """
+        Profile of `table`.`column`, profiled on first use.
+        """
+        profile = self.table_profile(table)
+        if profile.column(column) is None:
+            with connection_pool.connection(self.db_path) as conn:
+                profile.add_column(profile_table(conn, table, [column], self.execute_query).columns[column])
+        return profile.column(column)
+    
+    def release_profiles(self, table:Optional[str]=None) -> None:
+        """
+        Drop the profile of `table`, of every table by default.
+        """
+        if table is None:
+            self._profiles = {}
+        else:
+            self._profiles.pop(table, None)
+    
     def init_vecDB(self) -> None:
         # For parallel, sources (vector database) can not be transfer between process!
         # must be call after __init__
-        self.vecDB_client = QdrantClient("localhost", port=6333)
+        self.connect_vecDB()
         self.column_desc_vectorize()
         self.distinct_val_vectorize()
+        self.val_vec_cache.clear()
+        
+    def connect_vecDB(self) -> None:
+        """
+        (Re-)create the vector store client (VECTOR_STORE), e.g. in a forked worker process.
+        """
+        self.vecDB_client = make_vector_store()
         
     def init_schema4sqlglot(self) -> dict:
         schema = {}
@@ -629,63 +717,54 @@ class Database():
             schema[table_name] = {column[1]:column[2] for column in columns}
         return schema
     
-    def add_date_time_format(self) -> None:
-        for table in self.schema.keys():
-            for col in self.schema[table].keys():
-                if self.schema[table][col]['type'] not in ('TEXT', 'DATE'):
-                    continue
-                sample_data = self.execute_query(f"SELECT `{col}` FROM `{table}` \
-                                                   WHERE `{col}` IS NOT NULL AND `{col}` != '' \
-                                                   LIMIT 1")
+    def add_date_time_format(self, tables:Optional[Iterable[str]]=None) -> None:
+        """
+        Infer the date / time format of TEXT and DATE columns from `date_format_samples` values per column,
+        sampled with one query per table (see `sample_columns`). The format covering most samples is stored with its coverage
+        ('date_format', 'date_format_coverage', 'time_format', 'time_format_coverage').
+        """
+        for table in (self.schema.keys() if tables is None else tables):
+            columns = [col for col in self.schema[table].keys() if self.schema[table][col]['type'] in ('TEXT', 'DATE')]
+            samples = sample_columns(self.execute_query, table, columns)
+            for col in columns:
+                sample_data = samples[col]
                 if not sample_data:
                     continue
-                #NOTE: 日期格式的识别
-                sample_data = sample_data[0][0]
-                if not isinstance(sample_data, str):
-                    sample_data = str(sample_data)
                 
-                if is_date(sample_data) or self.schema[table][col]['type'] == 'DATE':
-                    for date_pattern,  strftime_pattern in DATE_FORMATS:
-                        try:
-                            if re.match(date_pattern, sample_data):
-                                self.schema[table][col]['date_format'] = (date_pattern, strftime_pattern)
-                                print(f'{table}.{col} date format: {date_pattern}')
-                                break
-                        except Exception as e:
-                            print(f'Error when matching date pattern {date_pattern} on {sample_data}')
-                            print(f'db_id: {self.db_id}, table: {table}, col: {col}')
-                            raise e
+                #NOTE: 日期格式的识别
+                date_ratio = sum(1 for value in sample_data if is_date(value)) / len(sample_data)
+                if date_ratio >= date_format_min_coverage or self.schema[table][col]['type'] == 'DATE':
+                    date_format, coverage = infer_format(sample_data, DATE_FORMATS)
+                    if date_format is not None:
+                        self.schema[table][col]['date_format'] = date_format
+                        self.schema[table][col]['date_format_coverage'] = coverage
+                        print(f'{table}.{col} date format: {date_format[0]} (coverage {coverage:.2f})')
                     
                 #NOTE: 时间格式的识别 
                 #HACK: M:SS.SSS is not recognized as time
-                if is_time(sample_data) or self.schema[table][col]['type'] == 'TEXT':
-                    for time_pattern, strftime_pattern in TIME_FORMATS:
-                        try:
-                            if re.match(time_pattern, sample_data):
-                                self.schema[table][col]['time_format'] = (time_pattern, strftime_pattern)
-                                print(f'{table}.{col} time format: {time_pattern}')
-                                break
-                        except Exception as e:
-                            print(f'Error when matching time pattern {time_pattern} on {sample_data}')
-                            print(f'db_id: {self.db_id}, table: {table}, col: {col}')
-                            raise e
+                time_ratio = sum(1 for value in sample_data if is_time(value)) / len(sample_data)
+                if time_ratio >= date_format_min_coverage or self.schema[table][col]['type'] == 'TEXT':
+                    time_format, coverage = infer_format(sample_data, TIME_FORMATS)
+                    if time_format is not None:
+                        self.schema[table][col]['time_format'] = time_format
+                        self.schema[table][col]['time_format_coverage'] = coverage
+                        print(f'{table}.{col} time format: {time_format[0]} (coverage {coverage:.2f})')
                     
     def distinct_val_vectorize(self) -> None:
         for table in self.schema.keys():
             for col in self.schema[table].keys():
                 if self.schema[table][col]['distinct_val'] is not None:
                     collection_name = f"{self.dataset}.{self.data_split}.{self.db_id}.{table}.{col}.distinct_val"
-                    if self.vecDB_client.collection_exists(collection_name):
-                        dv_info = self.vecDB_client.get_collection(collection_name)
-                        if dv_info.points_count != len(self.schema[table][col]['distinct_val']):
-                            self.vecDB_client.delete_collection(collection_name)
-                    if self.vecDB_client.collection_exists(collection_name) == False:
-                        print(f"Vectorizing {collection_name}, sample: {list(self.schema[table][col]['distinct_val'])[0][:50]}")
-                        self.vecDB_client.add(
-                            collection_name=collection_name,
-                            documents=list(self.schema[table][col]['distinct_val']),
-                            metadata=[{"dataset":self.dataset, "data_split":self.data_split, "db_id":self.db_id, "table_name":table, "column_name":col}]*len(self.schema[table][col]['distinct_val'])
-                        )
+                    documents = list(self.schema[table][col]['distinct_val'])
+                    added, deleted = sync_collection(
+                        self.vecDB_client,
+                        collection_name,
+                        documents,
+                        [{"dataset":self.dataset, "data_split":self.data_split, "db_id":self.db_id, "table_name":table, "column_name":col}]*len(documents),
+                        [point_id(collection_name, document) for document in documents]
+                    )
+                    if added or deleted:
+                        print(f"Vectorized {collection_name}: {added} added, {deleted} deleted")
     
     def delete_distinct_val_collection(self):
         for table in self.schema.keys():
@@ -696,22 +775,45 @@ class Database():
                         self.vecDB_client.delete_collection(collection_name)
     
     def val_vec_query(self, table:str, column:str, text, top_k:int=3):
-        assert self.get_column_info(table, column)
-        for table_name in self.schema.keys():
-            if table_name.lower() == table.lower():
-                table = table_name
-        for column_name in self.schema[table].keys():
-            if column_name.lower() == column.lower():
-                column = column_name
-        query_results = self.vecDB_client.query(collection_name=f"{self.dataset}.{self.data_split}.{self.db_id}.{table}.{column}.distinct_val", query_text=text, limit=top_k)
-        results = []
-        for query_result in query_results:
-            results.append(
-                (
-                    query_result.metadata['document'],
-                    query_result.score
-                )
-            )
+        return self.val_vec_query_batch([(table, column, text)], top_k)[0]
+    
+    def val_vec_query_batch(self, lookups:List[Tuple[str, str, str]], top_k:int=3) -> List[List[Tuple[str, float]]]:
+        """
+        Semantically closest distinct values for several (table, column, text) lookups at once.
+        Texts are embedded together (see `Vector_Store.embed_queries`) and each distinct-value
+        collection is searched once for all its texts. Results are memoized per (collection, text, top_k).
+        
+        Returns:
+            [[(value, score)]] in the order of `lookups`, closest first
+        """
+        results = [None] * len(lookups)
+        # collection -> text -> positions in `lookups`
+        pending:Dict[str, Dict[str, List[int]]] = {}
+        for i, (table, column, text) in enumerate(lookups):
+            assert self.get_column_info(table, column)
+            for table_name in self.schema.keys():
+                if table_name.lower() == table.lower():
+                    table = table_name
+            for column_name in self.schema[table].keys():
+                if column_name.lower() == column.lower():
+                    column = column_name
+            collection_name = f"{self.dataset}.{self.data_split}.{self.db_id}.{table}.{column}.distinct_val"
+            cached = self.val_vec_cache.get((collection_name, text, top_k))
+            if cached is not None:
+                results[i] = list(cached)
+            else:
+                pending.setdefault(collection_name, {}).setdefault(text, []).append(i)
+        
+        if pending:
+            texts = list(dict.fromkeys(text for by_text in pending.values() for text in by_text))
+            embeddings = dict(zip(texts, self.vecDB_client.embed_queries(texts)))
+            for collection_name, by_text in pending.items():
+                hits = self.vecDB_client.search_batch(collection_name, [embeddings[text] for text in by_text], top_k)
+                for (text, positions), text_hits in zip(by_text.items(), hits):
+                    result = [(hit.metadata['document'], hit.score) for hit in text_hits]
+                    self.val_vec_cache.put((collection_name, text, top_k), result)
+                    for i in positions:
+                        results[i] = list(result)
         return results
                 
     def column_desc_vectorize(self) -> None:
@@ -721,24 +823,16 @@ class Database():
                 col_count += 1
                 
         collection_name = f"{self.dataset}.{self.data_split}.{self.db_id}.column_description"
-                
-        if self.vecDB_client.collection_exists(collection_name):
-            col_desc_collection_info = self.vecDB_client.get_collection(collection_name)
-            if col_desc_collection_info.points_count != col_count:
-                self.vecDB_client.delete_collection(collection_name=collection_name)
-            
-        if self.vecDB_client.collection_exists(collection_name) == False:
-            for table in self.schema.keys():
-                for col in self.schema[table].keys():
-                    description = self.schema[table][col]['description']
-                    self.vecDB_client.add(
-                        collection_name=collection_name,
-                        documents=[description],
-                        metadata=[{"dataset":self.dataset, "data_split":self.data_split, "db_id":self.db_id, "table_name":table, "column_name":col}]
-                    )
+        
+        documents, metadata, ids = [], [], []
+        for table in self.schema.keys():
+            for col in self.schema[table].keys():
+                documents.append(self.schema[table][col]['description'])
+                metadata.append({"dataset":self.dataset, "data_split":self.data_split, "db_id":self.db_id, "table_name":table, "column_name":col})
+                ids.append(point_id(collection_name, table, col))
+        sync_collection(self.vecDB_client, collection_name, documents, metadata, ids)
                     
-        col_desc_collection_info = self.vecDB_client.get_collection(f"{self.dataset}.{self.data_split}.{self.db_id}.column_description")
-        assert col_desc_collection_info.points_count == col_count
+        assert self.vecDB_client.count(collection_name) == col_count
     
     def delete_column_desc_collection(self) -> None:
         collection_name = f"{self.dataset}.{self.data_split}.{self.db_id}.column_description"
@@ -754,7 +848,7 @@ class Database():
         """
         collection_name = f"{self.dataset}.{self.data_split}.{self.db_id}.column_description"
         result = []
-        query_results = self.vecDB_client.query(collection_name=collection_name,query_text=text, limit=top_k)
+        query_results = self.vecDB_client.query(collection_name, text, top_k)
         for query_result in query_results:
             result.append({
                 'dataset': query_result.metadata['dataset'],
@@ -767,7 +861,7 @@ class Database():
             })
         return result
     
-    def execute_query(self, query:str, fetch: Optional[Union[str, int]] = "all", idx:Optional[int]=None) -> Optional[List]:   
+    def execute_query(self, query:str, fetch: Optional[Union[str, int]] = "all", idx:Optional[int]=None, timeout:Optional[float]=None) -> Optional[List]:   
         """
         Args:
             query (str):
@@ -778,49 +872,78 @@ class Database():
                 None: no fetch  
             idx (Optional[int]):  
                 for log purpose.  
+            timeout (Optional[float]):  
+                deadline in seconds, `db_query_timeout` by default.  
         Returns:
             `List` if fetch else `None`
+        Exceptions:
+            QueryTimedOut (FunctionTimedOut) if the deadline is exceeded.
         """
         if idx is None:
-            return self._execute_query(query, fetch)
-        
-        path = result_root_dir / "db_overhead" / f"{idx}.json"
-        
-        overhead = []
-        if path.exists():
-            overhead = read_json(path)
-        else:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            path.write_text('[]')
+            return self._execute_query(query, fetch, timeout)
         
         start = time.perf_counter()
         try:
-            res = self._execute_query(query, fetch)
+            res = self._execute_query(query, fetch, timeout)
         finally:
             end = time.perf_counter()
             used_time = end - start
-            overhead.append({"query": query, "time": used_time})
-            content = json.dumps(overhead)
-            make_log(path, content)
+            get_log_sink().append("db_overhead", idx, {"query": query, "time": used_time})
         
         return res
     
-    @func_set_timeout(120)
-    def _execute_query(self, query:str, fetch: Optional[Union[str, int]] = "all") -> Optional[List]:
-        with sqlite3.connect(self.db_path, isolation_level=None) as conn:
-            conn.text_factory = lambda b: b.decode(errors="ignore")  # avoid gbk/utf8 error, copied from sql-eval.exec_eval
+    def _execute_query(self, query:str, fetch: Optional[Union[str, int]] = "all", timeout:Optional[float]=None) -> Optional[List]:
+        if timeout is None:
+            timeout = db_query_timeout
+        with connection_pool.connection(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute(query)
-            if not fetch:
-                return None
-            if fetch == "all":
-                rows = cursor.fetchall()
-            elif fetch == "one":
-                rows = cursor.fetchone()
-            elif isinstance(fetch, int):
-                rows = cursor.fetchmany(fetch)
-            return rows
+            try:
+                with Query_Deadline(conn, timeout):
+                    cursor.execute(query)
+                    if not fetch:
+                        return None
+                    if fetch == "all":
+                        rows = cursor.fetchall()
+                    elif fetch == "one":
+                        rows = cursor.fetchone()
+                    elif isinstance(fetch, int):
+                        rows = cursor.fetchmany(fetch)
+                    return rows
+            finally:
+                # reset the statement, a partially fetched cursor would keep its read transaction open.
+                cursor.close()
         
+    def execute_cached(self, query:str, fetch: Union[str, int] = "all", idx:Optional[int]=None) -> List:
+        """
+        `execute_query` through the shared `result_cache`.
+        
+        Args:
+            query (str):
+            fetch (str):
+                "all" (default): fetch all rows  
+                n (int): fetch (at most) n row(s)  
+            idx (Optional[int]):  
+                for log purpose.  
+        Returns:
+            a new `List` of rows. Rows cached for a limit N answer any request up to N rows,
+            only a larger request goes back to SQLite.
+        Exceptions:
+            same as `execute_query`, failures are not cached.
+        """
+        if fetch == "all":
+            limit = None
+        elif isinstance(fetch, int) and fetch > 0:
+            limit = fetch
+        else:
+            assert False, "Invalid value of 'fetch'"
+        key = (self.db_id, normalize_sql(query))
+        rows = self.result_cache.get(key, limit)
+        if rows is not None:
+            return rows
+        rows = self.execute_query(query, fetch=fetch, idx=idx)
+        self.result_cache.put(key, rows, complete=limit is None or len(rows) < limit)
+        return list(rows)
+    
     def is_executable(self, query:str, idx:Optional[int]=None) -> None:
         """
         Whether a SQL query is executable.
@@ -831,29 +954,46 @@ class Database():
             
         Exceptions:
             if SQL query is not executable, raise Exception.
+            Result is memoized in `explain_cache`, a cached failure re-raises the same sqlite error.
         """
-        query = f"EXPLAIN {query}"
-        self.execute_query(query, fetch=None, idx=idx)
+        key = (self.db_id, normalize_sql(query))
+        cached = self.explain_cache.get(key)
+        if cached is not None:
+            exc_type, errmsg = cached
+            if exc_type is not None:
+                raise exc_type(errmsg)
+            return
+        
+        try:
+            self.execute_query(f"EXPLAIN {query}", fetch=None, idx=idx)
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            # deterministic failure, timeout (QueryTimedOut) is never cached.
+            self.explain_cache.put(key, (type(e), str(e)))
+            raise
+        self.explain_cache.put(key, (None, None))
         # with sqlite3.connect(self.db_path, isolation_level=None) as conn:
         #     cursor = conn.cursor()
         #     query = f"EXPLAIN {query}"
         #     cursor.execute(query)
+    
+    def cache_statistics(self) -> Dict[str, dict]:
+        """
+        Hit/miss counters of the query caches of this database.
+        """
+        return {
+            "explain": self.explain_cache.stats(),
+            "result": self.result_cache.stats(),
+            "val_vec": self.val_vec_cache.stats(),
+        }
         
     def get_distinct_value_chess(self, table_name:str, column:str) -> Optional[set]:
         if any(keyword in column.lower() for keyword in ["_id", " id", "url", "email", "web", "time", "phone", "date", "address"]) or column.endswith("Id"):
             return None
 
         # FIXME: wired calculation?
-        result = self.execute_query(f"""
-            SELECT SUM(LENGTH(unique_values)), COUNT(unique_values)
-            FROM (
-                SELECT DISTINCT `{column}` AS unique_values
-                FROM `{table_name}`
-                WHERE `{column}` IS NOT NULL
-            ) AS subquery
-        """)
-
-        sum_of_lengths, count_distinct = result[0]
+        # SUM(LENGTH(..)), COUNT(..) over SELECT DISTINCT `column` ... WHERE `column` IS NOT NULL
+        profile = self.column_profile(table_name, column)
+        sum_of_lengths, count_distinct = profile.distinct_length_sum(), profile.distinct_count()
         if sum_of_lengths is None or count_distinct == 0:
             return None
 
@@ -863,7 +1003,7 @@ class Database():
         
         if ("name" in column.lower() and sum_of_lengths < 5000000) or (sum_of_lengths < 2000000 and average_length < 25):
             # logging.info(f"Fetching distinct values for {column}")
-            values = [str(value[0]) for value in self.execute_query(f"SELECT DISTINCT `{column}` FROM `{table_name}` WHERE `{column}` IS NOT NULL")]
+            values = [str(value) for value in profile.distinct_values()]
             # logging.info(f"Number of different values: {len(values)}")
             # print(f"{column}[{len(values)}]: {values[:10]}")
             return set(values)
@@ -913,27 +1053,47 @@ class Database():
         """)
         return distinct_val_set
     
-    # TODO: [Persistence Support] This should be preprocessing part. Too time-consuming for large databases...
-    def load_database(self) -> bool:
+    def _snapshot_path(self) -> Path:
         dataset_name = encode_string(self.dataset)
         db_id = encode_string(self.db_id)
         _data_split = encode_string(self.data_split)
-        schema_path = Path(db_cache_dir)/f"{dataset_name}"/f"{_data_split}"/f"{db_id}"/"schema.pickle"
-        schema, res = load_data(schema_path)
-        if res:
-            self.schema = schema
-        return res
+        return Path(db_cache_dir)/f"{dataset_name}"/f"{_data_split}"/f"{db_id}"/"snapshot.pickle"
     
-    def save_database(self) -> None:
-        dataset_name = encode_string(self.dataset)
-        db_id = encode_string(self.db_id)
-        _data_split = encode_string(self.data_split)
-        schema_path = Path(db_cache_dir)/f"{dataset_name}"/f"{_data_split}"/f"{db_id}"/"schema.pickle"
-        save_data(schema_path, self.schema)
+    def _db_stamp(self) -> Tuple[int, int]:
+        stat = os.stat(self.db_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load_snapshot(self) -> bool:
+        """
+        Restore every derived artifact (`SNAPSHOT_ATTRIBUTES`) from the snapshot of this database.
+        The snapshot is valid if it was written with the current `SNAPSHOT_VERSION` and settings
+        (`_settings_digest`) for the current version (mtime, size) of the `.sqlite` file.
+        Returns:
+            whether the snapshot was loaded.
+        """
+        snapshot, res = load_data(self._snapshot_path())
+        if not res:
+            return False
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('db_stamp') != self._db_stamp() \
+                or snapshot.get('settings') != _settings_digest():
+            return False
+        for attribute in SNAPSHOT_ATTRIBUTES:
+            setattr(self, attribute, snapshot[attribute])
+        return True
     
-    def add_distinct_value(self) -> None:
+    def save_snapshot(self) -> None:
+        """
+        Must be called once the schema prompt is set (see `init_DBs`).
+        """
+        snapshot = {attribute: getattr(self, attribute) for attribute in SNAPSHOT_ATTRIBUTES}
+        snapshot['version'] = SNAPSHOT_VERSION
+        snapshot['db_stamp'] = self._db_stamp()
+        snapshot['settings'] = _settings_digest()
+        save_data(self._snapshot_path(), snapshot)
+    
+    def add_distinct_value(self, tables:Optional[Iterable[str]]=None) -> None:
         global distinct_sum
-        for table in self.schema.keys():
+        for table in (self.schema.keys() if tables is None else tables):
             # total_distinct_number = 0
             # for col in self.schema[table].keys():
             #     query = f"SELECT COUNT(DISTINCT `{col}`) FROM `{table}` WHERE `{col}` IS NOT NULL AND `{col}` != ''"
@@ -948,15 +1108,15 @@ class Database():
                     self.schema[table][col]['distinct_val'] = None
         ...
         
-    def init_orderable(self) -> None:
-        for table in self.schema.keys():
+    def init_orderable(self, tables:Optional[Iterable[str]]=None) -> None:
+        for table in (self.schema.keys() if tables is None else tables):
             for column in self.schema[table].keys():
                 if self.schema[table][column]['type'] != 'TEXT':
                     continue
                 try:
                     if column == 'start_date':
                         ...
-                    self.schema[table][column]['orderable'] = _is_orderable(self.db_id, table, column)
+                    self.schema[table][column]['orderable'] = self.column_profile(table, column).is_orderable()
                 except Exception as e:
                     self.schema[table][column]['orderable'] = False
     
@@ -995,28 +1155,109 @@ class Database():
                             print(f'{table}.{col} has special value but not described')
                             
     def execution_match(self, sql:str, gold_sql:str, force=False) -> tuple[int, str]:
+        """
+        Compare the result sets of `sql` and `gold_sql`. Results are streamed and
+        fingerprinted (see `MapleRepair/utils/result_compare.py`) instead of fetched,
+        `result_compare_permute` / `result_compare_exact` select the comparison mode.
+        Unless `force` (`gold_sql` is not a gold query then), the gold result comes from
+        `gold_store` when `gold_store_enable`.
+        
+        Returns:
+            (1 if the results match else 0, error message of `sql` or `None`), 
+            (0, error message) if `gold_sql` fails, (0, '') if evaluation is disabled.
+        """
         if not evaluation and not force:
             return 0, ''
-        try:
-            gold_result = self.execute_query(gold_sql)
-        except FunctionTimedOut as fto:
-            return 0, 'timeout'
-        except BaseException as be:
-            return 0, str(be)
-        res, result = 0, None
-        try:
-            pred_result = self.execute_query(sql)
-            # todo: this should permute column order!
-            if set(pred_result) == set(gold_result):
-                res = 1
-        except sqlite3.OperationalError as oe:
-            result = str(oe)
-        except FunctionTimedOut as fto:
-            result = 'timeout'
-        except BaseException as be:
-            result = str(be)
+        with connection_pool.connection(self.db_path) as conn:
+            gold_rows = None
+            try:
+                if gold_store_enable and not force:
+                    gold_fingerprint, gold_rows = gold_store.gold_result(conn, self.db_id, self.db_path, gold_sql, db_query_timeout,
+                                                                             per_column=result_compare_permute)
+                else:
+                    gold_fingerprint = query_fingerprint(conn, gold_sql, db_query_timeout, per_column=result_compare_permute)
+            except FunctionTimedOut as fto:
+                return 0, 'timeout'
+            except BaseException as be:
+                return 0, str(be)
+            res, result = 0, None
+            try:
+                pred_fingerprint = query_fingerprint(conn, sql, db_query_timeout, per_column=result_compare_permute)
+                if results_match(conn, sql, pred_fingerprint, gold_sql, gold_fingerprint,
+                                 permute=result_compare_permute, exact=result_compare_exact, timeout=db_query_timeout,
+                                 gold_rows=gold_rows):
+                    res = 1
+            except sqlite3.OperationalError as oe:
+                result = str(oe)
+            except FunctionTimedOut as fto:
+                result = 'timeout'
+            except BaseException as be:
+                result = str(be)
         return res, result
     
+    def first_divergent(self, query:str, candidates:List[str], timeout:Optional[float]=None) -> Optional[int]:
+        """
+        Differential evaluation of candidate rewrites of `query` on one connection.
+        
+        Results are compared as sets (like `execution_match`) inside SQLite: each result
+        is materialized once into a temp table and compared with `EXCEPT` in both directions,
+        rows are never fetched into Python. Identical candidates are evaluated once, and
+        evaluation stops at the first divergence.
+        
+        Args:
+            timeout (Optional[float]):  
+                deadline of each evaluation in seconds, `db_query_timeout` by default.  
+        Returns:
+            index of the first candidate whose result differs from the result of `query`
+            or which fails, `None` if all candidates agree. If `query` fails, that is the first candidate.
+        """
+        if not candidates:
+            return None
+        if timeout is None:
+            timeout = db_query_timeout
+        base_key = normalize_sql(query)
+        verdicts:Dict[str, bool] = {}    # normalized candidate -> divergent
+        with connection_pool.connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            try:
+                try:
+                    with Query_Deadline(conn, timeout):
+                        base_columns = materialize(cursor, "_base_result", query)
+                except (sqlite3.Error, sqlite3.Warning, FunctionTimedOut):
+                    return 0
+                for i, candidate in enumerate(candidates):
+                    key = normalize_sql(candidate)
+                    if key == base_key:
+                        divergent = False
+                    elif key in verdicts:
+                        divergent = verdicts[key]
+                    else:
+                        divergent = verdicts[key] = self._diverges(conn, cursor, candidate, base_columns, timeout)
+                    if divergent:
+                        return i
+                return None
+            finally:
+                cursor.execute("DROP TABLE IF EXISTS temp._base_result")
+                cursor.execute("DROP TABLE IF EXISTS temp._candidate_result")
+                cursor.close()
+    
+    def _diverges(self, conn:sqlite3.Connection, cursor:sqlite3.Cursor, candidate:str, base_columns:int, timeout:float) -> bool:
+        try:
+            with Query_Deadline(conn, timeout):
+                cursor.execute("DROP TABLE IF EXISTS temp._candidate_result")
+                n_columns = materialize(cursor, "_candidate_result", candidate)
+                if n_columns != base_columns:
+                    # only two empty results are equal sets
+                    cursor.execute("SELECT EXISTS(SELECT 1 FROM temp._base_result) OR EXISTS(SELECT 1 FROM temp._candidate_result)")
+                else:
+                    cursor.execute("""
+                        SELECT EXISTS(SELECT * FROM temp._base_result EXCEPT SELECT * FROM temp._candidate_result)
+                            OR EXISTS(SELECT * FROM temp._candidate_result EXCEPT SELECT * FROM temp._base_result)
+                    """)
+                return bool(cursor.fetchone()[0])
+        except (sqlite3.Error, sqlite3.Warning, FunctionTimedOut):
+            return True
+    
     # # backup
     # def _execution_match(self, sql:str, gold_sql:str) -> tuple[int, str]:
     #     global evaluation
@@ -1227,16 +1468,61 @@ def partial_init_database(db_id:str) -> Database:
 def init_db_schema_prompt(_dataset:str, db_path:str, db_id:str) -> Tuple[str, str]:
     return Schema_Prompt_Builder(_dataset=_dataset, _data_split=data_split, db_path=db_path, db_id=db_id).get_schema_str()
 
-DBs = {}
-def init_DBs(db_list:List[str]=None):
-    global DBs_name
+def point_id(collection_name:str, *key:str) -> str:
+    """
+    Deterministic point id (UUID) of the document identified by `key` in a collection.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, '\x1f'.join((collection_name,) + key)))
+
+def finish_database(db:Database, vectorize:bool=True) -> None:
+    """
+    Build the schema prompt (unless restored from the snapshot), save the snapshot and vectorize.
+    `db` must be registered in `DBs` already (`Schema_Prompt_Builder` looks it up there).
+    """
+    if not db.from_snapshot and db.schema_prompt is None:
+        db.schema_prompt, db.fk_prompt = init_db_schema_prompt(_dataset=db.dataset, db_path=db.db_path, db_id=db.db_id)
+        db.save_snapshot()
+    db.release_profiles()
+    if vectorize:
+        db.init_vecDB()
+    # db.delete_column_desc_collection()
+    # db.delete_distinct_val_collection()
+
+class Database_Registry(dict):
+    """
+    db_id -> `Database`, a database of `DBs_name` is initialized (incl. schema prompt and
+    vector collections) on first access, `init_DBs` initializes a list of them up front.
+    `in`, `keys()`, `values()` and `items()` only see initialized databases.
+    """
+    def __missing__(self, db_id:str) -> Database:
+        if db_id not in DBs_name:
+            raise KeyError(db_id)
+        db = self[db_id] = partial_init_database(db_id)
+        try:
+            finish_database(db)
+        except BaseException:
+            del self[db_id]
+            raise
+        print(f'\33[32m{db.db_id}\33[0m')
+        return db
     
-    if db_list:
-        DBs_name = db_list
+    def get(self, db_id:str, default=None):
+        try:
+            return self[db_id]
+        except KeyError:
+            return default
+
+DBs = Database_Registry()
+def init_DBs(db_list:List[str]=None):
+    """
+    Prefetch the databases of `db_list` (in parallel if `parallel_init`),
+    all others are initialized on first access of `DBs`.
+    """
+    db_list = [db_id for db_id in dict.fromkeys(db_list or []) if db_id not in DBs]
         
-    if parallel_init:
+    if parallel_init and len(db_list) > 1:
         with ProcessPoolExecutor(max_workers=16) as executor:
-            future_to_db_id = {executor.submit(partial_init_database, db_id): db_id for db_id in DBs_name}
+            future_to_db_id = {executor.submit(partial_init_database, db_id): db_id for db_id in db_list}
             for future in as_completed(future_to_db_id):
                 try:
                     db_id = future_to_db_id[future]
@@ -1245,36 +1531,35 @@ def init_DBs(db_list:List[str]=None):
                     print(f"Error initializing DB {db_id}: {e}")
                     
         with ProcessPoolExecutor(max_workers=16) as executor:
-            future_to_db_id = {executor.submit(init_db_schema_prompt, DBs[db_id].dataset, DBs[db_id].db_path, db_id): db_id for db_id in DBs_name}
+            future_to_db_id = {executor.submit(init_db_schema_prompt, DBs[db_id].dataset, DBs[db_id].db_path, db_id): db_id for db_id in db_list if db_id in DBs and not DBs[db_id].from_snapshot}
             for future in as_completed(future_to_db_id):
                 try:
                     db_id = future_to_db_id[future]
                     DBs[db_id].schema_prompt, DBs[db_id].fk_prompt = future.result()
+                    DBs[db_id].save_snapshot()
                 except Exception as e:
                     print(f"Error initializing schema prompt {db_id}: {e}")
-            
-    for name in DBs_name:
-        if not parallel_init:
-            DBs[name] = partial_init_database(name)
-            db:Database = DBs[name]
-            DBs[name].schema_prompt, DBs[name].fk_prompt = init_db_schema_prompt(_dataset=db.dataset, db_path=db.db_path, db_id=name)
-        else:
-            db:Database = DBs[name]
-        db.init_vecDB()
-        # db.delete_column_desc_collection()
-        # db.delete_distinct_val_collection()
-        # if db.conn is not None:
-        #     db.conn.close()
-        #     db.conn = None
-                
-    for db in DBs.values():
-        print(f'\33[32m{db.db_id}\33[0m')
+        
+        for name in db_list:
+            if name in DBs:
+                finish_database(DBs[name], vectorize=False)
+        
+        # embedding (onnxruntime) and upserts release the GIL
+        with ThreadPoolExecutor(max_workers=vector_init_threads) as executor:
+            future_to_db_id = {executor.submit(DBs[db_id].init_vecDB): db_id for db_id in db_list if db_id in DBs}
+            for future in as_completed(future_to_db_id):
+                db_id = future_to_db_id[future]
+                future.result()
+                print(f'\33[32m{db_id}\33[0m')
+    else:
+        for name in db_list:
+            DBs[name]
         
 # # You must call init_DBs() at your first time reference DBs!
 # init_DBs()
 
 if __name__ == '__main__':
-    init_DBs()
+    init_DBs(DBs_name)
     
     # distinct_col = set()
     # for db_id in DBs_name:
@@ -1,16 +1,16 @@
-from MapleRepair.SQL import SQL
+from MapleRepair.SQL import SQL, parse_statement
 from pathlib import Path
 from typing import List, Tuple, Dict
 from MapleRepair.Database import Database, DBs
 from MapleRepair.const import base_prompt, sql_result_prompt, hint, cot_prompt
 from MapleRepair.repairer_base import RepairerBase
 import re
-from MapleRepair.utils.llm_api import gpt_request
+from MapleRepair.utils.llm_api import gpt_request, async_gpt_request
 from MapleRepair.config import result_root_dir
 import os
 import time
 import sqlglot
-from MapleRepair.utils.persistence import make_log
+from MapleRepair.utils.persistence import get_log_sink
 import json
 from MapleRepair.utils.format import read_json
 from MapleRepair.utils.sqlite_dialect import SQLite_Dialects
@@ -29,6 +29,8 @@ def parse_sql_from_string(input_string):
     return "error: No SQL found in the input string"
 
 class LLM_Repairer(RepairerBase):
+    STATISTIC_COUNTERS = ('llm_call', 'llm_failure')
+    
     def __init__(self, enable:bool=False):
         super().__init__()
         self.enable:bool = enable
@@ -43,12 +45,7 @@ class LLM_Repairer(RepairerBase):
     def repair(self, sql: SQL, gold_sql: str, db_id: str, originalres: int) -> tuple[SQL, int]:
         raise NotImplementedError
 
-    def repair_with_gpt(self, sql: SQL, enable_log=True) -> Tuple[SQL, Dict]:  
-        os.makedirs(result_root_dir / 'llm_logs', exist_ok=True)
-        log_path = result_root_dir / "llm_logs" / f"{sql.question_id}.txt"
-        
-        before = sql.statement
-        self.llm_call += 1
+    def build_prompt(self, sql: SQL) -> str:
         db:Database = DBs[sql.db_id]
         prompt = base_prompt.format(
             query = sql.question,
@@ -72,16 +69,9 @@ class LLM_Repairer(RepairerBase):
             error_prompt = ('\n\n' + '='*30 + '\n\n').join(sql.repair_prompt)
             final_prompt += hint.format(hint_msg=error_prompt)
         final_prompt += cot_prompt
-        
-        if self.enable:
-            print(final_prompt)
-            return sql, {}    # debugging
-        
-        start = time.perf_counter()
-        llm_response, usage = gpt_request(final_prompt, log_path=log_path)
-        end = time.perf_counter()
-        overhead = end - start
-        
+        return final_prompt
+    
+    def apply_response(self, sql: SQL, before:str, llm_response:str, usage:Dict, overhead:float) -> SQL:
         gpt_repaired_sql = parse_sql_from_string(llm_response)
         
         if 'error' in gpt_repaired_sql:
@@ -90,25 +80,63 @@ class LLM_Repairer(RepairerBase):
         sql.repair_prompt.clear()    # clear repair_prompt after call llm
         
         try:
-            parsed_repaired_sql = sqlglot.parse_one(gpt_repaired_sql, read='sqlite')
-            gpt_repaired_sql = parsed_repaired_sql.sql(dialect=SQLite_Dialects, comments=False)
+            parsed_repaired_sql = parse_statement(gpt_repaired_sql)
+            if parsed_repaired_sql is not None:
+                gpt_repaired_sql = parsed_repaired_sql.sql(dialect=SQLite_Dialects, comments=False)
         except BaseException as be:
             pass
         
         sql.update(gpt_repaired_sql, "syntax_GPT", None)
         
-        llm_log = []
-        log_path = result_root_dir / "llm_overhead" / f"{sql.question_id}.json"
-        if log_path.exists():
-            llm_log = read_json(log_path)
-        llm_log.append(
+        get_log_sink().append(
+            "llm_overhead",
+            sql.question_id,
             {
                 "llm_usage": usage,
                 "time": overhead
             }
         )
-        content = json.dumps(llm_log)
-        make_log(log_path, content)
         
         self.logging(sql.question_id, before, sql.statement, True, {})
-        return sql, usage
\ No newline at end of file
+        return sql
+
+    def repair_with_gpt(self, sql: SQL, enable_log=True) -> Tuple[SQL, Dict]:  
+        os.makedirs(result_root_dir / 'llm_logs', exist_ok=True)
+        log_path = result_root_dir / "llm_logs" / f"{sql.question_id}.txt"
+        
+        before = sql.statement
+        self.llm_call += 1
+        final_prompt = self.build_prompt(sql)
+        
+        if self.enable:
+            print(final_prompt)
+            return sql, {}    # debugging
+        
+        start = time.perf_counter()
+        llm_response, usage = gpt_request(final_prompt, log_path=log_path)
+        end = time.perf_counter()
+        overhead = end - start
+        
+        return self.apply_response(sql, before, llm_response, usage, overhead), usage
+    
+    async def repair_with_gpt_async(self, sql: SQL, enable_log=True) -> Tuple[SQL, Dict]:
+        """
+        Same as `repair_with_gpt`, other questions keep running while the request is in flight.
+        """
+        os.makedirs(result_root_dir / 'llm_logs', exist_ok=True)
+        log_path = result_root_dir / "llm_logs" / f"{sql.question_id}.txt"
+        
+        before = sql.statement
+        self.llm_call += 1
+        final_prompt = self.build_prompt(sql)
+        
+        if self.enable:
+            print(final_prompt)
+            return sql, {}    # debugging
+        
+        start = time.perf_counter()
+        llm_response, usage = await async_gpt_request(final_prompt, log_path=log_path)
+        end = time.perf_counter()
+        overhead = end - start
+        
+        return self.apply_response(sql, before, llm_response, usage, overhead), usage
@@ -1,6 +1,6 @@
 from MapleRepair.Database import init_DBs
 from MapleRepair.SQL import SQL
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Any
 from datetime import datetime
 from pathlib import Path
 from MapleRepair.utils.format import write_json
@@ -29,12 +29,13 @@ from MapleRepair.output_aligner.Output_Format_Hallucination import Output_Format
 from MapleRepair.output_aligner.Order_Select import Order_Select_Repairer
 
 from MapleRepair.LLM import LLM_Repairer
+from MapleRepair.repairer_base import RepairerBase
 
 ### >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
     
 class MapleRepair():
     def __init__(self, db_list:List[str]=None, result_root_dir:Path=None, LLM_enable:bool=True):
-        # init_database
+        # init_database: prefetch db_list, other databases are initialized on first use of DBs
         init_DBs(db_list)
         
         self.result_root_dir = Path('result') / datetime.now().strftime("%Y-%m-%d-%H-%M-%S") if not result_root_dir else result_root_dir
@@ -141,11 +142,7 @@ class MapleRepair():
                 assert sql is not None
         return sql, res
     
-    def repair(self, sql_statement: str, db_id:str, gold_sql:str=None, origin_res=None, question_id:int=None, question:str=None, evidence:str=None) -> str:
-        """
-        对外暴露的修复方法，执行检测-修复流程。
-        """
-        
+    def _syntax_stage(self, sql_statement: str, db_id:str, gold_sql:str, origin_res, question_id:int, question:str, evidence:str) -> Tuple[SQL, int]:
         sql = SQL(sql=sql_statement, db_id=db_id, gold_sql=gold_sql, question=question, evidence=evidence, question_id=question_id)
         
         # repaired_sql = sql
@@ -156,14 +153,9 @@ class MapleRepair():
         
         if not repaired_sql.executable:
             assert repaired_sql.repair_prompt, "Unprocessed Excution Failure without repair prompt!"
-            
-        if self.llm.detect(repaired_sql, gold_sql, db_id, res):
-            repaired_sql, usage = self.llm.repair_with_gpt(repaired_sql)
-            
-        if repaired_sql.executable == False:
-            # for those can't repaired, return it without modification.
-            return sql_statement
-        
+        return repaired_sql, res
+    
+    def _deterministic_stages(self, repaired_sql: SQL, db_id:str, gold_sql:str, res) -> Tuple[SQL, int]:
         # repaired_sql = sql
         repaired_sql, res = self.logic_repair(repaired_sql, gold_sql, db_id, res)
         
@@ -172,6 +164,22 @@ class MapleRepair():
         repaired_sql, res = self.semantic_repair(repaired_sql, gold_sql, db_id, res)
         
         repaired_sql, res = self.output_align(repaired_sql, gold_sql, db_id, res)
+        return repaired_sql, res
+    
+    def repair(self, sql_statement: str, db_id:str, gold_sql:str=None, origin_res=None, question_id:int=None, question:str=None, evidence:str=None) -> str:
+        """
+        对外暴露的修复方法，执行检测-修复流程。
+        """
+        repaired_sql, res = self._syntax_stage(sql_statement, db_id, gold_sql, origin_res, question_id, question, evidence)
+            
+        if self.llm.detect(repaired_sql, gold_sql, db_id, res):
+            repaired_sql, usage = self.llm.repair_with_gpt(repaired_sql)
+            
+        if repaired_sql.executable == False:
+            # for those can't repaired, return it without modification.
+            return sql_statement
+        
+        repaired_sql, res = self._deterministic_stages(repaired_sql, db_id, gold_sql, res)
         
         if self.llm.detect(repaired_sql, gold_sql, db_id, res):
             repaired_sql, usage = self.llm.repair_with_gpt(repaired_sql)
@@ -180,6 +188,55 @@ class MapleRepair():
         
         return repaired_sql.statement
     
+    async def repair_async(self, sql_statement: str, db_id:str, gold_sql:str=None, origin_res=None, question_id:int=None, question:str=None, evidence:str=None) -> str:
+        """
+        `repair` with asynchronous LLM calls. Run many questions as tasks of one event loop:
+        the deterministic stages of other questions run while LLM requests are in flight.
+        """
+        repaired_sql, res = self._syntax_stage(sql_statement, db_id, gold_sql, origin_res, question_id, question, evidence)
+            
+        if self.llm.detect(repaired_sql, gold_sql, db_id, res):
+            repaired_sql, usage = await self.llm.repair_with_gpt_async(repaired_sql)
+            
+        if repaired_sql.executable == False:
+            # for those can't repaired, return it without modification.
+            return sql_statement
+        
+        repaired_sql, res = self._deterministic_stages(repaired_sql, db_id, gold_sql, res)
+        
+        if self.llm.detect(repaired_sql, gold_sql, db_id, res):
+            repaired_sql, usage = await self.llm.repair_with_gpt_async(repaired_sql)
+        
+        return repaired_sql.statement
+    
+    def named_repairers(self) -> Dict[str, Any]:
+        """
+        Every repairer keeping statistics, including the sub-repairers of `nscr`.
+        """
+        repairers = {name: repairer for name, repairer in vars(self).items() if isinstance(repairer, RepairerBase)}
+        for name in ('anur', 'cser', 'mjr', 'mtcr'):
+            repairers[f'nscr.{name}'] = getattr(self.nscr, name)
+        return repairers
+    
+    def drain_statistics(self) -> Dict[str, Any]:
+        """
+        Statistics of all repairers and `resolved_exception` collected since the
+        last drain, e.g. by a worker process after one question. They are reset.
+        """
+        stats = {name: repairer.drain_statistics() for name, repairer in self.named_repairers().items()}
+        stats['resolved_exception'], self.resolved_exception = self.resolved_exception, {}
+        return stats
+    
+    def merge_statistics(self, stats:Dict[str, Any]) -> None:
+        """
+        Merge statistics returned by `drain_statistics` of another process.
+        Merging in question order reproduces the statistics of a sequential run.
+        """
+        for name, repairer in self.named_repairers().items():
+            repairer.merge_statistics(stats[name])
+        for exception_name, cases in stats['resolved_exception'].items():
+            self.resolved_exception.setdefault(exception_name, []).extend(cases)
+    
     def query_detect_statistics(self, file_path:Path=None) -> None:
         detected_idx = set()
         false_detected_idx = set()
@@ -9,16 +9,71 @@ from MapleRepair.Database import Database, DBs
 from MapleRepair.Customized_Exception import NoSuchTableError
 from sqlite3 import OperationalError
 from func_timeout import FunctionTimedOut
-from typing import List, Union, Dict, Set, Tuple
-from MapleRepair.config import debugging
+from typing import List, Union, Dict, Set, Tuple, Optional
+from MapleRepair.config import debugging, ast_cache_size
 from MapleRepair.utils.sqlite_dialect import SQLite_Dialects
+from MapleRepair.utils.cache import LRU_Cache
+import copy
+
+# statement -> (parsed tree, regenerated statement) | (None, None) if not parsable
+_parse_cache = LRU_Cache(ast_cache_size)
+# (db_id, statement) -> (qualified tree, scope_root, qualified, unaliased), executable statements only
+_analysis_cache = LRU_Cache(ast_cache_size)
+
+def _parse(statement:str) -> Tuple[Optional[sqlglot.expressions.Expression], Optional[str]]:
+    """
+    Parse with the literal fix and regenerate the statement, memoized in `_parse_cache`.
+    The returned tree is shared, copy it before modification.
+    """
+    cached = _parse_cache.get(statement)
+    if cached is not None:
+        return cached
+    try:
+        parsed = sqlglot.parse_one(statement, read='sqlite')
+        
+        # some literal will be accidentally parsed to column, we make fix here. 
+        for col_exp in parsed.find_all(sqlglot.expressions.Column):
+            if "'" in col_exp.name:
+                col_exp.replace(sqlglot.expressions.Literal.string(col_exp.name))
+                
+        # format here! quotation_hack will be removed here!
+        cached = (parsed, parsed.sql(dialect=SQLite_Dialects))
+    except Exception as e:
+        cached = (None, None)
+    _parse_cache.put(statement, cached)
+    return cached
+
+def parse_statement(statement:str) -> Optional[sqlglot.expressions.Expression]:
+    """
+    A private copy of the parsed `statement` (as `SQL` parses it), `None` if not parsable.
+    """
+    parsed, _ = _parse(statement)
+    return parsed.copy() if parsed is not None else None
+
+def _clone_analysis(parsed:sqlglot.expressions.Expression, scope_root:sqlglot.optimizer.scope.Scope) -> Tuple[sqlglot.expressions.Expression, sqlglot.optimizer.scope.Scope]:
+    """
+    Copy a tree together with its scope, the copied scope refers to the copied nodes.
+    """
+    new_parsed = parsed.copy()
+    memo = {id(node): new_node for node, new_node in zip(parsed.walk(), new_parsed.walk())}
+    new_scope_root = copy.deepcopy(scope_root, memo) if scope_root is not None else None
+    return new_parsed, new_scope_root
+
+def ast_cache_statistics() -> Dict[str, dict]:
+    """
+    Hit/miss counters of the parse and qualification caches of this process.
+    """
+    return {
+        "parse": _parse_cache.stats(),
+        "analysis": _analysis_cache.stats(),
+    }
     
 class SQL():
     def __init__(self, sql:str, question_id:int=None, db_id:str=None, gold_sql:str=None, question=None, evidence=None):
-        self.statement = sql
+        self._statement = sql
         self.repairer_log = []
-        self.parsed = None
-        self.scope_root = None
+        self._parsed = None
+        self._scope_root = None
         
         ### TODO: refactoring
         self.question_id = question_id
@@ -29,14 +84,14 @@ class SQL():
         ###
         
         # If not self.executable, self.execution_result is err_msg
-        self.execution_result = None
+        self._execution_result = None
         
         # Cache partial fetch! Guarantee for number at least 5!
         self.partial_result = None
         
-        self.qualified:bool = False # column ambiguity / table existence
-        self.unaliased:bool = False # subquery alias
-        self.executable:bool = False # syntax error
+        self._qualified:bool = False # column ambiguity / table existence
+        self._unaliased:bool = False # subquery alias
+        self._executable:bool = False # syntax error
         self._update_parse()
         
         # debug flag
@@ -62,7 +117,7 @@ class SQL():
             Update all SQL attributes according to the new statement. In most of the cases, SQL.parsed changes first and then call this function.
         """
         self.repairer_log.append({"before": self.statement, "after": statement, "repairer": repairer, "errmsg": errmsg, "exception": e})
-        self.statement = statement
+        self._statement = statement
         self._update_parse()
         
     def partial_update(self):
@@ -72,27 +127,93 @@ class SQL():
             
             Useful in fake_repair!!!
         """
-        self.statement = self.parsed.sql(dialect=SQLite_Dialects)
+        self._statement = self.parsed.sql(dialect=SQLite_Dialects)
+        self._parse_pending = False
+        self._from_text = False
+        self._exec_pending = True
+        self._analysis_pending = True
         
-        self.executable = False
-        self.execution_result = None
+    def fork(self) -> 'SQL':
+        """
+            Cheap clone to try candidate rewrites on, instead of deepcopy(sql).
             
-        self.scope_root = self._build_scope_root()        
-
-        try:
-            self.is_executable()
-            # self.execution_result = self.execute()
-            self.executable = True
-        except FunctionTimedOut as fe:
-            self.execution_result = 'timeout'
-            self.executable = False
-        except Exception as e:
-            self.execution_result = str(e)
-            self.executable = False
+            Only the AST (with its scope) is copied. Question attributes and cached
+            results are shared; repairer_log, repair_prompt and fake_mapping start empty.
+            Modifying the fork's tree does not touch this SQL, call `partial_update()`
+            on the fork to re-derive its statement and execution state.
+        """
+        parsed, scope_root = self.parsed, self.scope_root
+        clone = SQL.__new__(SQL)
+        clone.__dict__.update(self.__dict__)
+        if parsed is not None:
+            clone._parsed, clone._scope_root = _clone_analysis(parsed, scope_root)
+        clone._parsed_shared = False
+        clone.repairer_log = []
+        clone.repair_prompt = set()
+        clone.fake_mapping = []
+        return clone
         
-        if self.executable:
-            self._qualify()
-            self._identifier_unalias()
+    ### >>>>>>>>>>>>>>>>>  lazy attributes  >>>>>>>>>>>>>>>>>>>>>>>>>>
+    # An update only invalidates. Each stage runs on first read of one of its attributes:
+    #   parse:    statement, parsable                            (sqlglot.parse_one, statement regenerated)
+    #   exec:     executable, execution_result                   (EXPLAIN)
+    #   analysis: parsed, scope_root, qualified, unaliased       (build_scope, qualify, unalias; needs exec)
+    # The scope is always built before `qualify` rewrites the tree, as it was done eagerly.
+    
+    @property
+    def statement(self) -> str:
+        self._ensure_parsed()
+        return self._statement
+    
+    @property
+    def parsable(self) -> bool:
+        """
+        Whether the statement parses, the cheap check before `parsed` (which runs EXPLAIN and qualify).
+        """
+        self._ensure_parsed()
+        return self._parsed is not None
+    
+    @property
+    def parsed(self) -> sqlglot.expressions.Expression:
+        self._ensure_analyzed()
+        return self._parsed
+    
+    @property
+    def scope_root(self) -> sqlglot.optimizer.scope.Scope:
+        self._ensure_analyzed()
+        return self._scope_root
+    
+    @property
+    def qualified(self) -> bool:
+        self._ensure_analyzed()
+        return self._qualified
+    
+    @property
+    def unaliased(self) -> bool:
+        self._ensure_analyzed()
+        return self._unaliased
+    
+    @property
+    def executable(self) -> bool:
+        self._ensure_executed()
+        return self._executable
+    
+    @executable.setter
+    def executable(self, value:bool) -> None:
+        self._ensure_executed()
+        self._executable = value
+        
+    @property
+    def execution_result(self):
+        self._ensure_executed()
+        return self._execution_result
+    
+    @execution_result.setter
+    def execution_result(self, value) -> None:
+        self._ensure_executed()
+        self._execution_result = value
+        
+    ### >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
         
     def execute(self, fetch: Union[str, int] = "all") -> List:
         if self.execution_result:
@@ -114,60 +235,96 @@ class SQL():
                 raise OperationalError(self.execution_result)
         db:Database = DBs[self.db_id]
         if fetch == "all":
-            self.execution_result = db.execute_query(query=self.statement, fetch=fetch, idx=self.question_id)
+            self.execution_result = db.execute_cached(query=self.statement, fetch=fetch, idx=self.question_id)
             self.partial_result = self.execution_result
             return self.execution_result
         elif fetch == "one":
             fetch = 1
         if fetch < 5:
-            self.partial_result = db.execute_query(query=self.statement, fetch=5, idx=self.question_id)
+            self.partial_result = db.execute_cached(query=self.statement, fetch=5, idx=self.question_id)
         else:
-            self.partial_result = db.execute_query(query=self.statement, fetch=fetch, idx=self.question_id)
+            self.partial_result = db.execute_cached(query=self.statement, fetch=fetch, idx=self.question_id)
         if isinstance(fetch, int):
             return self.partial_result[:fetch]
         raise Exception
         
     def _update_parse(self):
-        self.executable = False
-        self.execution_result = None
+        """
+        Invalidate everything derived from `statement`, see lazy attributes.
+        """
+        self._parse_pending = True
+        self._exec_pending = True
+        self._analysis_pending = True
         self.partial_result = None
         
-        try:
-            self.parsed = sqlglot.parse_one(self.statement, read='sqlite')
-            
-            # some literal will be accidentally parsed to column, we make fix here. 
-            for col_exp in self.parsed.find_all(sqlglot.expressions.Column):
-                if "'" in col_exp.name:
-                    col_exp.replace(sqlglot.expressions.Literal.string(col_exp.name))
-                    
-            # format here! quotation_hack will be removed here!
-            self.statement = self.parsed.sql(dialect=SQLite_Dialects)
-            
-        except Exception as e:
-            self.parsed = None
+    def _ensure_parsed(self) -> None:
+        if not self._parse_pending:
+            return
+        self._parse_pending = False
+        
+        parsed, statement = _parse(self._statement)
+        # shared with `_parse_cache` until the analysis stage copies it
+        self._parsed = parsed
+        self._parsed_shared = parsed is not None
+        self._from_text = True
+        if statement is not None:
+            self._statement = statement
             
-        self.scope_root = self._build_scope_root()        
-
+    def _ensure_executed(self) -> None:
+        if not self._exec_pending:
+            return
+        self._ensure_parsed()
+        self._exec_pending = False
+        self._executable = False
+        self._execution_result = None
+        
         try:
             self.is_executable()
             # self.execution_result = self.execute()
-            self.executable = True
+            self._executable = True
         except FunctionTimedOut as fe:
-            self.execution_result = 'timeout'
-            self.executable = False
+            self._execution_result = 'timeout'
+            self._executable = False
         except Exception as e:
-            self.execution_result = str(e)
-            self.executable = False
+            self._execution_result = str(e)
+            self._executable = False
+            
+    def _ensure_analyzed(self) -> None:
+        if not self._analysis_pending:
+            return
+        self._ensure_parsed()
+        self._analysis_pending = False
+        self._qualified = False
+        self._unaliased = False
+        
+        self._ensure_executed()
+        # a tree modified in place (partial_update) may differ from the parsed statement
+        cacheable = self._executable and self._from_text
+        key = (self.db_id, self._statement)
+        if cacheable:
+            cached = _analysis_cache.get(key)
+            if cached is not None:
+                parsed, scope_root, self._qualified, self._unaliased = cached
+                self._parsed, self._scope_root = _clone_analysis(parsed, scope_root)
+                self._parsed_shared = False
+                return
+        
+        if self._parsed_shared:
+            self._parsed = self._parsed.copy()
+            self._parsed_shared = False
+        self._scope_root = self._build_scope_root()        
         
-        if self.executable:
+        if self._executable:
             self._qualify()
             self._identifier_unalias()
+            if cacheable and self._qualified:
+                _analysis_cache.put(key, (*_clone_analysis(self._parsed, self._scope_root), self._qualified, self._unaliased))
             
     def _build_scope_root(self) -> sqlglot.optimizer.scope.Scope:
-        if self.parsed is None:
+        if self._parsed is None:
             return None
         try:
-            scope = sqlglot.optimizer.scope.build_scope(self.parsed)
+            scope = sqlglot.optimizer.scope.build_scope(self._parsed)
             return scope
         except Exception as e:
             return None
@@ -200,24 +357,24 @@ class SQL():
     def _qualify(self) -> None:
         try:
             qualified_ast = qualify(
-                expression=self.parsed,
+                expression=self._parsed,
                 schema=DBs[self.db_id]._schema4sqlglot,
                 infer_schema=False,
                 dialect=SQLite_Dialects
             )
-            self.parsed = qualified_ast
-            self.qualified = True
+            self._parsed = qualified_ast
+            self._qualified = True
         except Exception as e:
-            self.qualified = False
+            self._qualified = False
         
     def _identifier_unalias(self) -> None:
-        self.unaliased = False
-        if not self.parsed:    return
-        if not self.qualified: return
+        self._unaliased = False
+        if not self._parsed:    return
+        if not self._qualified: return
         
         db:Database = DBs[self.db_id]
         
-        root = self.scope_root
+        root = self._scope_root
         
         for scope in root.traverse():
             for identifier in scope.find_all(sqlglot.expressions.Identifier):
@@ -272,10 +429,10 @@ class SQL():
                         ...
                         
                 if identifier_unaliased == False:
-                    self.unaliased = False
+                    self._unaliased = False
                     return
                 
-        self.unaliased = True
+        self._unaliased = True
         
     def _unalias_check(self):
         if debugging:
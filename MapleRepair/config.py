@@ -61,6 +61,112 @@ print(f"parallel_init: {parallel_init}")
 persistence = True
 print(f"persistence: {persistence}")
 
+# read-only connections kept open per process & thread, see MapleRepair/utils/sqlite_pool.py
+db_pool_size = int(os.getenv('DB_POOL_SIZE', 8))
+print(f"db_pool_size: {db_pool_size}")
+# page cache of each pooled connection (KiB)
+db_page_cache_kib = int(os.getenv('DB_PAGE_CACHE_KIB', 65536))
+print(f"db_page_cache_kib: {db_page_cache_kib}")
+# query deadlines (seconds), see MapleRepair/utils/deadline.py
+db_query_timeout = float(os.getenv('DB_QUERY_TIMEOUT', 120))
+print(f"db_query_timeout: {db_query_timeout}")
+# budget of cheap probe queries, e.g. Inconsistent_Cond.check_valid_condition
+db_probe_timeout = float(os.getenv('DB_PROBE_TIMEOUT', 5))
+print(f"db_probe_timeout: {db_probe_timeout}")
+# entries of the per-database EXPLAIN (executability) cache
+explain_cache_size = int(os.getenv('EXPLAIN_CACHE_SIZE', 4096))
+print(f"explain_cache_size: {explain_cache_size}")
+# entries of the sqlglot parse / qualification caches, see MapleRepair/SQL.py
+ast_cache_size = int(os.getenv('AST_CACHE_SIZE', 2048))
+print(f"ast_cache_size: {ast_cache_size}")
+# memory budget (MiB) of the query result cache shared by all databases of a process
+result_cache_mib = int(os.getenv('RESULT_CACHE_MIB', 256))
+print(f"result_cache_mib: {result_cache_mib}")
+# result comparison of execution_match / parallel_evaluation, see MapleRepair/utils/result_compare.py
+# distinct rows kept (as 64-bit digests) per result before SQLite deduplicates instead
+result_compare_max_distinct = int(os.getenv('RESULT_COMPARE_MAX_DISTINCT', 1000000))
+print(f"result_compare_max_distinct: {result_compare_max_distinct}")
+# accept predicted results whose columns are a permutation of the gold columns
+result_compare_permute = os.getenv('RESULT_COMPARE_PERMUTE', 'False').lower() in ('1', 'true', 'yes')
+print(f"result_compare_permute: {result_compare_permute}")
+# confirm equal fingerprints with an exact comparison inside SQLite
+result_compare_exact = os.getenv('RESULT_COMPARE_EXACT', 'False').lower() in ('1', 'true', 'yes')
+print(f"result_compare_exact: {result_compare_exact}")
+# on-disk store of gold query results under db_cache_dir, see MapleRepair/utils/gold_store.py
+gold_store_enable = os.getenv('GOLD_STORE_ENABLE', 'True').lower() in ('1', 'true', 'yes')
+print(f"gold_store_enable: {gold_store_enable}")
+# gold results with at most this many distinct rows are stored in full (for exact comparison), 0: fingerprints only
+gold_store_max_rows = int(os.getenv('GOLD_STORE_MAX_ROWS', 0))
+print(f"gold_store_max_rows: {gold_store_max_rows}")
+# LLM requests, see MapleRepair/utils/llm_api.py
+# max. requests in flight (async repair path)
+llm_concurrency = int(os.getenv('LLM_CONCURRENCY', 8))
+print(f"llm_concurrency: {llm_concurrency}")
+# tokens per minute, <= 0 means unlimited
+llm_tpm_limit = int(os.getenv('LLM_TPM_LIMIT', 0))
+print(f"llm_tpm_limit: {llm_tpm_limit}")
+# attempts per request (at least 1), with exponential back-off and jitter in between
+# only rate limits, timeouts, connection errors and server errors (5xx) are retried
+llm_max_retries = max(1, int(os.getenv('LLM_MAX_RETRIES', 5)))
+print(f"llm_max_retries: {llm_max_retries}")
+llm_retry_base_delay = float(os.getenv('LLM_RETRY_BASE_DELAY', 2))
+print(f"llm_retry_base_delay: {llm_retry_base_delay}")
+# on-disk cache of temperature 0 LLM responses under db_cache_dir, see MapleRepair/utils/llm_cache.py
+#   off: no cache, readwrite: reuse and record responses, replay: only reuse, a miss raises LLMCacheMissError
+llm_cache_mode = os.getenv('LLM_CACHE_MODE', 'readwrite')
+if llm_cache_mode not in ('off', 'readwrite', 'replay'):
+    raise ValueError(f"Unsupported llm_cache_mode! LLM_CACHE_MODE must be one of {('off', 'readwrite', 'replay')}")
+print(f"llm_cache_mode: {llm_cache_mode}")
+# classifier of is_date / is_time / is_number, see MapleRepair/utils/nlp.py
+#   rules: compiled patterns, rules+spacy: spaCy NER (loaded on first use) if the rules do not match, spacy: spaCy NER only
+nlp_backend = os.getenv('NLP_BACKEND', 'rules')
+if nlp_backend not in ('rules', 'rules+spacy', 'spacy'):
+    raise ValueError(f"Unsupported nlp_backend! NLP_BACKEND must be one of {('rules', 'rules+spacy', 'spacy')}")
+print(f"nlp_backend: {nlp_backend}")
+# date / time format inference, see MapleRepair/utils/profiler.py
+# non-empty values sampled per column, taken from the first DATE_FORMAT_SCAN_ROWS rows of the table
+date_format_samples = int(os.getenv('DATE_FORMAT_SAMPLES', 20))
+print(f"date_format_samples: {date_format_samples}")
+date_format_scan_rows = int(os.getenv('DATE_FORMAT_SCAN_ROWS', 1000))
+print(f"date_format_scan_rows: {date_format_scan_rows}")
+# share of samples the format of a column must cover to be used for repairs
+date_format_min_coverage = float(os.getenv('DATE_FORMAT_MIN_COVERAGE', 0.8))
+print(f"date_format_min_coverage: {date_format_min_coverage}")
+# column profiling at initialization, see MapleRepair/utils/profiler.py
+# a column stops being profiled (its statistics are queried instead) past PROFILE_MAX_DISTINCT distinct values
+# or PROFILE_MAX_LENGTH characters of distinct values
+profile_max_distinct = int(os.getenv('PROFILE_MAX_DISTINCT', 100000))
+print(f"profile_max_distinct: {profile_max_distinct}")
+profile_max_length = int(os.getenv('PROFILE_MAX_LENGTH', 5000000))
+print(f"profile_max_length: {profile_max_length}")
+# vector store: qdrant (server on localhost:6333) or numpy (in-process, under db_cache_dir), see MapleRepair/utils/vector_store.py
+vector_store = os.getenv('VECTOR_STORE', 'qdrant')
+if vector_store not in ('qdrant', 'numpy'):
+    raise ValueError(f"VECTOR_STORE must be qdrant or numpy, got {vector_store}")
+print(f"vector_store: {vector_store}")
+# fastembed model of both vector stores
+vector_embedding_model = os.getenv('VECTOR_EMBEDDING_MODEL', 'BAAI/bge-small-en')
+print(f"vector_embedding_model: {vector_embedding_model}")
+# numpy store: collections of at least this many points get an IVF index, 0: always exact search
+vector_ivf_min_points = int(os.getenv('VECTOR_IVF_MIN_POINTS', 50000))
+print(f"vector_ivf_min_points: {vector_ivf_min_points}")
+# numpy store: IVF lists searched per query
+vector_ivf_nprobe = int(os.getenv('VECTOR_IVF_NPROBE', 8))
+print(f"vector_ivf_nprobe: {vector_ivf_nprobe}")
+# memoized query embeddings (per process) and value lookups (per database)
+vector_query_cache_size = int(os.getenv('VECTOR_QUERY_CACHE_SIZE', 4096))
+print(f"vector_query_cache_size: {vector_query_cache_size}")
+# vector database ingestion
+# documents embedded and upserted per request
+vector_batch_size = int(os.getenv('VECTOR_BATCH_SIZE', 256))
+print(f"vector_batch_size: {vector_batch_size}")
+# data-parallel embedding processes per collection, 0: embed in the calling process
+vector_embed_parallel = int(os.getenv('VECTOR_EMBED_PARALLEL', 0))
+print(f"vector_embed_parallel: {vector_embed_parallel}")
+# databases vectorized concurrently by init_DBs
+vector_init_threads = int(os.getenv('VECTOR_INIT_THREADS', 4))
+print(f"vector_init_threads: {vector_init_threads}")
+
 DBs_name = [p.name for p in Path(db_root_path).iterdir() if p.is_dir()]
 
 #NOTE: The ORDER Matters
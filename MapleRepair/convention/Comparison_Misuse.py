@@ -26,7 +26,7 @@ class Comparison_Repairer(RepairerBase):
         self.llm_prompt = Comparison_Misuse_Prompt()
         
     def detect(self, sql: SQL, gold_sql: str, db_id: str, originalres: int) -> bool:
-        if sql.parsed is None:
+        if not sql.parsable:
             return False
         if not sql.qualified:
             return False
@@ -7,6 +7,7 @@ from func_timeout import FunctionTimedOut
 import difflib
 from typing import List, Tuple, Dict
 from MapleRepair.repairer_prompt import Value_Specification_Prompt
+from MapleRepair.config import db_probe_timeout
 
 COMPARE_OPS = (
     sqlglot.expressions.EQ,
@@ -36,7 +37,7 @@ def check_valid_condition(sql:SQL, expr:sqlglot.expressions) -> bool:
                     
     query = f"SELECT 1 FROM `{table}` WHERE {_expr} LIMIT 1;"
     db:Database = DBs[sql.db_id]
-    result = db.execute_query(query=query, idx=sql.question_id)
+    result = db.execute_query(query=query, idx=sql.question_id, timeout=db_probe_timeout)
     if result:
         return True
     return False
@@ -67,7 +68,7 @@ class Inconsistent_Condition_Repairer(RepairerBase):
         self.llm_prompt = Value_Specification_Prompt()
         
     def detect(self, sql:SQL, sql_gold:str, db_id:str, originalres:int) -> bool:
-        if sql.parsed is None: return False
+        if not sql.parsable: return False
         if not sql.qualified: return False
         if not sql.unaliased: return False
         self.suspect = []
@@ -115,6 +116,18 @@ class Inconsistent_Condition_Repairer(RepairerBase):
         assert sql.parsed and sql.qualified and sql.unaliased
         syntactically_similarity_threshold = 0.6
         db:Database = DBs[sql.db_id]
+        
+        # semantic lookups of all suspect values, embedded and searched together
+        semantic_lookups = {}
+        if self.enable_vector_search:
+            lookups = []
+            for expr in self.suspect:
+                table, column = expr.left.args['table'].args['table_name'], expr.left.args['this'].this
+                if db.get_column_info(table, column)['distinct_val'] is not None:
+                    lookups.append((table, column, expr.right.this))
+            if lookups:
+                semantic_lookups = dict(zip(lookups, db.val_vec_query_batch(lookups)))
+        
         recommendations = []
         for expr in self.suspect:
             left = expr.left
@@ -147,7 +160,7 @@ class Inconsistent_Condition_Repairer(RepairerBase):
                   
                 temp = []
                 if self.enable_vector_search:
-                    semantically_similar_vals_in_current_column = db.val_vec_query(table, column, value)
+                    semantically_similar_vals_in_current_column = semantic_lookups[(table, column, value)]
                     semantically_similar_vals_in_current_column = sorted(semantically_similar_vals_in_current_column, key=lambda x:x[1], reverse=True)
                     for semantically_similar_value, similarity in semantically_similar_vals_in_current_column:
                         if similarity >= 0.9:
@@ -158,15 +171,10 @@ class Inconsistent_Condition_Repairer(RepairerBase):
                 semantically_similar_vals_in_current_column = temp
             
             # search for "identical" value in all columns (except PK)
-            identical_vals_in_all_columns = []
-            for _table_name in db.schema.keys():
-                for _column_name, column_info in db.schema[_table_name].items():
-                    distinct_val = column_info['distinct_val']
-                    if distinct_val is None:
-                        continue
-                    for val in distinct_val:
-                        if value.lower() == val.lower():
-                            identical_vals_in_all_columns.append({"table":_table_name, "column":_column_name, "value":val})
+            identical_vals_in_all_columns = [
+                {"table":_table_name, "column":_column_name, "value":val}
+                for _table_name, _column_name, val in db.value_index.lookup(value)
+            ]
                             
             # search for "identical" value in all Primary Keys
             identical_vals_in_pks = []
@@ -23,7 +23,7 @@ class Inconsistent_IN_Repairer(RepairerBase):
         self._cache:Set[Tuple[str, bool]] = set()
         
     def detect(self, sql:SQL, sql_gold:str, db_id:str, originalres:int) -> bool:
-        if sql.parsed is None: return False
+        if not sql.parsable: return False
         if not sql.qualified:  return False
         if not sql.unaliased:  return False
         
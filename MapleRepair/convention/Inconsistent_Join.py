@@ -22,7 +22,7 @@ class Inconsistent_Join_Repairer(RepairerBase):
         self._cache:Set[Tuple[str, bool]] = set()
         
     def detect(self, sql:SQL, sql_gold:str, db_id:str, originalres:int) -> bool:
-        if sql.parsed is None:
+        if not sql.parsable:
             return False
         if not sql.qualified:
             return False
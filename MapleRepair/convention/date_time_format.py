@@ -32,6 +32,16 @@ class Date_Time_Format_Repairer(RepairerBase):
         self.detected = False
 
 
+    def column_format(self, db: str, table_name: str, column_name: str, kind: str) -> Optional[tuple[str, str]]:
+        """
+        The 'date_format' / 'time_format' (`kind`) of the column, `None` if its samples
+        were covered by less than `date_format_min_coverage` (schemas without coverage are trusted).
+        """
+        column_info = DBs[db].get_column_info(table_name, column_name)
+        if column_info.get(f'{kind}_coverage', 1.0) < date_format_min_coverage:
+            return None
+        return column_info.get(kind, None)
+
     def alter_date_time_format(self, literal: str, target_format: tuple[str, str]) -> str:
         '''
         Brief:
@@ -83,8 +93,8 @@ class Date_Time_Format_Repairer(RepairerBase):
                 if node.this.this is not None:
                     column_name = node.this.name
 
-                date_format = DBs[db].get_column_info(table_name, column_name).get('date_format', None)
-                time_format = DBs[db].get_column_info(table_name, column_name).get('time_format', None)
+                date_format = self.column_format(db, table_name, column_name, 'date_format')
+                time_format = self.column_format(db, table_name, column_name, 'time_format')
                 
                 if date_format is not None:
                     corrected_literal = self.alter_date_time_format(node.expression.name, date_format)
@@ -118,8 +128,8 @@ class Date_Time_Format_Repairer(RepairerBase):
                     column_name = node.this.name
 
                 
-                date_format = DBs[db].get_column_info(table_name, column_name).get('date_format', None)
-                time_format = DBs[db].get_column_info(table_name, column_name).get('time_format', None)
+                date_format = self.column_format(db, table_name, column_name, 'date_format')
+                time_format = self.column_format(db, table_name, column_name, 'time_format')
                 
                 if date_format is not None:
                     corrected_low = self.alter_date_time_format(node.args['low'].name, date_format)
@@ -153,7 +163,7 @@ class Date_Time_Format_Repairer(RepairerBase):
         return str(repaired_expression), self.detected
         
     def repair(self, sql: SQL, gold_sql: str, db_id: str, originalres: int) -> Tuple[SQL, int]:
-        if sql.parsed is None\
+        if not sql.parsable\
             or not sql.qualified\
             or not sql.unaliased:
             return sql, originalres
@@ -176,7 +186,7 @@ class Date_Time_Format_Repairer(RepairerBase):
         return sql, res
     
     def detect(self, sql: SQL, gold_sql: str, db_id: str, originalres: int) -> bool:
-        if sql.parsed is None\
+        if not sql.parsable\
             or not sql.qualified\
             or not sql.unaliased:
                 return False
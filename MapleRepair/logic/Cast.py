@@ -5,7 +5,6 @@ from MapleRepair.repairer_base import RepairerBase
 from MapleRepair.SQL import SQL
 from MapleRepair.Database import DBs, Database
 from MapleRepair.utils.sqlite_dialect import SQLite_Dialects
-from copy import deepcopy
 from typing import Tuple
 
 def cast_repair(sql:SQL) -> Tuple[str, bool]:
@@ -15,7 +14,7 @@ def cast_repair(sql:SQL) -> Tuple[str, bool]:
         bool: Whether given sql is detected.
     """
     db:Database = DBs[sql.db_id]
-    _sql = deepcopy(sql)
+    _sql = sql.fork()
     
     def valid_div(left, right):        
         for operand in (left, right):
@@ -45,6 +44,8 @@ def cast_repair(sql:SQL) -> Tuple[str, bool]:
                 pass
         return False
     
+    # cumulative rewrites, one more CAST per candidate
+    candidates = []
     for div_node in _sql.parsed.find_all(sqlglot.expressions.Div):
         left = div_node.left
         right = div_node.right
@@ -54,11 +55,14 @@ def cast_repair(sql:SQL) -> Tuple[str, bool]:
             
         cast_node = cast(div_node.left, sqlglot.expressions.DataType.build('float', 'sqlite'))
         div_node.left.replace(cast_node)
-        same, errmsg = db.execution_match(sql.parsed.sql(dialect=SQLite_Dialects), _sql.parsed.sql(dialect=SQLite_Dialects), True)
-        if not same:
-            return _sql.parsed.sql(dialect=SQLite_Dialects), True
+        candidates.append(_sql.parsed.sql(dialect=SQLite_Dialects))
+    
+    original = sql.parsed.sql(dialect=SQLite_Dialects)
+    divergent = db.first_divergent(original, candidates)
+    if divergent is not None:
+        return candidates[divergent], True
             
-    return sql.parsed.sql(dialect=SQLite_Dialects), False
+    return original, False
 
 class Div_Cast_Repairer(RepairerBase):
     """
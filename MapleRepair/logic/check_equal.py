@@ -71,7 +71,7 @@ def transform(self, fun: Callable, *args:any, copy: bool = True, **kwargs) -> sq
 def execute_subquery(query:str, db_id:str, idx) -> list:
     db:Database = DBs[db_id]
     try:
-        result:list = db.execute_query(query, 2, idx)
+        result:list = db.execute_cached(query, 2, idx)
     except Exception as e:
         # print(f'Execution Error: {e} when executing {query} in {db_id}')
         return []
@@ -96,7 +96,7 @@ def run_patching(sql:SQL, db_id:str) -> tuple[bool, str]:
     sqlglot.Expression.dfs = postorder_dfs
     sqlglot.Expression.transform = transform
     
-    if sql.parsed is None:
+    if not sql.parsable:
         return (False, sql)
     
     expression = sql.parsed.copy()
@@ -13,7 +13,7 @@ class Subquery_MINMAX_Repairer(RepairerBase):
         self.llm_prompt = Subquery_MINMAX_Prompt()
         
     def detect(self, sql: SQL, gold_sql: str, db_id: str, originalres: int) -> bool:
-        if sql.parsed is None:
+        if not sql.parsable:
             return False
         if not sql.qualified:
             return False
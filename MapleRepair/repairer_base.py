@@ -12,7 +12,7 @@ from MapleRepair.config import result_root_dir
 from typing import List, Dict, Any
 from pathlib import Path
 import json
-from MapleRepair.utils.persistence import make_log
+from MapleRepair.utils.persistence import get_log_sink
 
 FAKE_REPAIR_DEBUG = False
 
@@ -31,6 +31,11 @@ def repair_statistics():
     raise NotImplementedError
 
 class RepairerBase(ABC):
+    # statistic lists merged back from worker processes, see `drain_statistics`
+    STATISTIC_LISTS = ('false_detecting', 'success_detected', 'false_repairing', 'success_repairing', 'fail_rapairing', 'not_detected')
+    # integer counters merged back from worker processes
+    STATISTIC_COUNTERS = ()
+    
     def __init__(self):
         self.false_detecting = []
         self.success_detected = []
@@ -66,12 +71,6 @@ class RepairerBase(ABC):
             self.false_repairing.append((sql.question_id, sql.statement, gold_sql, db_id, originalres, res))
             
     def logging(self, idx:int, before_sql:str, after_sql:str, call_llm:bool, details:dict) -> None:
-        log_path = result_root_dir / "sql_logs" / f"{idx}.json"
-        if log_path.exists():
-            log:List[Dict] = read_json(log_path)
-        else:
-            log:List[Dict] = []
-        # append log
         this_log = {
             "repairer": self.__class__.__name__,
             "before_sql": before_sql,
@@ -79,9 +78,30 @@ class RepairerBase(ABC):
             "call_llm": call_llm,
             "details": details
         }
-        log.append(this_log)
-        content = json.dumps(log)
-        make_log(log_path, content)
+        get_log_sink().append("sql_logs", idx, this_log)
+            
+    def drain_statistics(self) -> Dict[str, Any]:
+        """
+        Return statistics collected since the last drain and reset them.
+        `exception_case` stays local, it holds SQL objects for debugging only.
+        """
+        stats = {}
+        for name in self.STATISTIC_LISTS:
+            stats[name] = getattr(self, name)
+            setattr(self, name, [])
+        for name in self.STATISTIC_COUNTERS:
+            stats[name] = getattr(self, name)
+            setattr(self, name, 0)
+        return stats
+    
+    def merge_statistics(self, stats:Dict[str, Any]) -> None:
+        """
+        Append statistics drained from another process (the inverse of `drain_statistics`).
+        """
+        for name in self.STATISTIC_LISTS:
+            getattr(self, name).extend(stats[name])
+        for name in self.STATISTIC_COUNTERS:
+            setattr(self, name, getattr(self, name) + stats[name])
             
     def exception_case_update(self, sql:SQL, gold_sql:str, db_id:str, originalres:int):
         self.exception_case.append((sql, gold_sql, db_id, originalres))
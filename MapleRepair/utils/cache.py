@@ -0,0 +1,148 @@
+import re
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+_SQL_TOKEN = re.compile(
+    r"""--[^\n]*|/\*.*?(?:\*/|$)"""                                 # comments
+    r"""|'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]"""    # quoted literals / identifiers
+    r"""|\s+|(?:(?!--|/\*)[^\s'"`\[])+|.""",
+    re.S
+)
+
+def normalize_sql(query:str) -> str:
+    """
+    Normalize SQL text for cache keys: collapse whitespace outside of quoted
+    literals/identifiers and comments, and drop trailing semicolons.
+    Quoted parts and comments are kept verbatim, a line comment keeps the line break
+    that ends it (otherwise it would swallow the rest of the statement).
+    """
+    tokens = []
+    for token in _SQL_TOKEN.findall(query):
+        if token.isspace():
+            tokens.append('\n' if tokens and tokens[-1].startswith('--') else ' ')
+        else:
+            tokens.append(token)
+    return ''.join(tokens).strip().rstrip(';').strip()
+
+class LRU_Cache():
+    """
+    Bounded least-recently-used cache with hit/miss counters.
+    `None` is reserved for "miss", do not store it as a value.
+    """
+    def __init__(self, maxsize:int):
+        self.maxsize = maxsize
+        self._data:OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key:Hashable) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key:Hashable, value:Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+def _estimate_size(rows:List[tuple]) -> int:
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+class Result_Cache():
+    """
+    Memory-bounded LRU cache of query results, keyed by statement.
+
+    An entry remembers how many rows were fetched. A result fetched with limit N
+    answers any request for up to N rows; it is complete (answers every request)
+    if it was fetched without limit or returned fewer than N rows.
+    """
+    def __init__(self, max_bytes:int, max_entry_ratio:float=0.125):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = int(max_bytes * max_entry_ratio)
+        self._data:OrderedDict = OrderedDict()  # key -> (rows, complete, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key:Hashable, limit:Optional[int]=None) -> Optional[List[tuple]]:
+        """
+        Args:
+            limit (Optional[int]): number of rows wanted, `None` means all rows.
+        Returns:
+            a new list of rows, `None` if the request can not be answered from cache.
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            rows, complete, _ = entry
+            if complete or (limit is not None and limit <= len(rows)):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return rows[:limit] if limit is not None else list(rows)
+        self.misses += 1
+        return None
+
+    def put(self, key:Hashable, rows:List[tuple], complete:bool) -> None:
+        entry = self._data.get(key)
+        if entry is not None:
+            old_rows, old_complete, old_size = entry
+            if old_complete or (not complete and len(old_rows) >= len(rows)):
+                # cached entry already answers at least as much.
+                return
+        size = _estimate_size(rows)
+        if size > self.max_entry_bytes:
+            return
+        if entry is not None:
+            self.bytes -= entry[2]
+        self._data[key] = (list(rows), complete, size)
+        self._data.move_to_end(key)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
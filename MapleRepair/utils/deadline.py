@@ -0,0 +1,49 @@
+import sqlite3
+import time
+from typing import Optional
+
+from MapleRepair.Customized_Exception import QueryTimedOut
+
+# number of SQLite VM instructions between two deadline checks
+PROGRESS_STEPS = 1000
+
+class Query_Deadline():
+    """
+    Abort a runaway query cooperatively with SQLite's progress handler.
+
+    No helper thread is involved: SQLite calls back every `PROGRESS_STEPS` VM
+    instructions and the statement is interrupted once the deadline passes,
+    leaving the connection usable. Fast queries pay at most a few clock reads.
+
+    Usage:
+        with Query_Deadline(conn, timeout=5):
+            cursor.execute(query)
+            rows = cursor.fetchall()
+
+    Raises:
+        QueryTimedOut: (a `FunctionTimedOut`) when the deadline is exceeded.
+    """
+    def __init__(self, conn:sqlite3.Connection, timeout:Optional[float]):
+        self.conn = conn
+        self.timeout = timeout
+        self.deadline:float = None
+        self.expired:bool = False
+
+    def _check(self) -> int:
+        if time.monotonic() > self.deadline:
+            self.expired = True
+            return 1
+        return 0
+
+    def __enter__(self):
+        if self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+            self.conn.set_progress_handler(self._check, PROGRESS_STEPS)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.timeout is not None:
+            self.conn.set_progress_handler(None, 0)
+        if self.expired and exc_type is not None and issubclass(exc_type, sqlite3.OperationalError):
+            raise QueryTimedOut(f"Query exceeded its deadline of {self.timeout} seconds.", self.timeout) from exc
+        return False
@@ -1,4 +1,6 @@
+import bisect
 from functools import total_ordering
+from typing import Dict, List, Optional, Set, Tuple
 
 @total_ordering
 class TableColumnPair:
@@ -50,3 +52,64 @@ class DSU:
 
     def same(self, x, y) -> bool:
         return self.find(x) == self.find(y)
+
+
+class Value_Index:
+    """
+    Inverted index of the distinct values of a database: lowercased value ->
+    [(table, column, value)], in schema order. Keys are lowercased with `str.lower`
+    (the comparison `value.lower() == val.lower()` it replaces).
+    `keys` (sorted) serves prefix lookups; the trigram postings for fuzzy candidates
+    are built on first use and not pickled.
+    """
+    def __init__(self, schema:dict):
+        self.index:Dict[str, List[Tuple[str, str, str]]] = {}
+        for table in schema.keys():
+            for column, column_info in schema[table].items():
+                distinct_val = column_info['distinct_val']
+                if distinct_val is None:
+                    continue
+                for value in distinct_val:
+                    self.index.setdefault(value.lower(), []).append((table, column, value))
+        self.keys:List[str] = sorted(self.index)
+        self._ngrams:Optional[Dict[str, Set[str]]] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_ngrams'] = None
+        return state
+
+    def lookup(self, value:str) -> List[Tuple[str, str, str]]:
+        """
+        Columns holding `value` (case-insensitively) as (table, column, stored value).
+        """
+        return self.index.get(value.lower(), [])
+
+    def prefix(self, prefix:str) -> List[str]:
+        """
+        Lowercased values starting with `prefix` (case-insensitively), sorted.
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(prefix):
+            end += 1
+        return self.keys[start:end]
+
+    def ngram(self, text:str, limit:int=10) -> List[str]:
+        """
+        Up to `limit` lowercased values sharing character trigrams with `text`, most shared first.
+        """
+        if self._ngrams is None:
+            self._ngrams = {}
+            for key in self.keys:
+                for gram in _trigrams(key):
+                    self._ngrams.setdefault(gram, set()).add(key)
+        shared:Dict[str, int] = {}
+        for gram in _trigrams(text.lower()):
+            for key in self._ngrams.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        return sorted(shared, key=lambda key: (-shared[key], key))[:limit]
+
+def _trigrams(text:str) -> Set[str]:
+    return {text[i:i + 3] for i in range(max(len(text) - 2, 1))}
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from func_timeout import FunctionTimedOut
+
+from MapleRepair.config import dataset, data_split, db_cache_dir, gold_store_max_rows
+from MapleRepair.Customized_Exception import QueryTimedOut, StoredQueryError
+from MapleRepair.utils.result_compare import Result_Fingerprint, query_fingerprint
+
+class Gold_Result_Store():
+    """
+    Persistent store of gold query results (one SQLite file), so that evaluation
+    only executes the predicted / repaired SQL.
+
+    An entry is keyed by the sha256 of (dataset, data_split, db_id, gold SQL) and holds
+    the `Result_Fingerprint` of the gold result, its distinct rows (columnar, zlib-compressed
+    pickle) if there are at most `max_rows` of them, or the error of the gold query.
+    A timeout is replayed only for deadlines not longer than the one it hit.
+    Entries are recomputed when the database file changed (mtime / size).
+    The file may be shared by several processes, each opens its own connection.
+    """
+    def __init__(self, path:Path, max_rows:int=gold_store_max_rows):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn:sqlite3.Connection = None
+        self._pid:int = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(db_id:str, gold_sql:str) -> str:
+        content = json.dumps([dataset, data_split, db_id, gold_sql], ensure_ascii=False)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def db_stamp(db_path:Path) -> str:
+        stat = os.stat(db_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS gold_results (
+                    key TEXT PRIMARY KEY,
+                    db_id TEXT,
+                    db_stamp TEXT,
+                    gold_sql TEXT,
+                    fingerprint TEXT,
+                    rows BLOB,
+                    error TEXT,
+                    timeout REAL,
+                    created REAL
+                )
+            """)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _store(self, key:str, db_id:str, stamp:str, gold_sql:str, fingerprint:Optional[Result_Fingerprint],
+               rows:Optional[List[tuple]], error:Optional[str], timeout:Optional[float]) -> None:
+        blob = None
+        if rows is not None:
+            blob = zlib.compress(pickle.dumps(list(zip(*rows)), protocol=pickle.HIGHEST_PROTOCOL))
+        state = json.dumps(fingerprint.to_dict()) if fingerprint is not None else None
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO gold_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, db_id, stamp, gold_sql, state, blob, error, timeout, time.time())
+            )
+
+    def gold_result(self, conn:sqlite3.Connection, db_id:str, db_path:Path, gold_sql:str,
+                    timeout:Optional[float], per_column:bool=False) -> Tuple[Result_Fingerprint, Optional[List[tuple]]]:
+        """
+        Fingerprint (and stored rows) of the result of `gold_sql`, executed on `conn` if not stored yet
+        (or if a `per_column` fingerprint is asked for and the stored one is not).
+
+        Returns:
+            (fingerprint, distinct rows or `None` if not stored)
+        Exceptions:
+            the error of `gold_sql`: QueryTimedOut (FunctionTimedOut) on timeout,
+            the sqlite error or a `StoredQueryError` with its message.
+        """
+        key = self.make_key(db_id, gold_sql)
+        stamp = self.db_stamp(db_path)
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT fingerprint, rows, error, timeout FROM gold_results WHERE key = ? AND db_stamp = ?", (key, stamp)
+            ).fetchone()
+        if row is not None:
+            state, blob, error, stored_timeout = row
+            if error is None:
+                fingerprint = Result_Fingerprint.from_dict(json.loads(state))
+                if fingerprint.columns is not None or not per_column:
+                    self.hits += 1
+                    rows = list(zip(*pickle.loads(zlib.decompress(blob)))) if blob is not None else None
+                    return fingerprint, rows
+            elif stored_timeout is None:
+                self.hits += 1
+                raise StoredQueryError(error)
+            elif timeout is not None and timeout <= stored_timeout:
+                self.hits += 1
+                raise QueryTimedOut(error, stored_timeout)
+        self.misses += 1
+
+        rows = [] if self.max_rows > 0 else None
+        try:
+            fingerprint = query_fingerprint(conn, gold_sql, timeout, rows_out=rows, per_column=per_column, rows_limit=self.max_rows)
+        except FunctionTimedOut as fto:
+            self._store(key, db_id, stamp, gold_sql, None, None, "timeout", timeout)
+            raise
+        except sqlite3.Error as e:
+            self._store(key, db_id, stamp, gold_sql, None, None, str(e), None)
+            raise
+        # rows are dropped during the scan once there are more than `max_rows`
+        if rows is not None and len(rows) != fingerprint.count:
+            rows = None
+        self._store(key, db_id, stamp, gold_sql, fingerprint, rows, None, None)
+        return fingerprint, rows
+
+gold_store = Gold_Result_Store(Path(db_cache_dir or ".cache") / "gold_results.sqlite")
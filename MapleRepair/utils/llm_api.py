@@ -1,19 +1,92 @@
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from MapleRepair.config import openai_api_key, openai_base_url
-from typing import Union, List, Tuple
-from retry import retry
+from MapleRepair.config import llm_concurrency, llm_tpm_limit, llm_max_retries, llm_retry_base_delay
+from typing import Union, List, Tuple, Optional
 from pathlib import Path
 from MapleRepair.config import default_model
+from MapleRepair.utils.llm_cache import llm_cache
+import asyncio
+import random
+import threading
+import time
 
 openai_client = OpenAI(
-    api_key=openai_api_key, 
+    api_key=openai_api_key,
     base_url=openai_base_url
 )
 
-@retry(tries=5, delay=3)
-def gpt_request(prompt:str, model:str=default_model, temperature:float=0, use_json:bool=False, log_path:Path=None) -> Tuple[str, dict]:
-    result = openai_client.chat.completions.create(
+# created on first use, inside the running event loop
+async_openai_client:AsyncOpenAI = None
+_async_semaphore:asyncio.Semaphore = None
+
+# rough number of completion tokens reserved per request before the usage is known
+COMPLETION_TOKENS_ESTIMATE = 512
+# upper bound of a single back-off sleep (seconds)
+MAX_RETRY_DELAY = 60
+
+class Token_Rate_Limiter():
+    """
+    Token bucket of `tokens_per_minute`, shared by the sync and the async API.
+
+    A request reserves its estimated tokens up front (the bucket may go into debt)
+    and waits until the debt is paid back at `tokens_per_minute / 60` per second.
+    The estimate is corrected with the actual usage afterwards.
+    `tokens_per_minute <= 0` disables the limiter.
+    """
+    def __init__(self, tokens_per_minute:int):
+        self.tokens_per_minute = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.tokens = float(tokens_per_minute)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.tokens_per_minute, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def reserve(self, tokens:int) -> float:
+        """
+        Returns:
+            seconds to wait before sending the request.
+        """
+        if self.tokens_per_minute <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def correct(self, estimated:int, actual:int) -> None:
+        if self.tokens_per_minute <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens += estimated - actual
+
+rate_limiter = Token_Rate_Limiter(llm_tpm_limit)
+
+def _estimate_tokens(prompt:str) -> int:
+    return len(prompt) // 4 + COMPLETION_TOKENS_ESTIMATE
+
+def _backoff_delay(attempt:int) -> float:
+    """
+    Exponential back-off with full jitter for the `attempt`-th retry (0-based).
+    """
+    return random.uniform(0, min(MAX_RETRY_DELAY, llm_retry_base_delay * 2 ** attempt))
+
+def _is_transient(e:Exception) -> bool:
+    """
+    Rate limits, timeouts, connection errors and server errors are retried,
+    other errors (bad request, authentication, unknown model, ...) are raised at once.
+    """
+    if isinstance(e, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+def _completion_kwargs(prompt:str, model:str, temperature:float, response_format:str) -> dict:
+    return dict(
         messages = [
             {
                 'role': 'user',
@@ -22,11 +95,10 @@ def gpt_request(prompt:str, model:str=default_model, temperature:float=0, use_js
         ],
         model = model,
         temperature = temperature,
-        response_format = { "type": "json_object" if use_json else "text"}
+        response_format = { "type": response_format }
     )
-    s_result = result.choices[0].message.content
-    usage = result.usage.model_dump()
-    
+
+def _write_log(log_path:Optional[Path], prompt:str, s_result:str) -> None:
     if log_path:
         with open(log_path, 'a') as f:
             f.write("\n===== Prompt =====\n")
@@ -34,7 +106,79 @@ def gpt_request(prompt:str, model:str=default_model, temperature:float=0, use_js
             f.write("\n===== LLM's Response =====\n")
             f.write(s_result)
             f.write("\n===== LLM End =====\n")
+
+def gpt_request(prompt:str, model:str=default_model, temperature:float=0, use_json:bool=False, log_path:Path=None) -> Tuple[str, dict]:
+    """
+    Responses are served from / recorded in `llm_cache`.
+    
+    Exceptions:
+        the last error once `llm_max_retries` attempts failed, a non-transient error (see `_is_transient`) at once.
+        LLMCacheMissError on a cache miss in replay mode.
+    """
+    response_format = "json_object" if use_json else "text"
+    cached = llm_cache.lookup(model, temperature, response_format, prompt)
+    if cached is not None:
+        _write_log(log_path, prompt, cached[0])
+        return cached
+    
+    estimated = _estimate_tokens(prompt)
+    for attempt in range(llm_max_retries):
+        time.sleep(rate_limiter.reserve(estimated))
+        try:
+            result = openai_client.chat.completions.create(**_completion_kwargs(prompt, model, temperature, response_format))
+            break
+        except Exception as e:
+            rate_limiter.correct(estimated, 0)
+            if attempt == llm_max_retries - 1 or not _is_transient(e):
+                raise
+            time.sleep(_backoff_delay(attempt))
+    s_result = result.choices[0].message.content
+    usage = result.usage.model_dump()
+    rate_limiter.correct(estimated, usage['total_tokens'])
+    llm_cache.store(model, temperature, response_format, prompt, s_result, usage)
+
+    _write_log(log_path, prompt, s_result)
+
+    return s_result, usage
+
+async def async_gpt_request(prompt:str, model:str=default_model, temperature:float=0, use_json:bool=False, log_path:Path=None) -> Tuple[str, dict]:
+    """
+    Async counterpart of `gpt_request`, at most `llm_concurrency` requests are in flight.
+
+    Exceptions:
+        the last error once `llm_max_retries` attempts failed, a non-transient error (see `_is_transient`) at once.
+        LLMCacheMissError on a cache miss in replay mode.
+    """
+    global async_openai_client, _async_semaphore
+    response_format = "json_object" if use_json else "text"
+    cached = llm_cache.lookup(model, temperature, response_format, prompt)
+    if cached is not None:
+        _write_log(log_path, prompt, cached[0])
+        return cached
     
+    if async_openai_client is None:
+        async_openai_client = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url)
+        _async_semaphore = asyncio.Semaphore(llm_concurrency)
+
+    estimated = _estimate_tokens(prompt)
+    async with _async_semaphore:
+        for attempt in range(llm_max_retries):
+            await asyncio.sleep(rate_limiter.reserve(estimated))
+            try:
+                result = await async_openai_client.chat.completions.create(**_completion_kwargs(prompt, model, temperature, response_format))
+                break
+            except Exception as e:
+                rate_limiter.correct(estimated, 0)
+                if attempt == llm_max_retries - 1 or not _is_transient(e):
+                    raise
+                await asyncio.sleep(_backoff_delay(attempt))
+    s_result = result.choices[0].message.content
+    usage = result.usage.model_dump()
+    rate_limiter.correct(estimated, usage['total_tokens'])
+    llm_cache.store(model, temperature, response_format, prompt, s_result, usage)
+
+    _write_log(log_path, prompt, s_result)
+
     return s_result, usage
 
 def get_embedding(texts:List[str], model="text-embedding-3-small"):
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from MapleRepair.config import db_cache_dir, llm_cache_mode
+from MapleRepair.Customized_Exception import LLMCacheMissError
+
+class LLM_Response_Cache():
+    """
+    Content-addressed, persistent cache of LLM responses (one SQLite file).
+
+    A response is keyed by the sha256 of (model, temperature, response format, prompt),
+    its `usage` dict is stored alongside. Only deterministic requests (temperature 0) are cached,
+    sampled responses are never reused. Modes:
+        off:       no lookup, nothing stored.
+        readwrite: reuse cached responses, store new ones.
+        replay:    reuse cached responses, a miss raises `LLMCacheMissError`
+                   (offline runs reproduce LLM results without network access),
+                   so does every request with a temperature above 0.
+    The file may be shared by several processes, each opens its own connection.
+    """
+    def __init__(self, path:Path, mode:str=llm_cache_mode):
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._conn:sqlite3.Connection = None
+        self._pid:int = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model:str, temperature:float, response_format:str, prompt:str) -> str:
+        content = json.dumps([model, float(temperature), response_format, prompt], ensure_ascii=False)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def cacheable(temperature:float) -> bool:
+        return temperature == 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    temperature REAL,
+                    response_format TEXT,
+                    prompt TEXT,
+                    response TEXT,
+                    usage TEXT,
+                    created REAL
+                )
+            """)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def lookup(self, model:str, temperature:float, response_format:str, prompt:str) -> Optional[Tuple[str, dict]]:
+        """
+        Returns:
+            (response, usage), `None` on a miss or if the cache is off.
+        Exceptions:
+            LLMCacheMissError on a miss in replay mode.
+        """
+        if self.mode == 'off':
+            return None
+        key = self.make_key(model, temperature, response_format, prompt)
+        if not self.cacheable(temperature):
+            if self.mode == 'replay':
+                raise LLMCacheMissError(f"LLM responses with temperature {temperature} are not cached, request {key} can not be replayed.")
+            return None
+        with self._lock:
+            row = self._connection().execute("SELECT response, usage FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            if self.mode == 'replay':
+                raise LLMCacheMissError(f"No cached LLM response for request {key} (model={model}, temperature={temperature}).")
+            return None
+        self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def store(self, model:str, temperature:float, response_format:str, prompt:str, response:str, usage:dict) -> None:
+        if self.mode != 'readwrite' or not self.cacheable(temperature):
+            return
+        key = self.make_key(model, temperature, response_format, prompt)
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, temperature, response_format, prompt, response, json.dumps(usage), time.time())
+            )
+
+llm_cache = LLM_Response_Cache(Path(db_cache_dir or ".cache") / "llm_cache.sqlite")
@@ -1,25 +1,112 @@
-import spacy
+import re
+from datetime import datetime
 
+from MapleRepair.config import DATE_FORMATS, TIME_FORMATS, nlp_backend
 
-nlp = spacy.load("en_core_web_sm")
+# Rule-based replacement of spaCy NER (DATE / TIME / CARDINAL entities) for single cell values.
+# A value starting with a valid date / time of a format of DATE_FORMATS / TIME_FORMATS (the prefix
+# `profiler.infer_format` matches) is classified as date / time if nothing but fractional seconds, 'Z' or
+# a UTC offset follows; a value merely starting like one ('18-25', '10-15 years', '10:30 verse') is not.
 
-def is_date(date_str) -> bool:
-    doc = nlp(date_str)
-    for ent in doc.ents:
-        if ent.label_ == 'DATE':
+_MONTHS = r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?'
+_WEEKDAYS = r'(?:mon|tues?|wed(?:nes)?|thu(?:rs?)?|fri|sat(?:ur)?|sun)(?:day)?'
+_NUMBER_WORDS = (r'(?:zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen|sixteen'
+                 r'|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety|hundred|thousand|million|billion|dozen)')
+
+# single-digit month / day (2012/3/4), accepted by strptime
+_NUMERIC_DATE_FORMATS = [(r'(\d{4})/(\d{1,2})/(\d{1,2})', '%Y/%m/%d'), (r'(\d{4})-(\d{1,2})-(\d{1,2})', '%Y-%m-%d')]
+_DATE_PATTERNS = [(re.compile(pattern), format) for pattern, format in DATE_FORMATS + _NUMERIC_DATE_FORMATS]
+_TIME_PATTERNS = [(re.compile(pattern), format) for pattern, format in TIME_FORMATS]
+# what may follow the matched date / time: fractional seconds after seconds, 'Z' / UTC offset after
+# HH:MM:SS (not after HH:MM, '10:30-11:00' is a range)
+_FRACTION = re.compile(r'\.\d+')
+_ZONE = re.compile(r'(?:\.\d+)?(?:Z|[+-]\d{2}(?::?\d{2})?)', re.IGNORECASE)
+
+_TEXTUAL_DATE = re.compile(
+    r'\s*(?:'
+    rf'{_MONTHS}(?:\s+\d{{1,2}}(?:st|nd|rd|th)?)?(?:,?\s+\d{{2,4}})?'             # March 5, 2020 / Mar 2020 / March
+    rf'|\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTHS}(?:,?\s+\d{{2,4}})?'      # 5 March 2020 / 5th of March
+    rf'|{_WEEKDAYS}'                                                             # Monday
+    r'|(?:1[5-9]|20)\d{2}s?'                                                     # 1998 / 1990s
+    r"|(?:1[5-9]|20)\d0's"                                                       # 1990's
+    r'|\d{1,2}/\d{1,2}/\d{2,4}'                                                  # 5/3/2020
+    r'|(?:today|yesterday|tomorrow|(?:this|last|next)\s+(?:week|month|year))'
+    r')\s*$',
+    re.IGNORECASE
+)
+_TEXTUAL_TIME = re.compile(
+    r'\s*(?:'
+    r'\d{1,2}(?::\d{2}(?::\d{2})?)?\s*(?:a\.?m\.?|p\.?m\.?)'                     # 5 pm / 5:30 a.m.
+    r"|\d{1,2}\s*o'clock"
+    r'|noon|midnight|(?:this\s+)?(?:morning|afternoon|evening|tonight)'
+    r')\s*$',
+    re.IGNORECASE
+)
+_NUMBER = re.compile(
+    r'\s*(?:'
+    r'[+-]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?'                                 # 12 / 1,234 / -3.5
+    r'|[+-]?\.\d+'                                                               # .5
+    rf'|{_NUMBER_WORDS}(?:[\s-]+(?:and\s+)?{_NUMBER_WORDS})*'                     # twenty-one / one hundred
+    r')\s*$',
+    re.IGNORECASE
+)
+
+def _in_format(text:str, patterns) -> bool:
+    # the matched prefix parses with its strftime format (no month 18) and only an allowed suffix follows
+    text = text.strip()
+    for pattern, format in patterns:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        rest = text[match.end():]
+        if rest:
+            allowed = ((format.endswith(('%S', '%f')) and _FRACTION.fullmatch(rest))
+                       or ('%H' in format and '%S' in format and _ZONE.fullmatch(rest)))
+            if not allowed:
+                continue
+        try:
+            datetime.strptime(match.group(0), format)
             return True
+        except ValueError:
+            continue
     return False
-    
-def is_time(time_str) -> bool:
-    doc = nlp(time_str)
+
+def _is_date_rules(text:str) -> bool:
+    return _in_format(text, _DATE_PATTERNS) or _TEXTUAL_DATE.match(text) is not None
+
+def _is_time_rules(text:str) -> bool:
+    return _in_format(text, _TIME_PATTERNS) or _TEXTUAL_TIME.match(text) is not None
+
+def _is_number_rules(text:str) -> bool:
+    return _NUMBER.match(text) is not None
+
+# loaded on first use, only if `nlp_backend` asks for spaCy
+_nlp = None
+
+def _spacy_label(text:str, label:str) -> bool:
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load("en_core_web_sm")
+    doc = _nlp(text)
     for ent in doc.ents:
-        if ent.label_ == 'TIME':
+        if ent.label_ == label:
             return True
     return False
 
+def _classify(value, rules, label:str) -> bool:
+    text = value if isinstance(value, str) else str(value)
+    if nlp_backend == 'spacy':
+        return _spacy_label(text, label)
+    if rules(text):
+        return True
+    return nlp_backend == 'rules+spacy' and _spacy_label(text, label)
+
+def is_date(date_str) -> bool:
+    return _classify(date_str, _is_date_rules, 'DATE')
+
+def is_time(time_str) -> bool:
+    return _classify(time_str, _is_time_rules, 'TIME')
+
 def is_number(number_str) -> bool:
-    doc = nlp(number_str)
-    for ent in doc.ents:
-        if ent.label_ == 'CARDINAL':
-            return True
-    return False
\ No newline at end of file
+    return _classify(number_str, _is_number_rules, 'CARDINAL')
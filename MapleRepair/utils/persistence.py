@@ -1,8 +1,121 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, List, Optional
+import atexit
+import json
+import os
+import threading
+import time
 
 def make_log(log_path:Path, content:Any) -> None:
     dir_path = log_path.parent
     dir_path.mkdir(parents=True, exist_ok=True)
     log_path.touch()
-    log_path.write_text(content)
\ No newline at end of file
+    log_path.write_text(content)
+
+class Log_Sink():
+    """
+    Buffered, append-only JSON Lines logs: one `<stream>.jsonl` file per stream
+    (e.g. "sql_logs", "db_overhead") in `root_dir`, one line `{"idx": idx, **entry}` per entry.
+
+    Buffers are written with a single `O_APPEND` write per stream, so processes
+    sharing a result directory never interleave lines. They are flushed every
+    `flush_entries` entries or `flush_interval` seconds, before fork and at exit.
+    Use `read_log` to get the per-question view back.
+    """
+    def __init__(self, root_dir:Path, flush_entries:int=512, flush_interval:float=5.0):
+        self.root_dir = Path(root_dir)
+        self.flush_entries = flush_entries
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffers:Dict[str, List[str]] = {}
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def append(self, stream:str, idx:Optional[int], entry:Dict[str, Any]) -> None:
+        line = json.dumps({"idx": idx, **entry})
+        with self._lock:
+            self._buffers.setdefault(stream, []).append(line)
+            self._buffered += 1
+            due = self._buffered >= self.flush_entries or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            buffers, self._buffers, self._buffered = self._buffers, {}, 0
+            self._last_flush = time.monotonic()
+            for stream, lines in buffers.items():
+                self.root_dir.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.root_dir / f"{stream}.jsonl", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, ('\n'.join(lines) + '\n').encode())
+                finally:
+                    os.close(fd)
+
+    def sort_streams(self, order:List[int]) -> None:
+        """
+        Rewrite every stream with its lines grouped by question in `order` (the input order),
+        the lines of one question keep their logging order. Lines of other idx (e.g. `None`
+        for database initialization) come first. Called after workers appended in completion order,
+        so that the files are ordered like those of a sequential run.
+        """
+        self.flush()
+        position = {idx: i for i, idx in reversed(list(enumerate(order)))}
+        # streams may have been started by workers only
+        for path in sorted(self.root_dir.glob("*.jsonl")):
+            with open(path) as f:
+                lines = [line for line in f if line.strip()]
+            lines.sort(key=lambda line: position.get(json.loads(line)["idx"], -1))
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, 'w') as f:
+                f.writelines(lines)
+            os.replace(tmp, path)
+
+    def reset(self) -> None:
+        """
+        Drop buffers, called in the child process after fork (the parent flushed them before).
+        """
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+def read_log(result_dir:Path, stream:str) -> Dict[int, List[dict]]:
+    """
+    Per-question view of a log stream: idx -> entries in logging order.
+    Result directories written before `Log_Sink` (`<stream>/<idx>.json` files) are read as well.
+    """
+    result_dir = Path(result_dir)
+    log:Dict[int, List[dict]] = {}
+    jsonl_path = result_dir / f"{stream}.jsonl"
+    if jsonl_path.exists():
+        with open(jsonl_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                idx = entry.pop("idx")
+                log.setdefault(idx, []).append(entry)
+        return log
+    legacy_dir = result_dir / stream
+    if legacy_dir.is_dir():
+        for path in legacy_dir.glob("*.json"):
+            entries = json.loads(path.read_text())
+            log[int(path.stem)] = entries if isinstance(entries, list) else [entries]
+    return log
+
+_log_sink:Log_Sink = None
+
+def get_log_sink() -> Log_Sink:
+    """
+    The `Log_Sink` of `result_root_dir`, created on first use
+    (so that `read_log` can be used without loading the project configuration).
+    """
+    global _log_sink
+    if _log_sink is None:
+        from MapleRepair.config import result_root_dir
+        _log_sink = Log_Sink(result_root_dir)
+        atexit.register(_log_sink.flush)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=_log_sink.flush, after_in_child=_log_sink.reset)
+    return _log_sink
@@ -0,0 +1,266 @@
+import re
+import sqlite3
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from MapleRepair.config import date_format_samples, date_format_scan_rows, profile_max_distinct, profile_max_length
+from MapleRepair.order_check import contain_number, generate_format_from_value, format_to_regex
+
+_compiled:Dict[str, re.Pattern] = {}
+
+def _pattern(regex:str) -> re.Pattern:
+    if regex not in _compiled:
+        _compiled[regex] = re.compile(regex)
+    return _compiled[regex]
+
+# value groups fetched from the cursor at once while profiling
+SCAN_CHUNK_SIZE = 4096
+
+def _sqlite_order(value) -> tuple:
+    # SQLite sort order: NULL < numbers < text < blob
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+def _sqlite_length(value) -> int:
+    # LENGTH(): characters of text, bytes of blobs, characters of the text rendering of numbers
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, float):
+        # rendered like printf("%!.15g"): 1e20 -> 1.0e+20, 2.0 -> 2.0
+        text = '%.15g' % (value + 0.0)    # -0.0 is rendered as 0.0
+        mantissa, e, exponent = text.partition('e')
+        if mantissa.lstrip('-').isdigit():
+            mantissa += '.0'
+        return len(mantissa + e + exponent)
+    return len(str(value))
+
+def _orderable(values:List) -> bool:
+    # same as `order_check._is_orderable`: the largest value contains a digit and
+    # every distinct value has its digit layout
+    if not values:
+        return False
+    largest = max(values, key=_sqlite_order)
+    if not isinstance(largest, str) or not contain_number(largest):
+        return False
+    try:
+        pattern = re.compile(format_to_regex(generate_format_from_value(largest)))
+    except re.error:
+        return False
+    return all(isinstance(value, str) and pattern.match(value) for value in values)
+
+class Column_Profile():
+    """
+    Frequencies of the values of one column (`None` for NULL). The statistics below are the ones the
+    per-column queries computed before (see `Database.get_distinct_value_chess`,
+    `Database.init_orderable`, `Schema_Prompt_Builder._get_unique_column_values_str`).
+    Past `max_distinct` distinct values or `max_length` characters of distinct values the frequencies
+    are dropped and the statistics are queried with `execute_query`, as are the statistics of a
+    column reduced to its most frequent values by `compact`.
+    """
+    def __init__(self, name:str, column_type:str, table:str='', execute_query:Optional[Callable]=None,
+                 max_distinct:int=profile_max_distinct, max_length:int=profile_max_length):
+        self.name = name
+        self.type = column_type
+        self.table = table
+        self.execute_query = execute_query
+        self.max_distinct = max_distinct
+        self.max_length = max_length
+        # None once truncated or compacted
+        self.counts:Optional[Counter] = Counter()
+        self.truncated = False
+        # SUM(LENGTH(..)) of the distinct non-NULL values
+        self.length_sum = 0
+        # the `top_k` most frequent values kept by `compact`
+        self.top:Optional[List] = None
+        self.top_k = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.counts is not None
+
+    def add(self, value, count:int=1) -> None:
+        counts = self.counts
+        if counts is None:
+            return
+        if value is not None and value not in counts:
+            self.length_sum += _sqlite_length(value)
+            if len(counts) - (None in counts) >= self.max_distinct or self.length_sum > self.max_length:
+                self.counts = None
+                self.truncated = True
+                return
+        counts[value] += count
+
+    def compact(self, k:int) -> None:
+        """
+        Keep only `top_values(k)`.
+        """
+        if self.counts is not None:
+            self.top, self.top_k = self.top_values(k), k
+            self.counts = None
+
+    def _query(self, sql:str) -> List:
+        if self.execute_query is None:
+            raise RuntimeError(f"profile of {self.table}.{self.name} is incomplete and can not be queried")
+        return self.execute_query(sql)
+
+    def distinct_values(self) -> List:
+        """
+        `SELECT DISTINCT col FROM table WHERE col IS NOT NULL`
+        """
+        if self.counts is None:
+            return [value for value, in self._query(f"SELECT DISTINCT `{self.name}` FROM `{self.table}` WHERE `{self.name}` IS NOT NULL")]
+        return [value for value in self.counts if value is not None]
+
+    def _length_and_count(self) -> Tuple[Optional[int], int]:
+        if self.counts is None:
+            return tuple(self._query(f"""
+                SELECT SUM(LENGTH(unique_values)), COUNT(unique_values)
+                FROM (
+                    SELECT DISTINCT `{self.name}` AS unique_values
+                    FROM `{self.table}`
+                    WHERE `{self.name}` IS NOT NULL
+                ) AS subquery
+            """)[0])
+        count = len(self.counts) - (None in self.counts)
+        return (self.length_sum if count else None), count
+
+    def distinct_count(self) -> int:
+        return self._length_and_count()[1]
+
+    def distinct_length_sum(self) -> Optional[int]:
+        """
+        `SUM(LENGTH(col))` over the distinct non-NULL values, `None` if there are none.
+        """
+        return self._length_and_count()[0]
+
+    def top_values(self, k:int) -> List:
+        """
+        `SELECT col FROM table GROUP BY col ORDER BY COUNT(*) DESC LIMIT k`, ties in descending
+        SQLite order (as SQLite returns them).
+        """
+        if self.counts is None:
+            # fewer values than kept by `compact`: the column has no more
+            if self.top is not None and (k <= len(self.top) or len(self.top) < self.top_k):
+                return self.top[:k]
+            return [value for value, in self._query(f"SELECT `{self.name}` FROM `{self.table}` GROUP BY `{self.name}` ORDER BY COUNT(*) DESC LIMIT {k}")]
+        values = sorted(self.counts, key=_sqlite_order, reverse=True)
+        values.sort(key=lambda value: self.counts[value], reverse=True)
+        return values[:k]
+
+    def is_orderable(self) -> bool:
+        """
+        Same as `order_check._is_orderable`: the largest value contains a digit and
+        every distinct value has its digit layout.
+        """
+        return _orderable(self.distinct_values())
+
+class Table_Profile():
+    """
+    Profiles of the columns of one table, built by one aggregate query per column (`profile_table`).
+    Columns are looked up case-insensitively.
+    """
+    def __init__(self, table:str, columns:Dict[str, Column_Profile]):
+        self.table = table
+        self.columns = columns
+        self._lower = {name.lower(): profile for name, profile in columns.items()}
+
+    def column(self, name:str) -> Optional[Column_Profile]:
+        return self._lower.get(name.lower())
+
+    def add_column(self, profile:Column_Profile) -> None:
+        self.columns[profile.name] = profile
+        self._lower[profile.name.lower()] = profile
+
+    def compact(self, k:int) -> None:
+        """
+        Keep only the `k` most frequent values of each column (see `Column_Profile.compact`).
+        """
+        for profile in self.columns.values():
+            profile.compact(k)
+
+def _profiled(name:str, column_type:str) -> bool:
+    # identifier-like non-text columns are never profiled by default (no consumer needs their values)
+    return column_type in ('TEXT', 'DATE') or not name.lower().endswith(('id', 'email', 'url'))
+
+def profile_table(conn:sqlite3.Connection, table:str, columns:Optional[Sequence[str]]=None,
+                  execute_query:Optional[Callable]=None) -> Table_Profile:
+    """
+    Profile `columns` (by default all but identifier-like non-text columns) of `table`.
+    The values of a column are counted by SQLite (`GROUP BY`), one query per column: counting
+    them in Python while scanning the rows of the table is slower than the per-column queries
+    it replaces. The groups of a column are fetched only until it is truncated.
+
+    Args:
+        execute_query (Optional[Callable]): `Database.execute_query`, queries the statistics of truncated columns
+    """
+    column_types = {row[1]: row[2].split('(')[0].upper() for row in conn.execute(f"PRAGMA table_info(`{table}`)")}
+    if columns is None:
+        columns = [name for name, column_type in column_types.items() if _profiled(name, column_type)]
+    profiles = [Column_Profile(name, column_types.get(name, ''), table, execute_query) for name in columns]
+    for profile in profiles:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT `{profile.name}`, COUNT(*) FROM `{table}` GROUP BY `{profile.name}`")
+            while profile.counts is not None:
+                groups = cursor.fetchmany(SCAN_CHUNK_SIZE)
+                if not groups:
+                    break
+                for value, count in groups:
+                    profile.add(value, count)
+        finally:
+            cursor.close()
+    return Table_Profile(table, {profile.name: profile for profile in profiles})
+
+def sample_columns(execute_query:Callable, table:str, columns:Sequence[str], samples:int=date_format_samples,
+                   scan_rows:int=date_format_scan_rows) -> Dict[str, List[str]]:
+    """
+    Up to `samples` non-empty values (as `str`) of each column of `table`.
+    One query scans the first `scan_rows` rows for all columns, only columns without
+    a value there are queried on their own.
+
+    Args:
+        execute_query (Callable): `Database.execute_query`
+    """
+    values:Dict[str, List[str]] = {column: [] for column in columns}
+    if not columns:
+        return values
+    select = ', '.join(f"`{column}`" for column in columns)
+    for row in execute_query(f"SELECT {select} FROM `{table}` LIMIT {scan_rows}"):
+        for column, value in zip(columns, row):
+            if value is not None and value != '' and len(values[column]) < samples:
+                values[column].append(value if isinstance(value, str) else str(value))
+    for column in columns:
+        if values[column]:
+            continue
+        rows = execute_query(f"SELECT `{column}` FROM `{table}` \
+                               WHERE `{column}` IS NOT NULL AND `{column}` != '' \
+                               LIMIT {samples}")
+        values[column] = [value if isinstance(value, str) else str(value) for value, in rows]
+    return values
+
+def format_coverage(values:Sequence[str], formats:Sequence[Tuple[str, str]]) -> List[float]:
+    """
+    Share of `values` matched (`re.match`, like the format detection before) by each of `formats`.
+    """
+    if not values:
+        return [0.0] * len(formats)
+    return [sum(1 for value in values if _pattern(regex).match(value)) / len(values) for regex, _ in formats]
+
+def infer_format(values:Sequence[str], formats:Sequence[Tuple[str, str]]) -> Tuple[Optional[Tuple[str, str]], float]:
+    """
+    The format of `formats` covering most of `values`, ties go to the earlier format
+    (`formats` are ordered from specific to general).
+
+    Returns:
+        ((regex, strftime format), coverage), `(None, 0.0)` if no value matches any format.
+    """
+    coverage = format_coverage(values, formats)
+    best = max(range(len(formats)), key=lambda i: (coverage[i], -i), default=None)
+    if best is None or coverage[best] == 0:
+        return None, 0.0
+    return formats[best], coverage[best]
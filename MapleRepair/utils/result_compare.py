@@ -0,0 +1,245 @@
+import hashlib
+import itertools
+import sqlite3
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from MapleRepair.config import result_compare_max_distinct
+from MapleRepair.utils.deadline import Query_Deadline
+
+# rows fetched from the cursor at once
+CHUNK_SIZE = 4096
+# column permutations tried at most in permutation-insensitive mode
+MAX_PERMUTATIONS = 120
+
+_MASK = (1 << 64) - 1
+
+class Fingerprint_Overflow(Exception):
+    """
+    More distinct rows than the memory cap allows, see `fingerprint_rows`.
+    """
+
+def _canonical(value):
+    # python set semantics: 1 == 1.0, so integral floats hash like ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _digest(value) -> int:
+    return int.from_bytes(hashlib.blake2b(repr(value).encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+class Result_Fingerprint():
+    """
+    Order-insensitive fingerprint of the *set* of rows of a result (the semantics of
+    `set(pred) == set(gold)`): number of distinct rows, sum and xor of their 64-bit digests.
+    With `per_column`, `columns` holds the same triple per column over the distinct rows,
+    used to find candidate column permutations (`None` otherwise, it costs one digest per cell).
+    """
+    def __init__(self, n_columns:int, per_column:bool=False):
+        self.n_columns = n_columns
+        self.count = 0
+        self.total = 0
+        self.xor = 0
+        self.columns:Optional[List[List[int]]] = [[0, 0, 0] for _ in range(n_columns)] if per_column else None
+
+    def add(self, row:tuple, digest:int) -> None:
+        self.count += 1
+        self.total = (self.total + digest) & _MASK
+        self.xor ^= digest
+        if self.columns is None:
+            return
+        for column, value in zip(self.columns, row):
+            value_digest = _digest(value)
+            column[0] += 1
+            column[1] = (column[1] + value_digest) & _MASK
+            column[2] ^= value_digest
+
+    def to_dict(self) -> dict:
+        return {"n_columns": self.n_columns, "count": self.count, "total": self.total, "xor": self.xor, "columns": self.columns}
+
+    @classmethod
+    def from_dict(cls, state:dict) -> 'Result_Fingerprint':
+        fingerprint = cls(state["n_columns"])
+        fingerprint.count, fingerprint.total, fingerprint.xor = state["count"], state["total"], state["xor"]
+        if state["columns"] is not None:
+            fingerprint.columns = [list(column) for column in state["columns"]]
+        return fingerprint
+
+    def key(self) -> Tuple[int, int, int]:
+        return (self.count, self.total, self.xor)
+
+    def same_set(self, other:'Result_Fingerprint') -> bool:
+        if self.count == 0 and other.count == 0:
+            return True
+        return self.n_columns == other.n_columns and self.key() == other.key()
+
+def _chunks(cursor:sqlite3.Cursor) -> Iterator[List[tuple]]:
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            return
+        yield rows
+
+def fingerprint_rows(n_columns:int, chunks:Iterator[List[tuple]], permutation:Optional[Sequence[int]]=None,
+                     assume_distinct:bool=False, max_distinct:int=result_compare_max_distinct,
+                     rows_out:Optional[List[tuple]]=None, per_column:bool=False,
+                     rows_limit:Optional[int]=None) -> Result_Fingerprint:
+    """
+    Fingerprint a stream of row chunks, rows are reordered by `permutation` first.
+    Distinct rows are detected by their digest; only the digests are kept in memory,
+    unless `rows_out` is given: the distinct rows are appended to it. Once there are more
+    than `rows_limit` of them, `rows_out` is emptied and no longer filled
+    (`len(rows_out) != fingerprint.count` then).
+
+    Exceptions:
+        Fingerprint_Overflow if more than `max_distinct` distinct rows are seen,
+        unless `assume_distinct` (the stream is known to be duplicate free, e.g. `SELECT DISTINCT`).
+    """
+    fingerprint = Result_Fingerprint(n_columns, per_column)
+    seen = set()
+    collecting = rows_out is not None
+    for rows in chunks:
+        for row in rows:
+            row = tuple(_canonical(value) for value in row)
+            if permutation is not None:
+                row = tuple(row[j] for j in permutation)
+            digest = _digest(row)
+            if not assume_distinct:
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                if len(seen) > max_distinct:
+                    raise Fingerprint_Overflow
+            fingerprint.add(row, digest)
+            if collecting:
+                if rows_limit is not None and len(rows_out) >= rows_limit:
+                    rows_out.clear()
+                    collecting = False
+                else:
+                    rows_out.append(row)
+    return fingerprint
+
+def query_fingerprint(conn:sqlite3.Connection, query:str, timeout:Optional[float]=None,
+                      permutation:Optional[Sequence[int]]=None, rows_out:Optional[List[tuple]]=None,
+                      per_column:bool=False, rows_limit:Optional[int]=None) -> Result_Fingerprint:
+    """
+    Execute `query` and fingerprint its result while streaming it in chunks.
+    Beyond the memory cap, duplicates are removed by SQLite (`SELECT DISTINCT`) instead.
+    The distinct rows are collected in `rows_out` if given, up to `rows_limit`
+    (see `fingerprint_rows`). `per_column` fingerprints
+    are needed by permutation-insensitive comparison (`results_match(permute=True)`).
+
+    Exceptions:
+        sqlite errors of `query`, QueryTimedOut (FunctionTimedOut) when `timeout` is exceeded.
+    """
+    cursor = conn.cursor()
+    try:
+        with Query_Deadline(conn, timeout):
+            cursor.execute(query)
+            n_columns = len(cursor.description) if cursor.description else 0
+            try:
+                return fingerprint_rows(n_columns, _chunks(cursor), permutation, rows_out=rows_out, per_column=per_column,
+                                        rows_limit=rows_limit)
+            except Fingerprint_Overflow:
+                if rows_out is not None:
+                    rows_out.clear()
+                cursor.close()
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT DISTINCT * FROM ({subquery(query)})")
+                return fingerprint_rows(n_columns, _chunks(cursor), permutation, assume_distinct=True, rows_out=rows_out,
+                                        per_column=per_column, rows_limit=rows_limit)
+    finally:
+        cursor.close()
+
+def subquery(query:str) -> str:
+    """
+    `query` to be wrapped in parentheses: the statement as written without its trailing semicolons,
+    followed by a line break, so that a trailing `--` comment does not swallow the closing parenthesis.
+    """
+    query = query.strip()
+    while query.endswith(';'):
+        query = query[:-1].rstrip()
+    return query + '\n'
+
+def candidate_permutations(pred:Result_Fingerprint, gold:Result_Fingerprint) -> Iterator[Tuple[int, ...]]:
+    """
+    Column orders of `pred` under which its columns have the fingerprints of the gold columns.
+    The identity is not yielded. Both fingerprints must be `per_column`.
+    """
+    assert pred.columns is not None and gold.columns is not None, "permutations need per-column fingerprints"
+    if pred.n_columns != gold.n_columns or pred.count != gold.count:
+        return
+    options = []
+    for gold_column in gold.columns:
+        matches = [j for j, pred_column in enumerate(pred.columns) if pred_column == gold_column]
+        if not matches:
+            return
+        options.append(matches)
+    identity = tuple(range(pred.n_columns))
+    for permutation in itertools.islice(itertools.product(*options), MAX_PERMUTATIONS):
+        if len(set(permutation)) == len(permutation) and permutation != identity:
+            yield permutation
+
+def materialize(cursor:sqlite3.Cursor, table:str, query:str) -> int:
+    """
+    Store the result of `query` in temp table `table` (columns c0, c1, ...), returns the number of columns.
+    Columns have no declared type, so values are stored as returned (no affinity conversion).
+    """
+    query = subquery(query)
+    cursor.execute(f"SELECT * FROM ({query}) LIMIT 0")
+    n_columns = len(cursor.description)
+    columns = ', '.join(f"c{i}" for i in range(n_columns))
+    cursor.execute(f"CREATE TEMP TABLE {table}({columns})")
+    cursor.execute(f"INSERT INTO temp.{table} SELECT * FROM ({query})")
+    return n_columns
+
+def same_set_exact(conn:sqlite3.Connection, pred_sql:str, gold_sql:str, permutation:Optional[Sequence[int]]=None,
+                   timeout:Optional[float]=None, gold_rows:Optional[List[tuple]]=None) -> bool:
+    """
+    Exact set comparison inside SQLite (`EXCEPT` in both directions), `pred` columns reordered by `permutation`.
+    The gold result is taken from `gold_rows` if given, `gold_sql` is not executed then.
+    """
+    cursor = conn.cursor()
+    try:
+        with Query_Deadline(conn, timeout):
+            n_columns = materialize(cursor, "_pred_result", pred_sql)
+            if gold_rows is None:
+                materialize(cursor, "_gold_result", gold_sql)
+            else:
+                columns = ', '.join(f"c{i}" for i in range(n_columns))
+                cursor.execute(f"CREATE TEMP TABLE _gold_result({columns})")
+                cursor.executemany(f"INSERT INTO temp._gold_result VALUES ({', '.join('?' * n_columns)})", gold_rows)
+            if permutation is None:
+                permutation = range(n_columns)
+            pred_columns = ', '.join(f"c{j}" for j in permutation)
+            cursor.execute(f"""
+                SELECT EXISTS(SELECT {pred_columns} FROM temp._pred_result EXCEPT SELECT * FROM temp._gold_result)
+                    OR EXISTS(SELECT * FROM temp._gold_result EXCEPT SELECT {pred_columns} FROM temp._pred_result)
+            """)
+            return not cursor.fetchone()[0]
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS temp._pred_result")
+        cursor.execute("DROP TABLE IF EXISTS temp._gold_result")
+        cursor.close()
+
+def results_match(conn:sqlite3.Connection, pred_sql:str, pred:Result_Fingerprint, gold_sql:str, gold:Result_Fingerprint,
+                  permute:bool=False, exact:bool=False, timeout:Optional[float]=None,
+                  gold_rows:Optional[List[tuple]]=None) -> bool:
+    """
+    Whether the predicted result equals the gold result as a set of rows.
+
+    Args:
+        permute (bool): also accept the predicted result with its columns reordered
+            (`pred` and `gold` must be `per_column` fingerprints).
+        exact (bool): confirm equal fingerprints with `same_set_exact` instead of trusting them.
+        gold_rows (Optional[List[tuple]]): stored gold rows for the exact comparison.
+    """
+    if pred.count == 0 and gold.count == 0:
+        return True
+    if pred.same_set(gold):
+        return not exact or same_set_exact(conn, pred_sql, gold_sql, timeout=timeout, gold_rows=gold_rows)
+    if not permute:
+        return False
+    for permutation in candidate_permutations(pred, gold):
+        if query_fingerprint(conn, pred_sql, timeout, permutation).same_set(gold):
+            return not exact or same_set_exact(conn, pred_sql, gold_sql, permutation, timeout, gold_rows)
+    return False
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Union
+
+from func_timeout import FunctionTimedOut
+
+from MapleRepair.config import db_pool_size, db_page_cache_kib
+
+class SQLite_Connection_Pool():
+    """
+    Long-lived, read-only (`mode=ro`) SQLite connections, shared by all threads of a process.
+
+    A connection is checked out by exactly one thread at a time and returned to
+    the pool afterwards. At most `pool_size` idle connections are kept open per
+    process, the least recently used database is closed first.
+    Connections are never used across fork: a child process starts with an empty pool.
+    """
+    def __init__(self, pool_size:int=db_pool_size, page_cache_kib:int=db_page_cache_kib):
+        self.pool_size = pool_size
+        self.page_cache_kib = page_cache_kib
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all connections. Called in the child process after fork,
+        connections of the parent are dropped without being closed.
+        """
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._idle:OrderedDict[str, List[sqlite3.Connection]] = OrderedDict()
+        self._idle_count = 0
+
+    def _connect(self, db_path:Union[str, Path]) -> sqlite3.Connection:
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+        conn.text_factory = lambda b: b.decode(errors="ignore")  # avoid gbk/utf8 error, copied from sql-eval.exec_eval
+        conn.execute(f"PRAGMA cache_size = -{self.page_cache_kib}")
+        return conn
+
+    def _checkout(self, key:str) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self.reset()
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                self._idle_count -= 1
+                return idle.pop()
+        return None
+
+    def _checkin(self, key:str, conn:sqlite3.Connection) -> None:
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            while self._idle_count > self.pool_size:
+                oldest_key, oldest = next(iter(self._idle.items()))
+                evicted.append(oldest.pop(0))
+                self._idle_count -= 1
+                if not oldest:
+                    del self._idle[oldest_key]
+        for conn in evicted:
+            conn.close()
+
+    @contextmanager
+    def connection(self, db_path:Union[str, Path]) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a read-only connection of `db_path`.
+
+        Usage:
+            with connection_pool.connection(db_path) as conn:
+                ...
+        """
+        key = str(db_path)
+        pid = os.getpid()
+        conn = self._checkout(key)
+        if conn is None:
+            conn = self._connect(db_path)
+        reusable = False
+        try:
+            yield conn
+            reusable = True
+        except (sqlite3.Error, sqlite3.Warning, FunctionTimedOut):
+            # ordinary SQL failure or a query interrupted at its deadline (QueryTimedOut,
+            # a BaseException), connection is still fine.
+            reusable = True
+            raise
+        finally:
+            # otherwise state of the connection is unknown, e.g. killed in the middle of a query.
+            if reusable and pid == os.getpid():
+                self._checkin(key, conn)
+            else:
+                conn.close()
+
+    def close(self) -> None:
+        """
+        Close all idle connections of this process.
+        """
+        with self._lock:
+            idle, self._idle, self._idle_count = self._idle, OrderedDict(), 0
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+connection_pool = SQLite_Connection_Pool()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=connection_pool.reset)
@@ -0,0 +1,416 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from MapleRepair.config import (db_cache_dir, vector_store, vector_embedding_model, vector_batch_size, vector_embed_parallel,
+                                vector_ivf_min_points, vector_ivf_nprobe, vector_query_cache_size)
+from MapleRepair.utils.cache import LRU_Cache
+
+class Vector_Hit():
+    """
+    One search result: `metadata` is the payload of the point, including its 'document'.
+    `score` is the cosine similarity to the query (higher is closer).
+    """
+    def __init__(self, id:str, metadata:dict, score:float):
+        self.id = id
+        self.metadata = metadata
+        self.score = score
+
+    @property
+    def document(self) -> str:
+        return self.metadata['document']
+
+class Vector_Store():
+    """
+    Collections of embedded documents. Documents are embedded by the store (fastembed),
+    points are identified by caller-chosen ids, `add` replaces points with the same id.
+    """
+    def collection_exists(self, collection_name:str) -> bool:
+        raise NotImplementedError
+
+    def count(self, collection_name:str) -> int:
+        raise NotImplementedError
+
+    def add(self, collection_name:str, documents:List[str], metadata:List[dict], ids:List[str]) -> None:
+        raise NotImplementedError
+
+    def delete(self, collection_name:str, ids:List[str]) -> None:
+        raise NotImplementedError
+
+    def points(self, collection_name:str) -> Dict[str, dict]:
+        """
+        Payloads (with 'document') of all points of the collection by point id.
+        """
+        raise NotImplementedError
+
+    def delete_collection(self, collection_name:str) -> None:
+        raise NotImplementedError
+
+    def embed_queries(self, texts:Sequence[str]) -> np.ndarray:
+        """
+        Normalized query embeddings of `texts`, the ones not embedded before are embedded together.
+        """
+        with _query_lock:
+            embeddings = [_query_embeddings.get((vector_embedding_model, text)) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            model = _embedding_model(vector_embedding_model)
+            new = dict(zip(missing, _normalize(np.array(list(model.query_embed(missing)), dtype=np.float32))))
+            with _query_lock:
+                for text, embedding in new.items():
+                    _query_embeddings.put((vector_embedding_model, text), embedding)
+            embeddings = [new[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+        return np.stack(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+
+    def search_batch(self, collection_name:str, queries:Sequence[np.ndarray], limit:int) -> List[List[Vector_Hit]]:
+        """
+        Top `limit` points of the collection for each query embedding of `queries`, closest first.
+        """
+        raise NotImplementedError
+
+    def query(self, collection_name:str, text:str, limit:int) -> List[Vector_Hit]:
+        return self.search_batch(collection_name, self.embed_queries([text]), limit)[0]
+
+class Qdrant_Vector_Store(Vector_Store):
+    """
+    Collections on a Qdrant server, embedded with qdrant-client's fastembed integration.
+    """
+    def __init__(self, host:str="localhost", port:int=6333):
+        from qdrant_client import QdrantClient
+        self.client = QdrantClient(host, port=port)
+        if self.client.embedding_model_name != vector_embedding_model:
+            self.client.set_model(vector_embedding_model)
+
+    def collection_exists(self, collection_name:str) -> bool:
+        return self.client.collection_exists(collection_name)
+
+    def count(self, collection_name:str) -> int:
+        return self.client.get_collection(collection_name).points_count
+
+    def add(self, collection_name:str, documents:List[str], metadata:List[dict], ids:List[str]) -> None:
+        # embedded in batches of `vector_batch_size`, every batch is upserted with one request
+        self.client.add(
+            collection_name=collection_name,
+            documents=documents,
+            metadata=metadata,
+            ids=ids,
+            batch_size=vector_batch_size,
+            parallel=vector_embed_parallel or None
+        )
+
+    def delete(self, collection_name:str, ids:List[str]) -> None:
+        from qdrant_client.http.models import PointIdsList
+        self.client.delete(collection_name, points_selector=PointIdsList(points=ids), wait=True)
+
+    def points(self, collection_name:str) -> Dict[str, dict]:
+        points, offset = {}, None
+        while True:
+            records, offset = self.client.scroll(collection_name, limit=1024, offset=offset, with_payload=True, with_vectors=False)
+            points.update((str(record.id), record.payload) for record in records)
+            if offset is None:
+                return points
+
+    def delete_collection(self, collection_name:str) -> None:
+        self.client.delete_collection(collection_name)
+
+    def search_batch(self, collection_name:str, queries:Sequence[np.ndarray], limit:int) -> List[List[Vector_Hit]]:
+        from qdrant_client.http.models import NamedVector, SearchRequest
+        vector_name = self.client.get_vector_field_name()
+        requests = [SearchRequest(vector=NamedVector(name=vector_name, vector=query.tolist()), limit=limit, with_payload=True)
+                    for query in queries]
+        return [[Vector_Hit(str(hit.id), hit.payload, hit.score) for hit in hits]
+                for hits in self.client.search_batch(collection_name, requests=requests)]
+
+_models:Dict[str, object] = {}
+_model_lock = threading.Lock()
+# (model, text) -> normalized query embedding, shared by the stores of all databases
+_query_embeddings = LRU_Cache(vector_query_cache_size)
+_query_lock = threading.Lock()
+
+def _embedding_model(model_name:str):
+    with _model_lock:
+        if model_name not in _models:
+            from fastembed import TextEmbedding
+            _models[model_name] = TextEmbedding(model_name=model_name)
+        return _models[model_name]
+
+def _normalize(vectors:np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+def _top_k(scores:np.ndarray, k:int) -> np.ndarray:
+    # indices of the k highest scores, highest first
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+def build_ivf(vectors:np.ndarray, n_lists:int, iterations:int=10, seed:int=0) -> Dict[str, np.ndarray]:
+    """
+    Inverted file index: spherical k-means over the (normalized) `vectors`.
+
+    Returns:
+        {'centroids': (n_lists, dim), 'order': point indices grouped by list, 'offsets': list boundaries in `order`}
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = vectors[assignment == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    assignment = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+    return {'centroids': centroids, 'order': order, 'offsets': offsets}
+
+class _Collection():
+    def __init__(self, path:Path, version:str):
+        path = path / version
+        self.path = path
+        self.version = version
+        with open(path / "points.json", encoding='utf-8') as f:
+            points = json.load(f)
+        self.ids:List[str] = points['ids']
+        self.metadata:List[dict] = points['metadata']
+        self.vectors:np.ndarray = np.load(path / "vectors.npy", mmap_mode='r')
+        self.ivf:Optional[Dict[str, np.ndarray]] = None
+        if (path / "ivf.npz").exists():
+            with np.load(path / "ivf.npz") as ivf:
+                self.ivf = {name: ivf[name] for name in ivf.files}
+
+    def candidates(self, query:np.ndarray) -> Optional[np.ndarray]:
+        # points of the `vector_ivf_nprobe` lists closest to the query, None: search all points
+        if self.ivf is None:
+            return None
+        lists = _top_k(self.ivf['centroids'] @ query, vector_ivf_nprobe)
+        offsets, order = self.ivf['offsets'], self.ivf['order']
+        return np.concatenate([order[offsets[i]:offsets[i + 1]] for i in lists])
+
+def _current_version(path:Path) -> Optional[str]:
+    # the version directory named in CURRENT, None if the collection does not exist
+    try:
+        with open(path / "CURRENT", encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+# attempts to load a collection, a writer may remove the version just read from CURRENT
+LOAD_ATTEMPTS = 3
+
+class Numpy_Vector_Store(Vector_Store):
+    """
+    In-process vector store: one directory per collection under `root`. A version of the
+    collection is a subdirectory holding the normalized embeddings (`vectors.npy`, memory-mapped
+    on load), the ids and payloads (`points.json`) and, for collections of at least
+    `vector_ivf_min_points` points, an IVF index (`ivf.npz`, about sqrt(n) lists, `vector_ivf_nprobe`
+    of them are searched). Smaller collections are searched exactly.
+    Every write creates a new version and then switches the `CURRENT` file to it with one
+    `os.replace`, so readers never see a partially written collection; the previous version is
+    removed afterwards. Readers in other processes reload a collection when `CURRENT` changed.
+    """
+    def __init__(self, root:Path):
+        self.root = Path(root)
+        self.model_name = vector_embedding_model
+        self._collections:Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name:str) -> Path:
+        # table / column names may contain path separators
+        return self.root / quote(collection_name, safe='')
+
+    def _collection(self, collection_name:str) -> _Collection:
+        path = self._path(collection_name)
+        with self._lock:
+            for attempt in range(LOAD_ATTEMPTS):
+                version = _current_version(path)
+                if version is None:
+                    raise FileNotFoundError(f"vector collection {collection_name} does not exist")
+                collection = self._collections.get(collection_name)
+                if collection is not None and collection.version == version:
+                    return collection
+                try:
+                    collection = self._collections[collection_name] = _Collection(path, version)
+                    return collection
+                except FileNotFoundError:
+                    if attempt == LOAD_ATTEMPTS - 1:
+                        raise
+
+    def collection_exists(self, collection_name:str) -> bool:
+        return _current_version(self._path(collection_name)) is not None
+
+    def count(self, collection_name:str) -> int:
+        return len(self._collection(collection_name).ids)
+
+    def embed(self, documents:Sequence[str]) -> np.ndarray:
+        model = _embedding_model(self.model_name)
+        vectors = list(model.embed(documents, batch_size=vector_batch_size, parallel=vector_embed_parallel or None))
+        return _normalize(np.array(vectors, dtype=np.float32))
+
+    def add(self, collection_name:str, documents:List[str], metadata:List[dict], ids:List[str]) -> None:
+        if not documents:
+            return
+        vectors = self.embed(documents)
+        payloads = [{**meta, 'document': document} for meta, document in zip(metadata, documents)]
+        if self.collection_exists(collection_name):
+            current = self._collection(collection_name)
+            position = {point_id: i for i, point_id in enumerate(current.ids)}
+            all_ids, all_metadata, all_vectors = list(current.ids), list(current.metadata), np.array(current.vectors)
+            new = []
+            for i, point_id in enumerate(ids):
+                if point_id in position:
+                    all_metadata[position[point_id]] = payloads[i]
+                    all_vectors[position[point_id]] = vectors[i]
+                else:
+                    position[point_id] = len(all_ids)
+                    all_ids.append(point_id)
+                    all_metadata.append(payloads[i])
+                    new.append(i)
+            vectors = np.concatenate([all_vectors, vectors[new]]) if new else all_vectors
+            ids, payloads = all_ids, all_metadata
+        self._write(collection_name, ids, payloads, vectors)
+
+    def _write(self, collection_name:str, ids:List[str], metadata:List[dict], vectors:np.ndarray) -> None:
+        path = self._path(collection_name)
+        path.mkdir(parents=True, exist_ok=True)
+        previous = _current_version(path)
+        version = uuid.uuid4().hex
+        (path / version).mkdir()
+        np.save(path / version / "vectors.npy", vectors)
+        if vector_ivf_min_points and len(ids) >= vector_ivf_min_points:
+            np.savez(path / version / "ivf.npz", **build_ivf(vectors, int(np.sqrt(len(ids)))))
+        with open(path / version / "points.json", 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'ids': ids, 'metadata': metadata}, f, ensure_ascii=False)
+        tmp = path / f"CURRENT.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp, path / "CURRENT")
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        # open memory maps of the previous version stay valid
+        if previous is not None and previous != version:
+            shutil.rmtree(path / previous, ignore_errors=True)
+
+    def delete(self, collection_name:str, ids:List[str]) -> None:
+        if not ids or not self.collection_exists(collection_name):
+            return
+        current = self._collection(collection_name)
+        removed = set(ids)
+        keep = [i for i, point_id in enumerate(current.ids) if point_id not in removed]
+        self._write(collection_name, [current.ids[i] for i in keep], [current.metadata[i] for i in keep], np.array(current.vectors[keep]))
+
+    def points(self, collection_name:str) -> Dict[str, dict]:
+        collection = self._collection(collection_name)
+        return dict(zip(collection.ids, collection.metadata))
+
+    def delete_collection(self, collection_name:str) -> None:
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        shutil.rmtree(self._path(collection_name), ignore_errors=True)
+
+    def search_batch(self, collection_name:str, queries:Sequence[np.ndarray], limit:int) -> List[List[Vector_Hit]]:
+        collection = self._collection(collection_name)
+        queries = np.asarray(queries, dtype=np.float32)
+        if collection.ivf is None:
+            # one matrix product for all queries
+            all_scores = np.asarray(collection.vectors @ queries.T).T
+            searches = [(None, scores) for scores in all_scores]
+        else:
+            searches = []
+            for query in queries:
+                candidates = collection.candidates(query)
+                searches.append((candidates, collection.vectors[candidates] @ query))
+        results = []
+        for candidates, scores in searches:
+            top = _top_k(scores, limit)
+            points = top if candidates is None else candidates[top]
+            results.append([Vector_Hit(collection.ids[i], collection.metadata[i], float(scores[j])) for i, j in zip(points, top)])
+        return results
+
+def content_digest(document:str, metadata:dict) -> str:
+    content = json.dumps([document, {key: value for key, value in metadata.items() if key != 'document'}], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+def _manifest_path(store:Vector_Store, collection_name:str) -> Path:
+    return Path(db_cache_dir or ".cache") / "vector_manifests" / type(store).__name__ / f"{quote(collection_name, safe='')}.json"
+
+def _save_manifest(path:Path, model_name:str, points:Dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'model': model_name, 'points': points}, f)
+    os.replace(tmp, path)
+
+def sync_collection(store:Vector_Store, collection_name:str, documents:List[str], metadata:List[dict], ids:List[str]) -> Tuple[int, int]:
+    """
+    Make the collection hold exactly `documents`, embedding only the ones not stored yet.
+
+    Points are compared by the digest of (document, metadata). The digests of a collection are
+    kept in a manifest (DB_CACHE_DIR/vector_manifests); a missing manifest, or one that does
+    not match the number of stored points, is rebuilt from the stored payloads, so collections
+    created before (with other point ids) are adopted without re-embedding. A collection
+    embedded with another model is rebuilt.
+
+    Returns:
+        (number of points added, number of points deleted)
+    """
+    path = _manifest_path(store, collection_name)
+    manifest = None
+    if path.exists():
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    if manifest is not None and manifest['model'] != vector_embedding_model:
+        store.delete_collection(collection_name)
+        manifest = None
+    stored:Dict[str, str] = {}
+    if store.collection_exists(collection_name):
+        if manifest is not None and len(manifest['points']) == store.count(collection_name):
+            stored = manifest['points']
+        else:
+            stored = {point_id: content_digest(payload['document'], payload) for point_id, payload in store.points(collection_name).items()}
+
+    wanted = {}
+    for document, meta, point_id in zip(documents, metadata, ids):
+        wanted.setdefault(content_digest(document, meta), (document, meta, point_id))
+    # one stored point per wanted digest is kept, the others (changed, removed, duplicates) are deleted
+    kept, deleted = {}, []
+    kept_digests = set()
+    for point_id, digest in stored.items():
+        if digest in wanted and digest not in kept_digests:
+            kept[point_id] = digest
+            kept_digests.add(digest)
+        else:
+            deleted.append(point_id)
+    added = [(digest, item) for digest, item in wanted.items() if digest not in kept_digests]
+    # points with the id of an added point are replaced by `add`
+    added_ids = {item[2] for _, item in added}
+    deleted = [point_id for point_id in deleted if point_id not in added_ids]
+    for point_id in [point_id for point_id in kept if point_id in added_ids]:
+        del kept[point_id]
+
+    store.delete(collection_name, deleted)
+    if added:
+        store.add(collection_name, [item[0] for _, item in added], [item[1] for _, item in added], [item[2] for _, item in added])
+    for digest, item in added:
+        kept[item[2]] = digest
+    _save_manifest(path, vector_embedding_model, kept)
+    return len(added), len(deleted)
+
+def make_vector_store() -> Vector_Store:
+    """
+    The vector store selected by `vector_store` (VECTOR_STORE).
+    """
+    if vector_store == 'numpy':
+        return Numpy_Vector_Store(Path(db_cache_dir or ".cache") / "vectors")
+    return Qdrant_Vector_Store("localhost", 6333)
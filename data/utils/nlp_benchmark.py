@@ -0,0 +1,95 @@
+"""
+Agreement and speed of the rule-based is_date / is_time / is_number (MapleRepair/utils/nlp.py)
+against spaCy NER on cell values sampled from the databases under db_root_path.
+
+Usage:
+    python -m data.utils.nlp_benchmark [--db_ids a b ...] [--samples 20] [--rules_only]
+
+--rules_only reports the values accepted by the rules and their speed, without spaCy.
+"""
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+from MapleRepair.config import db_root_path
+from MapleRepair.utils.nlp import _is_date_rules, _is_time_rules, _is_number_rules, _spacy_label
+
+CLASSIFIERS = {
+    'is_date': (_is_date_rules, 'DATE'),
+    'is_time': (_is_time_rules, 'TIME'),
+    'is_number': (_is_number_rules, 'CARDINAL'),
+}
+
+def sample_values(db_path:Path, samples:int) -> list:
+    """
+    Up to `samples` distinct non-empty values of each TEXT / DATE column, as classified during initialization.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.text_factory = lambda b: b.decode(errors="ignore")
+    values = []
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        for table in tables:
+            for column in conn.execute(f"PRAGMA table_info(`{table}`)").fetchall():
+                if column[2].split('(')[0].upper() not in ('TEXT', 'DATE'):
+                    continue
+                rows = conn.execute(f"SELECT DISTINCT `{column[1]}` FROM `{table}` WHERE `{column[1]}` IS NOT NULL AND `{column[1]}` != '' LIMIT {samples}").fetchall()
+                values.extend(str(row[0]) for row in rows)
+    finally:
+        conn.close()
+    return values
+
+def benchmark_rules(values:list) -> dict:
+    report = {}
+    for name, (rules, _) in CLASSIFIERS.items():
+        start = time.perf_counter()
+        accepted = sum(rules(value) for value in values)
+        rules_time = time.perf_counter() - start
+        report[name] = {'values': len(values), 'accepted': accepted, 'rules_time': rules_time}
+    return report
+
+def benchmark(values:list) -> dict:
+    report = {}
+    for name, (rules, label) in CLASSIFIERS.items():
+        start = time.perf_counter()
+        by_rules = [rules(value) for value in values]
+        rules_time = time.perf_counter() - start
+        start = time.perf_counter()
+        by_spacy = [_spacy_label(value, label) for value in values]
+        spacy_time = time.perf_counter() - start
+        agreed = sum(a == b for a, b in zip(by_rules, by_spacy))
+        report[name] = {
+            'values': len(values),
+            'agreement': agreed / len(values) if values else 1.0,
+            'rules_only': sum(a and not b for a, b in zip(by_rules, by_spacy)),
+            'spacy_only': sum(b and not a for a, b in zip(by_rules, by_spacy)),
+            'rules_time': rules_time,
+            'spacy_time': spacy_time,
+            'speedup': spacy_time / rules_time if rules_time else float('inf'),
+        }
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db_ids", nargs='*', default=None, help="databases under db_root_path, all by default")
+    parser.add_argument("--samples", type=int, default=20, help="values sampled per column")
+    parser.add_argument("--rules_only", action="store_true", help="do not compare with spaCy")
+    args = parser.parse_args()
+
+    db_ids = args.db_ids or sorted(p.name for p in Path(db_root_path).iterdir() if p.is_dir())
+    values = []
+    for db_id in db_ids:
+        values.extend(sample_values(Path(db_root_path) / f"{db_id}/{db_id}.sqlite", args.samples))
+    if args.rules_only:
+        for name, row in benchmark_rules(values).items():
+            print(f"{name}: {row['values']} values, {row['accepted']} accepted, "
+                  f"rules {row['rules_time']:.3f}s ({row['rules_time'] / max(row['values'], 1) * 1e6:.1f}us per value)")
+        raise SystemExit
+    # load spaCy before timing
+    _spacy_label("", 'DATE')
+
+    for name, row in benchmark(values).items():
+        print(f"{name}: {row['values']} values, agreement {row['agreement']:.2%} "
+              f"(rules only {row['rules_only']}, spaCy only {row['spacy_only']}), "
+              f"rules {row['rules_time']:.3f}s, spaCy {row['spacy_time']:.3f}s, speedup {row['speedup']:.0f}x")
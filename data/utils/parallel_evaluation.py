@@ -1,35 +1,80 @@
 from concurrent.futures.process import ProcessPoolExecutor
-from func_timeout import func_set_timeout, FunctionTimedOut
+from func_timeout import FunctionTimedOut
 import sqlite3
 from sqlite3 import OperationalError
 from concurrent.futures import as_completed
 from pathlib import Path
 from MapleRepair.utils.format import read_json, write_json
-from MapleRepair.config import dataset, data_split, db_root_path, generalizability_test
+from MapleRepair.config import dataset, data_split, db_root_path, generalizability_test, db_cache_dir
+from MapleRepair.config import result_compare_permute, result_compare_exact, gold_store_enable
+from MapleRepair.utils.result_compare import query_fingerprint, results_match
+from MapleRepair.utils.gold_store import gold_store
 from gold_err import gold_err_idx
+from collections import OrderedDict
 import argparse
+import hashlib
+import json
+import os
+import time
 
 TIMEOUT = 120
+# chunks per worker the tasks are split into, more chunks balance better, fewer keep connections warmer
+CHUNKS_PER_WORKER = 4
+# connections a worker keeps open (one per database)
+WORKER_CONNECTIONS = 8
+# measured evaluation times of previous runs, used to estimate the cost of tasks
+TIMINGS_PATH = Path(db_cache_dir or ".cache") / "evaluation_timings.json"
 
-@func_set_timeout(TIMEOUT)
-def _evaluate_sql(predicted_sql, ground_truth, db_path):
-    # Connect to the database
-    conn = sqlite3.connect(db_path)
+# worker-local connections, db_path -> connection (most recently used last)
+_connections:"OrderedDict[str, sqlite3.Connection]" = OrderedDict()
+
+def _connect(db_path):
+    # autocommit: temp tables of the exact comparison must not leave a transaction open on a kept connection
+    conn = sqlite3.connect(db_path, isolation_level=None)
     conn.text_factory = lambda b: b.decode(errors="ignore")  # avoid gbk/utf8 error, copied from sql-eval.exec_eval
-    cursor = conn.cursor()
-    cursor.execute(predicted_sql)
-    predicted_res = cursor.fetchall()
-    cursor.execute(ground_truth)
-    ground_truth_res = cursor.fetchall()
-    res = 0
-    # todo: this should permute column order!
-    if set(predicted_res) == set(ground_truth_res):
-        res = 1
+    return conn
+
+def _worker_connection(db_path):
+    key = str(db_path)
+    if key in _connections:
+        _connections.move_to_end(key)
+    else:
+        _connections[key] = _connect(db_path)
+        if len(_connections) > WORKER_CONNECTIONS:
+            _connections.popitem(last=False)[1].close()
+    return _connections[key]
+
+def _evaluate_sql(predicted_sql, ground_truth, db_path, conn=None):
+    # Connect to the database, unless a (warm) connection is given
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect(db_path)
+    try:
+        # one budget for all queries, raise QueryTimedOut (FunctionTimedOut) when exceeded
+        deadline = time.monotonic() + TIMEOUT
+        remaining = lambda: max(0.0, deadline - time.monotonic())
+        # results are streamed and fingerprinted, not fetched, see MapleRepair/utils/result_compare.py
+        predicted_fingerprint = query_fingerprint(conn, predicted_sql, remaining(), per_column=result_compare_permute)
+        ground_truth_rows = None
+        if gold_store_enable:
+            # gold results are stored across runs, see MapleRepair/utils/gold_store.py
+            ground_truth_fingerprint, ground_truth_rows = gold_store.gold_result(conn, Path(db_path).stem, db_path, ground_truth, remaining(),
+                                                                                     per_column=result_compare_permute)
+        else:
+            ground_truth_fingerprint = query_fingerprint(conn, ground_truth, remaining(), per_column=result_compare_permute)
+        res = 0
+        if results_match(conn, predicted_sql, predicted_fingerprint, ground_truth, ground_truth_fingerprint,
+                         permute=result_compare_permute, exact=result_compare_exact, timeout=remaining(),
+                         gold_rows=ground_truth_rows):
+            res = 1
+    finally:
+        if own_conn:
+            conn.close()
     return res
 
-def evaluate_sql(predicted_sql, ground_truth, db_path):
+def evaluate_sql(predicted_sql, ground_truth, db_path, conn=None):
     try:
-        res = _evaluate_sql(predicted_sql, ground_truth, db_path)
+        res = _evaluate_sql(predicted_sql, ground_truth, db_path, conn)
     except OperationalError as oe:
         res = str(oe)
     except FunctionTimedOut as TLE:
@@ -39,26 +84,117 @@ def evaluate_sql(predicted_sql, ground_truth, db_path):
         res = str(e)
     return res
 
-def parallel_evaluate(pairs):
+def evaluate_chunk(db_path, tasks):
+    """
+    Evaluate tasks of one database on the worker's connection to it.
+    Args:
+        tasks (List): [(id, pred, gold), ...]
+    Returns:
+        List: [(id, res, seconds), ...]
+    """
+    conn = _worker_connection(db_path)
+    results = []
+    for idx, pred, gold in tasks:
+        start = time.perf_counter()
+        res = evaluate_sql(pred, gold, db_path, conn)
+        results.append((idx, res, time.perf_counter() - start))
+    return results
+
+def _task_key(pred, gold, db_path):
+    return hashlib.sha256(json.dumps([Path(db_path).name, pred, gold]).encode()).hexdigest()
+
+def estimate_costs(pairs, timings):
+    """
+    Cost of each pair: its time in a previous run, else the mean time of its database, else the overall mean.
+    """
+    known = [timings.get(_task_key(pred, gold, db_path)) for pred, gold, db_path in pairs]
+    per_db = {}
+    for (pred, gold, db_path), seconds in zip(pairs, known):
+        if seconds is not None:
+            per_db.setdefault(str(db_path), []).append(seconds)
+    overall = [seconds for seconds in known if seconds is not None]
+    default = sum(overall) / len(overall) if overall else 1.0
+    costs = []
+    for (pred, gold, db_path), seconds in zip(pairs, known):
+        if seconds is None:
+            db_times = per_db.get(str(db_path))
+            seconds = sum(db_times) / len(db_times) if db_times else default
+        costs.append(seconds)
+    return costs
+
+def schedule(pairs, costs, workers):
+    """
+    Group tasks by database and split each group into chunks of about `1 / (CHUNKS_PER_WORKER * workers)`
+    of the total cost. Chunks are returned longest first, a pool taking them in this order
+    assigns each to the least loaded worker (LPT scheduling).
+    Returns:
+        List: [(cost, db_path, [(id, pred, gold), ...]), ...]
+    """
+    groups = {}
+    for idx, (pred, gold, db_path) in enumerate(pairs):
+        groups.setdefault(str(db_path), []).append(idx)
+    target = sum(costs) / (CHUNKS_PER_WORKER * workers)
+    chunks = []
+    for db_path, idxs in groups.items():
+        chunk, chunk_cost = [], 0.0
+        for idx in idxs:
+            pred, gold, _ = pairs[idx]
+            chunk.append((idx, pred, gold))
+            chunk_cost += costs[idx]
+            if chunk_cost >= target:
+                chunks.append((chunk_cost, db_path, chunk))
+                chunk, chunk_cost = [], 0.0
+        if chunk:
+            chunks.append((chunk_cost, db_path, chunk))
+    chunks.sort(key=lambda x: x[0], reverse=True)
+    return chunks
+
+def parallel_evaluate(pairs, workers=None, output_path=None):
     """
     Args:
         pairs (List): [(pred, gold, db_path), ...]
+        workers (int): number of worker processes, `os.cpu_count()` by default.
+        output_path (Path): if given, `{"id": id, "res": res}` lines are appended in id order
+            as soon as all smaller ids are evaluated.
     Returns:
         List: [(id, res), ...]
             res := 0, 1, errmsg
             id is not question_id!!!
     """
-    with ProcessPoolExecutor(max_workers=128) as executor:
-        results = []
-        future_to_db_id = {executor.submit(evaluate_sql, pred, gold, db_path): idx for idx, (pred, gold, db_path) in enumerate(pairs)}
-        for future in as_completed(future_to_db_id):
-            try:
-                idx = future_to_db_id[future]
-                res = future.result()
-                results.append((idx, res))
-            except Exception as e:
-                print(str(e))
-    results = sorted(results, key=lambda x:x[0])
+    workers = workers or os.cpu_count() or 1
+    timings = read_json(TIMINGS_PATH) if TIMINGS_PATH.exists() else {}
+    chunks = schedule(pairs, estimate_costs(pairs, timings), workers)
+    
+    done = {}
+    next_idx = 0
+    out = open(output_path, 'a') if output_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            future_to_tasks = {executor.submit(evaluate_chunk, db_path, tasks): tasks for _, db_path, tasks in chunks}
+            for future in as_completed(future_to_tasks):
+                try:
+                    chunk_results = future.result()
+                except Exception as e:
+                    # e.g. a crashed worker: every task of the chunk gets the error as result (no timing)
+                    print(str(e))
+                    for idx, _, _ in future_to_tasks[future]:
+                        done[idx] = str(e)
+                    chunk_results = []
+                for idx, res, seconds in chunk_results:
+                    done[idx] = res
+                    pred, gold, db_path = pairs[idx]
+                    timings[_task_key(pred, gold, db_path)] = seconds
+                if out:
+                    while next_idx in done:
+                        out.write(json.dumps({"id": next_idx, "res": done[next_idx]}) + '\n')
+                        next_idx += 1
+                    out.flush()
+    finally:
+        if out:
+            out.close()
+    TIMINGS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    write_json(TIMINGS_PATH, timings)
+    results = sorted(done.items(), key=lambda x:x[0])
     return results
 
 def repair_statisics(path:Path):
@@ -95,6 +231,8 @@ def repair_statisics(path:Path):
 if __name__ == '__main__':    
     parser = argparse.ArgumentParser()
     parser.add_argument("--result_path", type=str, required=True)
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, os.cpu_count() by default")
+    parser.add_argument("--output", type=str, default=None, help="JSON Lines file results are streamed to in order, <result_path>.eval.jsonl by default")
     args = parser.parse_args()
 
     result_path = Path(args.result_path)
@@ -109,7 +247,9 @@ if __name__ == '__main__':
         db_id = item['db_id']
         db_path = Path(db_root_path) / f"{db_id}/{db_id}.sqlite"
         pairs.append((query, gold, db_path))
-    parallel_return = parallel_evaluate(pairs)
+    output_path = Path(args.output) if args.output else result_path.with_suffix('.eval.jsonl')
+    output_path.unlink(missing_ok=True)
+    parallel_return = parallel_evaluate(pairs, workers=args.workers, output_path=output_path)
     
     assert len(pairs) == len(js)
     filled_js = []
@@ -1,5 +1,5 @@
 from pathlib import Path
-from MapleRepair.utils.format import read_json
+from MapleRepair.utils.persistence import read_log
 
 TTFT = 1.047
 ITL = 0.039
@@ -8,30 +8,15 @@ ITL = 0.039
 
 result_dir = Path("archived_result/MAC-SQL BIRD GPT-3.5-Turbo (@2024-11-01-21-58-15)")
 
-db_overhead_dir = result_dir / "db_overhead"
-total_overhead_dir = result_dir / "total_overhead"
-llm_overhead_dir = result_dir / "llm_overhead"
-
 overhead = {}
 
-for idx in range(2000):
-    overhead[idx] = {}
-    db_overhead_path = db_overhead_dir / f"{idx}.json"
-    if db_overhead_path.exists():
-        overhead[idx]['db_overhead'] = read_json(db_overhead_path)
-        ...
-    llm_overhead_path = llm_overhead_dir / f"{idx}.json"
-    if llm_overhead_path.exists():
-        overhead[idx]['llm_overhead'] = read_json(llm_overhead_path)
-        ...
-    total_overhead_path = total_overhead_dir / f"{idx}.json"
-    if total_overhead_path.exists():
-        overhead[idx]['total_overhead'] = read_json(total_overhead_path)
-        ...
-    ...
+# per-question views of the logs (JSON Lines streams or legacy per-question files)
+for stream in ('db_overhead', 'llm_overhead', 'total_overhead'):
+    for idx, entries in read_log(result_dir, stream).items():
+        overhead.setdefault(idx, {})[stream] = entries
 
 _overhead = {} 
-for k, v in overhead.items():
+for k, v in sorted(overhead.items()):
     if v:
         _overhead[k] = v
 overhead = _overhead
@@ -61,7 +46,7 @@ for idx, log in overhead.items():
     
     llm_invoke = len(log['llm_overhead']) if 'llm_overhead' in log else 0
     
-    total_overhead = log['total_overhead']['time']
+    total_overhead = log['total_overhead'][-1]['time']
     total_overhead_sum += total_overhead
     
     tool_overhead = total_overhead - total_llm_overhead - total_db_overhead
@@ -4,11 +4,176 @@ from tqdm import tqdm
 from pathlib import Path
 from MapleRepair.utils.format import write_json, read_json
 import time
-from MapleRepair.utils.persistence import make_log
+from MapleRepair.utils.persistence import get_log_sink
 import json
 from gold_err import gold_err_idx
 from MapleRepair.MapleRepair import MapleRepair
 import argparse
+import multiprocessing
+import asyncio
+from MapleRepair.config import llm_concurrency
+from typing import Any, Dict, List, Optional, Tuple
+
+# set in __main__, inherited by forked workers
+R:MapleRepair = None
+before_flag = False
+after_flag = False
+
+def prepare_question(result:dict) -> Optional[Tuple[dict, bool]]:
+    """
+    Returns:
+        (keyword arguments of `R.repair`, whether the query counts as actual incorrect), `None` if the question is skipped.
+    """
+    db_id = result['db_id']
+    question = result['question']
+    evidence = result['evidence']
+    
+    idx = result['idx']
+    gold_sql = result['gold']
+    if before_flag:
+        sql_statement = result['pred']
+        res = result['pred_result']
+    elif after_flag:
+        sql_statement = result['repair_sql']
+        res = result['repair_result']
+        
+    if not generalizability_test:
+        if idx in gold_err_idx:
+            return None
+        
+    if dataset == 'SPIDER' and data_split == 'DEV':
+        if db_id == 'flight_2':
+            return None
+        
+    actual_incorrect = res not in (1, '1')
+    return dict(sql_statement=sql_statement, gold_sql=gold_sql, db_id=db_id, origin_res=res, question_id=idx, question=question, evidence=evidence), actual_incorrect
+
+def log_total_overhead(idx:int, start:float) -> None:
+    end = time.perf_counter()
+    # print(f"Time taken: {end - start:0.9f} seconds")
+    get_log_sink().append("total_overhead", idx, {"time": end-start})
+
+def finish_question(result:dict, repaired_sql_statement:str) -> dict:
+    db:Database = DBs[result['db_id']]
+    repaired_res, err_msg = db.execution_match(repaired_sql_statement, result['gold'])
+    result['repair_sql'] = repaired_sql_statement
+    result['repair_result'] = repaired_res if err_msg is None else err_msg
+    return result
+
+def repair_one(result:dict) -> Tuple[Optional[dict], Optional[Tuple[str, tuple]], bool]:
+    """
+    Repair the SQL query of one question with `R`.
+    
+    Returns:
+        (repaired result or `None` if skipped/failed, (exception name, (idx, message)) if failed, whether the query counts as actual incorrect)
+    """
+    prepared = prepare_question(result)
+    if prepared is None:
+        return None, None, False
+    kwargs, actual_incorrect = prepared
+    
+    try:
+        start = time.perf_counter()
+        repaired_sql_statement = R.repair(**kwargs)
+    except BaseException as be:
+        return None, (type(be).__name__, (result['idx'], str(be))), actual_incorrect
+    finally:
+        log_total_overhead(result['idx'], start)
+        
+    return finish_question(result, repaired_sql_statement), None, actual_incorrect
+
+async def repair_one_async(result:dict) -> Tuple[Optional[dict], Optional[Tuple[str, tuple]], bool]:
+    """
+    Same as `repair_one` with `R.repair_async`. The logged total overhead includes
+    the time spent waiting for other questions sharing the event loop.
+    """
+    prepared = prepare_question(result)
+    if prepared is None:
+        return None, None, False
+    kwargs, actual_incorrect = prepared
+    
+    try:
+        start = time.perf_counter()
+        repaired_sql_statement = await R.repair_async(**kwargs)
+    except BaseException as be:
+        if isinstance(be, asyncio.CancelledError):
+            raise
+        return None, (type(be).__name__, (result['idx'], str(be))), actual_incorrect
+    finally:
+        log_total_overhead(result['idx'], start)
+        
+    return finish_question(result, repaired_sql_statement), None, actual_incorrect
+
+async def repair_all_async(results_list:List[dict], max_pending:int) -> List[tuple]:
+    """
+    Repair all questions with at most `max_pending` of them in progress, outcomes are in input order.
+    """
+    pending = asyncio.Semaphore(max_pending)
+    progress = tqdm(total=len(results_list))
+    
+    async def bounded(result:dict) -> tuple:
+        async with pending:
+            outcome = await repair_one_async(result)
+        progress.update()
+        return outcome
+    
+    outcomes = await asyncio.gather(*(bounded(result) for result in results_list))
+    progress.close()
+    return outcomes
+
+def init_worker() -> None:
+    # sqlite connections are dropped at fork, the vector database client is re-created.
+    for db in DBs.values():
+        db.connect_vecDB()
+
+def repair_one_in_worker(result:dict) -> Tuple[tuple, Dict[str, Any]]:
+    outcome = repair_one(result)
+    # pool workers are terminated without running exit handlers
+    get_log_sink().flush()
+    return outcome, R.drain_statistics()
+
+def repair_all(results_list:List[dict], workers:int=1, async_llm:bool=False) -> Tuple[List[dict], Dict[str, List[tuple]], int]:
+    """
+    Repair all questions with `R`, sequentially, in `workers` forked processes or in one event loop (`async_llm`).
+    Statistics of `R` and the log streams end up as in a sequential run.
+    
+    Returns:
+        (repaired results in input order, exception name -> [(idx, message)], number of actual incorrect queries)
+    """
+    final_repaired_result = []
+    exception_dict = {}
+    actual_incorrect_sql = 0
+    
+    def collect(outcome:tuple) -> None:
+        nonlocal actual_incorrect_sql
+        repaired_result, exception, actual_incorrect = outcome
+        actual_incorrect_sql += actual_incorrect
+        if exception is not None:
+            exception_name, case = exception
+            if exception_name not in exception_dict:
+                exception_dict[exception_name] = []
+            exception_dict[exception_name].append(case)
+        if repaired_result is not None:
+            final_repaired_result.append(repaired_result)
+    
+    if async_llm:
+        # keep a few questions per LLM slot busy with the deterministic stages
+        for outcome in asyncio.run(repair_all_async(results_list, max_pending=4 * llm_concurrency)):
+            collect(outcome)
+        # questions log in completion order
+        get_log_sink().sort_streams([result['idx'] for result in results_list])
+    elif workers == 1:
+        for result in tqdm(results_list):
+            collect(repair_one(result))
+    else:
+        # workers inherit `R` and `DBs` through fork, results come back in input order.
+        with multiprocessing.get_context('fork').Pool(workers, initializer=init_worker) as pool:
+            for outcome, stats in tqdm(pool.imap(repair_one_in_worker, results_list, chunksize=4), total=len(results_list)):
+                R.merge_statistics(stats)
+                collect(outcome)
+        # workers log in completion order
+        get_log_sink().sort_streams([result['idx'] for result in results_list])
+    return final_repaired_result, exception_dict, actual_incorrect_sql
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -16,78 +181,28 @@ if __name__ == "__main__":
     parser.add_argument("--before", action="store_true")
     parser.add_argument("--after", action="store_true")
     parser.add_argument("--LLMdisable", action="store_true")
+    parser.add_argument("--workers", type=int, default=1, help="number of forked worker processes, results and statistics are identical to the sequential run")
+    parser.add_argument("--async_llm", action="store_true", help="overlap LLM requests of many questions in one event loop")
+    parser.add_argument("--no_prefetch", action="store_true", help="initialize databases on first use instead of those of the input up front (not with --workers)")
     args = parser.parse_args()
     before_flag = args.before
     after_flag = args.after
     assert before_flag or after_flag
+    assert args.workers >= 1
+    assert not (args.async_llm and args.workers > 1), "--async_llm and --workers can not be combined"
+    # forked workers would each initialize (and snapshot) the same databases concurrently
+    assert not (args.no_prefetch and args.workers > 1), "--no_prefetch and --workers can not be combined"
     print(args)
 
     result_path = Path(args.result_path)
     
-    positive_repairing = 0
-    false_repairing = 0
-    
-    final_repaired_result = []
-    
     results_list = read_json(result_path)
     
-    R = MapleRepair(result_root_dir=result_root_dir, LLM_enable=args.LLMdisable)
+    # databases referenced by the input are initialized up front (once, before workers fork), others on first use
+    db_list = None if args.no_prefetch else sorted({result['db_id'] for result in results_list})
+    R = MapleRepair(db_list=db_list, result_root_dir=result_root_dir, LLM_enable=args.LLMdisable)
     
-    exception_dict = {}
-    
-    actual_incorrect_sql = 0
-    
-    for result in tqdm(results_list):
-        db_id = result['db_id']
-        db:Database = DBs[db_id]
-        question = result['question']
-        evidence = result['evidence']
-        
-        idx = result['idx']
-        gold_sql = result['gold']
-        if before_flag:
-            sql_statement = result['pred']
-            res = result['pred_result']
-        elif after_flag:
-            sql_statement = result['repair_sql']
-            res = result['repair_result']
-            
-        if not generalizability_test:
-            if idx in gold_err_idx:
-                continue
-            
-        if dataset == 'SPIDER' and data_split == 'DEV':
-            if db_id == 'flight_2':
-                continue
-            
-        if res not in (1, '1'):
-            actual_incorrect_sql += 1
-        
-        try:
-            start = time.perf_counter()
-            repaired_sql_statement = R.repair(sql_statement, gold_sql=gold_sql, db_id=db_id, origin_res=res, question_id=idx, question=question, evidence=evidence)
-        except BaseException as be:
-            if type(be).__name__ not in exception_dict:
-                exception_dict[type(be).__name__] = []
-            exception_dict[type(be).__name__].append((idx, str(be)))
-            continue
-        finally:
-            end = time.perf_counter()
-            # print(f"Time taken: {end - start:0.9f} seconds")
-            log_path = result_root_dir / 'total_overhead' / f"{idx}.json"
-            content = json.dumps({"time": end-start})
-            make_log(log_path, content)
-            
-        # repaired_sql_statement = R.repair(sql_statement, gold_sql=gold_sql, db_id=db_id, origin_res=res, question_id=idx, question=question, evidence=evidence)
-        
-        repaired_res, err_msg = db.execution_match(repaired_sql_statement, gold_sql)
-        if res == 1 and repaired_res != 1:
-            false_repairing += 1
-        elif res != 1 and repaired_res == 1:
-            positive_repairing += 1
-        result['repair_sql'] = repaired_sql_statement
-        result['repair_result'] = repaired_res if err_msg is None else err_msg
-        final_repaired_result.append(result)
+    final_repaired_result, exception_dict, actual_incorrect_sql = repair_all(results_list, args.workers, args.async_llm)
         
     print(f"The number of actual incorrect SQL query: {actual_incorrect_sql}")
     if before_flag:
@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# MapleRepair.config reads ./project.env and creates ./results on import:
+# run the tests in a scratch directory with a minimal configuration.
+_scratch = tempfile.mkdtemp(prefix='maplerepair-tests-')
+os.chdir(_scratch)
+os.environ.setdefault('DATASET', 'BIRD')
+os.environ.setdefault('DATA_SPLIT', 'DEV')
+os.environ.setdefault('DEV_BIRD_DB_ROOT_PATH', _scratch)
+os.environ.setdefault('DB_CACHE_DIR', os.path.join(_scratch, '.cache'))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+@pytest.fixture
+def sqlite_database(tmp_path, monkeypatch):
+    """
+    Factory of small `Database`s registered in `DBs`: `sqlite_database(db_id, statements)`
+    runs `statements` on a new SQLite file and sets up what querying and qualifying need.
+    """
+    from MapleRepair.Database import Database, DBs
+    from MapleRepair.utils.cache import LRU_Cache
+    def make(db_id, statements):
+        db_path = tmp_path / db_id / f"{db_id}.sqlite"
+        db_path.parent.mkdir()
+        with sqlite3.connect(db_path) as conn:
+            conn.executescript(statements)
+        conn.close()
+        db = Database.__new__(Database)
+        db.dataset, db.data_split, db.db_id, db.db_path = 'BIRD', 'DEV', db_id, db_path
+        db.explain_cache = LRU_Cache(64)
+        db._schema4sqlglot = db.init_schema4sqlglot()
+        db.schema = {table: {column: {'type': column_type} for column, column_type in columns.items()}
+                     for table, columns in db._schema4sqlglot.items()}
+        monkeypatch.setitem(DBs, db_id, db)
+        return db
+    return make
@@ -0,0 +1,168 @@
+import sqlite3
+
+import pytest
+
+from MapleRepair.Customized_Exception import QueryTimedOut
+from MapleRepair.utils.cache import LRU_Cache, Result_Cache, _estimate_size, normalize_sql
+
+SCHEMA = """
+CREATE TABLE t (a INTEGER, b TEXT);
+INSERT INTO t VALUES (1, 'x  y'), (2, 'x y'), (3, '-- no comment'), (4, 'it''s');
+"""
+
+@pytest.mark.parametrize('query, normalized', [
+    ("  SELECT  a\n\tFROM t ;; ", "SELECT a FROM t"),
+    ("SELECT a FROM t WHERE b = 'x  y'", "SELECT a FROM t WHERE b = 'x  y'"),
+    ("SELECT a FROM t WHERE b = 'it''s'  ", "SELECT a FROM t WHERE b = 'it''s'"),
+    ('SELECT "a  b" ,  `c  d`, [e  f] FROM t', 'SELECT "a  b" , `c  d`, [e  f] FROM t'),
+    ("SELECT a  -- first  comment\n  FROM t", "SELECT a -- first  comment\nFROM t"),
+    ("SELECT a /* block\n  comment */  FROM t", "SELECT a /* block\n  comment */ FROM t"),
+    ("SELECT ';' ;", "SELECT ';'"),
+])
+def test_normalize_sql(query, normalized):
+    assert normalize_sql(query) == normalized
+    assert normalize_sql(normalized) == normalized
+
+@pytest.mark.parametrize('first, second', [
+    # string literals
+    ("SELECT a FROM t WHERE b = 'x  y'", "SELECT a FROM t WHERE b = 'x y'"),
+    ("SELECT a FROM t WHERE b = '-- no comment'", "SELECT a FROM t WHERE b = '--  no comment'"),
+    # comments
+    ("SELECT a -- one\nFROM t", "SELECT a -- two\nFROM t"),
+    ("SELECT a /* one */ FROM t", "SELECT a /*  one */ FROM t"),
+    ("SELECT 1 -- WHERE\n, 2", "SELECT 1 , 2 -- WHERE"),
+])
+def test_literals_and_comments_stay_distinct(first, second):
+    assert normalize_sql(first) != normalize_sql(second)
+
+@pytest.mark.parametrize('query', [
+    "SELECT a FROM t WHERE b = 'x  y'",
+    "SELECT a FROM t WHERE b = '-- no comment' -- a comment\n  ORDER BY a",
+    "SELECT a -- comment\nFROM t WHERE b = 'it''s'",
+    "SELECT a /* -- */ FROM t   WHERE a > 1 ;",
+])
+def test_normalized_query_has_the_same_result(query):
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(SCHEMA)
+    assert conn.execute(normalize_sql(query)).fetchall() == conn.execute(query.rstrip().rstrip(';')).fetchall()
+
+def test_lru_cache():
+    cache = LRU_Cache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+    disabled = LRU_Cache(0)
+    disabled.put('a', 1)
+    assert disabled.get('a') is None
+
+@pytest.fixture
+def db(sqlite_database, monkeypatch):
+    db = sqlite_database('cache_test', SCHEMA)
+    db.explained = []
+    execute_query = db.execute_query
+    def counting_execute_query(query, fetch="all", idx=None, timeout=None):
+        db.explained.append(query)
+        return execute_query(query, fetch, idx, timeout)
+    monkeypatch.setattr(db, 'execute_query', counting_execute_query)
+    return db
+
+def test_is_executable_replays_errors(db):
+    for query in ("SELECT nope FROM t", "SELECT  nope\nFROM t;"):
+        with pytest.raises(sqlite3.OperationalError, match='no such column: nope'):
+            db.is_executable(query)
+    assert db.explained == ["EXPLAIN SELECT nope FROM t"]
+    for query in ("SELECT a FROM t", " SELECT a  FROM t"):
+        db.is_executable(query)
+    # a different literal is another statement
+    db.is_executable("SELECT a FROM t WHERE b = 'x  y'")
+    db.is_executable("SELECT a FROM t WHERE b = 'x y'")
+    assert len(db.explained) == 4
+
+def test_is_executable_does_not_cache_timeouts(db, monkeypatch):
+    def timed_out(query, fetch="all", idx=None, timeout=None):
+        db.explained.append(query)
+        raise QueryTimedOut('deadline', 1)
+    execute_query = db.execute_query
+    monkeypatch.setattr(db, 'execute_query', timed_out)
+    with pytest.raises(QueryTimedOut):
+        db.is_executable("SELECT a FROM t")
+    monkeypatch.setattr(db, 'execute_query', execute_query)
+    db.is_executable("SELECT a FROM t")
+    db.is_executable("SELECT a FROM t")
+    assert len(db.explained) == 2
+
+def rows(n, width=10):
+    return [(i, 'v' * width) for i in range(n)]
+
+def test_result_cache_promotes_partial_fetch():
+    cache = Result_Cache(1 << 20)
+    cache.put('q', rows(5), complete=False)
+    assert cache.get('q', 3) == rows(3) and cache.get('q', 5) == rows(5)
+    # more rows, or all of them, are not known yet
+    assert cache.get('q', 6) is None and cache.get('q') is None
+    # a smaller partial fetch does not replace a larger one
+    cache.put('q', rows(2), complete=False)
+    assert cache.get('q', 5) == rows(5)
+    cache.put('q', rows(8), complete=False)
+    assert cache.get('q', 8) == rows(8)
+    cache.put('q', rows(20), complete=True)
+    assert cache.get('q') == rows(20) and cache.get('q', 100) == rows(20) and cache.get('q', 3) == rows(3)
+    # a complete entry is final
+    cache.put('q', rows(3), complete=False)
+    assert cache.get('q') == rows(20)
+    assert len(cache) == 1 and cache.bytes == _estimate_size(rows(20))
+
+def test_result_cache_fewer_rows_than_asked_is_complete(db):
+    db.result_cache = Result_Cache(1 << 20)
+    assert db.execute_cached("SELECT a FROM t ORDER BY a", fetch=10) == [(1,), (2,), (3,), (4,)]
+    assert db.execute_cached("SELECT a FROM t ORDER BY a") == [(1,), (2,), (3,), (4,)]
+    assert db.execute_cached("SELECT a FROM t ORDER BY a", fetch=2) == [(1,), (2,)]
+    assert db.explained == ["SELECT a FROM t ORDER BY a"]
+
+def test_execute_cached_promotes_partial_fetch(db):
+    db.result_cache = Result_Cache(1 << 20)
+    query = "SELECT a FROM t ORDER BY a"
+    assert db.execute_cached(query, fetch=2) == [(1,), (2,)]
+    assert db.execute_cached(query, fetch=1) == [(1,)]
+    assert db.execute_cached(query, fetch=3) == [(1,), (2,), (3,)]
+    assert db.execute_cached(query) == [(1,), (2,), (3,), (4,)]
+    assert db.execute_cached(" SELECT a  FROM t ORDER BY a;", fetch=3) == [(1,), (2,), (3,)]
+    assert db.explained == [query] * 3
+    # callers get their own list
+    db.execute_cached(query).append(('changed',))
+    assert db.execute_cached(query) == [(1,), (2,), (3,), (4,)]
+
+def test_result_cache_byte_budget():
+    entry = _estimate_size(rows(10))
+    cache = Result_Cache(4 * entry, max_entry_ratio=0.5)
+    for key in 'abcd':
+        cache.put(key, rows(10), complete=True)
+    assert len(cache) == 4 and cache.bytes == 4 * entry
+    # the least recently used entry goes first
+    cache.get('a')
+    cache.put('e', rows(10), complete=True)
+    assert cache.get('b') is None and all(cache.get(key) is not None for key in 'acde')
+    assert cache.bytes == 4 * entry <= cache.max_bytes
+    # a larger entry evicts as many as needed
+    cache.put('f', rows(18), complete=True)
+    assert cache.bytes <= cache.max_bytes and cache.get('f') is not None
+    assert sum(cache.get(key) is not None for key in 'acde') == 2
+    assert cache.bytes == sum(size for _, _, size in cache._data.values())
+
+def test_result_cache_entry_limit():
+    entry = _estimate_size(rows(10))
+    cache = Result_Cache(8 * entry, max_entry_ratio=0.125)
+    assert cache.max_entry_bytes == entry
+    cache.put('small', rows(10), complete=True)
+    cache.put('large', rows(11), complete=True)
+    assert cache.get('large') is None and cache.get('small') is not None
+    # an oversized full result keeps the partial entry
+    cache.put('q', rows(5), complete=False)
+    cache.put('q', rows(50), complete=True)
+    assert cache.get('q', 5) == rows(5) and cache.get('q') is None
+    assert cache.bytes == _estimate_size(rows(10)) + _estimate_size(rows(5))
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
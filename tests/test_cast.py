@@ -0,0 +1,23 @@
+import pytest
+
+from MapleRepair.SQL import SQL
+from MapleRepair.logic.Cast import cast_repair
+
+SCHEMA = """
+CREATE TABLE t (k INTEGER, a INTEGER, b REAL);
+INSERT INTO t VALUES (1, 7, 2.0), (2, 7, 2.0), (3, NULL, 1.5), (4, 4, NULL);
+"""
+
+@pytest.mark.parametrize('statement, expected', [
+    # integer division changes with the CAST
+    ("SELECT a / 2 FROM t", ("SELECT CAST(`t`.`a` AS REAL) / 2 AS `_col_0` FROM `t` AS `t`", True)),
+    # a REAL operand, no candidate
+    ("SELECT a / b FROM t", ("SELECT `t`.`a` / `t`.`b` AS `_col_0` FROM `t` AS `t`", False)),
+    # the CAST does not change the result (1 = 1.0)
+    ("SELECT k / 1 FROM t", ("SELECT `t`.`k` / 1 AS `_col_0` FROM `t` AS `t`", False)),
+    # cumulative candidates, the second one diverges
+    ("SELECT k / 1, a / 2 FROM t", ("SELECT CAST(`t`.`k` AS REAL) / 1 AS `_col_0`, CAST(`t`.`a` AS REAL) / 2 AS `_col_1` FROM `t` AS `t`", True)),
+])
+def test_cast_repair(sqlite_database, statement, expected):
+    sqlite_database('cast_test', SCHEMA)
+    assert cast_repair(SQL(statement, db_id='cast_test')) == expected
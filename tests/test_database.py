@@ -0,0 +1,282 @@
+import os
+import sqlite3
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import MapleRepair.Database as Database_module
+from MapleRepair.config import db_cache_dir, db_root_path
+from MapleRepair.Database import Database, SNAPSHOT_ATTRIBUTES, encode_string, load_data, point_id, save_data
+from MapleRepair.dataset_utils.bird import get_pkfk, get_schema
+from MapleRepair.utils import vector_store
+from MapleRepair.utils.cache import LRU_Cache
+from MapleRepair.utils.vector_store import Vector_Hit, Vector_Store
+
+class Fake_Vector_Store():
+    def __init__(self, values):
+        # collection -> distinct values, a hit scores the length of the common prefix
+        self.values = values
+        self.embedded = []
+        self.searches = []
+
+    def embed_queries(self, texts):
+        self.embedded.append(list(texts))
+        return list(texts)
+
+    def search_batch(self, collection_name, queries, limit):
+        self.searches.append((collection_name, list(queries)))
+        def score(value, query):
+            return next((i for i, (a, b) in enumerate(zip(value, query)) if a != b), min(len(value), len(query)))
+        return [[Vector_Hit(value, {'document': value}, score(value, query))
+                 for value in sorted(self.values[collection_name], key=lambda value: -score(value, query))[:limit]]
+                for query in queries]
+
+def make_database(values):
+    # the attributes `val_vec_query_batch` uses, without initializing a database
+    db = Database.__new__(Database)
+    db.dataset, db.data_split, db.db_id = 'BIRD', 'DEV', 'shop'
+    db.schema = {'Customer': {'City': {'type': 'TEXT'}, 'Name': {'type': 'TEXT'}}}
+    db.val_vec_cache = LRU_Cache(64)
+    db.vecDB_client = Fake_Vector_Store(values)
+    return db
+
+CITY = 'BIRD.DEV.shop.Customer.City.distinct_val'
+NAME = 'BIRD.DEV.shop.Customer.Name.distinct_val'
+
+def test_val_vec_query_batch():
+    db = make_database({CITY: ['Paris', 'Parma', 'Rome'], NAME: ['Alice', 'Bob']})
+    results = db.val_vec_query_batch([('customer', 'city', 'Pari'), ('CUSTOMER', 'name', 'Al'), ('customer', 'city', 'Ro')], top_k=1)
+    assert results == [[('Paris', 4)], [('Alice', 2)], [('Rome', 2)]]
+    # texts embedded together, one search per collection
+    assert [sorted(texts) for texts in db.vecDB_client.embedded] == [['Al', 'Pari', 'Ro']]
+    assert sorted(db.vecDB_client.searches) == [(CITY, ['Pari', 'Ro']), (NAME, ['Al'])]
+    # single lookups are answered from the cache
+    assert db.val_vec_query('Customer', 'City', 'Ro', top_k=1) == [('Rome', 2)]
+    assert len(db.vecDB_client.searches) == 2
+    assert db.val_vec_query('Customer', 'City', 'Ro', top_k=2) == [('Rome', 2), ('Paris', 0)]
+    assert len(db.vecDB_client.searches) == 3
+
+def snapshot_database(tmp_path, db_id):
+    db_path = tmp_path / f"{db_id}.sqlite"
+    if not db_path.exists():
+        sqlite3.connect(db_path).execute("CREATE TABLE t (a TEXT)").connection.close()
+    db = Database.__new__(Database)
+    db.dataset, db.data_split, db.db_id, db.db_path = 'BIRD', 'DEV', db_id, str(db_path)
+    return db
+
+def test_snapshot_roundtrip(tmp_path):
+    db = snapshot_database(tmp_path, 'snapshot_roundtrip')
+    for attribute in SNAPSHOT_ATTRIBUTES:
+        setattr(db, attribute, {'attribute': attribute})
+    db.save_snapshot()
+    restored = snapshot_database(tmp_path, 'snapshot_roundtrip')
+    assert restored.load_snapshot()
+    for attribute in SNAPSHOT_ATTRIBUTES:
+        assert getattr(restored, attribute) == {'attribute': attribute}
+
+def test_snapshot_of_changed_database_is_ignored(tmp_path):
+    db = snapshot_database(tmp_path, 'snapshot_changed')
+    for attribute in SNAPSHOT_ATTRIBUTES:
+        setattr(db, attribute, None)
+    db.save_snapshot()
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("INSERT INTO t VALUES ('x')")
+    os.utime(db.db_path, ns=(0, 0))
+    assert not snapshot_database(tmp_path, 'snapshot_changed').load_snapshot()
+
+def test_snapshot_of_other_version_is_ignored(tmp_path, monkeypatch):
+    db = snapshot_database(tmp_path, 'snapshot_version')
+    for attribute in SNAPSHOT_ATTRIBUTES:
+        setattr(db, attribute, None)
+    db.save_snapshot()
+    monkeypatch.setattr(Database_module, 'SNAPSHOT_VERSION', Database_module.SNAPSHOT_VERSION + 1)
+    assert not snapshot_database(tmp_path, 'snapshot_version').load_snapshot()
+    assert not snapshot_database(tmp_path, 'no_snapshot').load_snapshot()
+
+@pytest.mark.parametrize('setting, value', [
+    ('date_format_samples', 5), ('date_format_scan_rows', 10), ('date_format_min_coverage', 0.5),
+    ('nlp_backend', 'spacy'), ('profile_max_distinct', 10), ('profile_max_length', 10),
+])
+def test_snapshot_of_other_settings_is_ignored(tmp_path, monkeypatch, setting, value):
+    db = snapshot_database(tmp_path, 'snapshot_settings')
+    for attribute in SNAPSHOT_ATTRIBUTES:
+        setattr(db, attribute, None)
+    db.save_snapshot()
+    assert snapshot_database(tmp_path, 'snapshot_settings').load_snapshot()
+    monkeypatch.setattr(Database_module, setting, value)
+    assert not snapshot_database(tmp_path, 'snapshot_settings').load_snapshot()
+
+class Bird_Schema_Initializer():
+    # `Bird_Initializer` without the description files
+    def __init__(self, db_id):
+        self.db_id = db_id
+
+    def do_init(self):
+        schema = get_schema(self.db_id)
+        for columns in schema.values():
+            for column, info in columns.items():
+                info['description'] = column
+        return schema, get_pkfk(self.db_id)
+
+def test_legacy_schema_cache_is_not_adopted(monkeypatch):
+    db_id = 'legacy_schema'
+    db_path = Path(db_root_path) / db_id / f"{db_id}.sqlite"
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db_path.unlink(missing_ok=True)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (name TEXT, code TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [('Rome', 'A-01'), ('Paris', 'A-02')])
+    conn.close()
+    # written by older versions, without the stamp of the database or settings
+    stale = {'t': {column: {'type': 'TEXT', 'description': column, 'distinct_val': {'stale'}, 'orderable': False}
+                   for column in ('name', 'code')}}
+    legacy_path = Path(db_cache_dir) / encode_string('BIRD') / encode_string('DEV') / encode_string(db_id) / 'schema.pickle'
+    save_data(legacy_path, stale)
+    monkeypatch.setattr(Database_module, 'Bird_Initializer', Bird_Schema_Initializer)
+    db = Database(db_id, 'BIRD', 'DEV')
+    assert not db.from_snapshot
+    assert db.schema['t']['name']['distinct_val'] == {'Rome', 'Paris'}
+    assert db.schema['t']['code']['orderable']
+    assert load_data(legacy_path) == (stale, True)
+
+@pytest.fixture
+def registry(monkeypatch):
+    built, finished = [], []
+    def partial_init_database(db_id):
+        built.append(db_id)
+        return SimpleNamespace(db_id=db_id)
+    def finish_database(db):
+        if db.db_id == 'broken':
+            raise RuntimeError('broken')
+        finished.append(db.db_id)
+    monkeypatch.setattr(Database_module, 'DBs_name', ['a', 'b', 'broken'])
+    monkeypatch.setattr(Database_module, 'partial_init_database', partial_init_database)
+    monkeypatch.setattr(Database_module, 'finish_database', finish_database)
+    return Database_module.Database_Registry(), built, finished
+
+def test_registry_initializes_on_first_access(registry):
+    DBs, built, finished = registry
+    assert 'a' not in DBs and not built
+    assert DBs['a'].db_id == 'a'
+    assert DBs['a'] is DBs.get('a')
+    assert built == finished == ['a']
+    assert list(DBs) == ['a']
+
+def test_registry_rejects_unknown_databases(registry):
+    DBs, built, _ = registry
+    with pytest.raises(KeyError):
+        DBs['unknown']
+    assert DBs.get('unknown') is None and not built
+
+def test_registry_drops_failed_databases(registry):
+    DBs, built, _ = registry
+    with pytest.raises(RuntimeError):
+        DBs['broken']
+    assert 'broken' not in DBs
+    with pytest.raises(RuntimeError):
+        DBs['broken']
+    assert built == ['broken', 'broken']
+
+def test_point_id():
+    first = point_id('BIRD.DEV.shop.customer.city.distinct_val', 'Paris')
+    assert first == point_id('BIRD.DEV.shop.customer.city.distinct_val', 'Paris')
+    assert str(uuid.UUID(first)) == first
+    assert first != point_id('BIRD.DEV.shop.customer.city.distinct_val', 'paris')
+    assert first != point_id('BIRD.DEV.shop.store.city.distinct_val', 'Paris')
+    # keys are not concatenated ambiguously
+    assert point_id('c', 'ab', 'c') != point_id('c', 'a', 'bc')
+
+class Recording_Vector_Store(Vector_Store):
+    def __init__(self):
+        self.collections = {}
+
+    def collection_exists(self, collection_name):
+        return collection_name in self.collections
+
+    def count(self, collection_name):
+        return len(self.collections[collection_name])
+
+    def add(self, collection_name, documents, metadata, ids):
+        points = self.collections.setdefault(collection_name, {})
+        for document, meta, point in zip(documents, metadata, ids):
+            points[point] = {**meta, 'document': document}
+
+    def delete(self, collection_name, ids):
+        for point in ids:
+            self.collections.get(collection_name, {}).pop(point, None)
+
+    def points(self, collection_name):
+        return dict(self.collections[collection_name])
+
+def test_distinct_val_vectorize_uses_point_ids(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, 'db_cache_dir', str(tmp_path))
+    db = make_database({})
+    db.db_id = 'vectorize'
+    db.vecDB_client = Recording_Vector_Store()
+    db.schema = {'customer': {'city': {'distinct_val': {'Paris', 'Rome'}}, 'age': {'distinct_val': None}}}
+    db.distinct_val_vectorize()
+    name = 'BIRD.DEV.vectorize.customer.city.distinct_val'
+    assert sorted(db.vecDB_client.collections) == [name]
+    assert {point: payload['document'] for point, payload in db.vecDB_client.collections[name].items()} == \
+        {point_id(name, 'Paris'): 'Paris', point_id(name, 'Rome'): 'Rome'}
+
+DIVERGENT_SCHEMA = """
+CREATE TABLE t (k INTEGER, a INTEGER, b REAL, c TEXT);
+INSERT INTO t VALUES (1, 7, 2.0, 'x'), (2, 7, 2.0, 'x'), (3, NULL, 1.5, NULL), (4, 3, NULL, ''), (5, 1, 1.0, '1');
+"""
+
+def set_match(conn, query, candidate):
+    # the comparison of `execution_match` before `first_divergent`, failures do not match
+    try:
+        return set(conn.execute(query).fetchall()) == set(conn.execute(candidate).fetchall())
+    except sqlite3.Error:
+        return False
+
+def loop_first_divergent(conn, query, candidates):
+    return next((i for i, candidate in enumerate(candidates) if not set_match(conn, query, candidate)), None)
+
+CANDIDATES = [
+    # duplicates and order
+    "SELECT a FROM t",
+    "SELECT DISTINCT a FROM t",
+    "SELECT a FROM t ORDER BY a DESC",
+    "SELECT a FROM t UNION ALL SELECT a FROM t",
+    # NULLs
+    "SELECT a FROM t WHERE a IS NOT NULL",
+    "SELECT IFNULL(a, NULL) FROM t",
+    "SELECT COALESCE(a, '') FROM t",
+    # types, 1 = 1.0 but 1 != '1'
+    "SELECT a * 1.0 FROM t",
+    "SELECT CAST(a AS TEXT) FROM t",
+    "SELECT a / 2 FROM t",
+    "SELECT CAST(a AS REAL) / 2 FROM t",
+    # column count
+    "SELECT a, a FROM t",
+    "SELECT a FROM t WHERE 0",
+    "SELECT a, b FROM t WHERE 0",
+    # failures
+    "SELECT nope FROM t",
+    "SELEC a",
+]
+
+@pytest.mark.parametrize('query', ["SELECT a FROM t", "SELECT a FROM t WHERE 0", "SELECT a / 2 FROM t ORDER BY k", "SELECT nope FROM t"])
+def test_first_divergent_matches_loop(sqlite_database, query):
+    db = sqlite_database('divergent', DIVERGENT_SCHEMA)
+    conn = sqlite3.connect(db.db_path)
+    for start in range(len(CANDIDATES)):
+        candidates = CANDIDATES[start:]
+        assert db.first_divergent(query, candidates) == loop_first_divergent(conn, query, candidates), candidates[0]
+    # every candidate on its own
+    for candidate in CANDIDATES:
+        assert (db.first_divergent(query, [candidate]) is None) == set_match(conn, query, candidate), candidate
+    assert db.first_divergent(query, []) is None
+    conn.close()
+
+def test_first_divergent_connection_is_clean(sqlite_database):
+    db = sqlite_database('divergent', DIVERGENT_SCHEMA)
+    assert db.first_divergent("SELECT a FROM t", ["SELECT a FROM t ORDER BY k", "SELECT b FROM t"]) == 1
+    # temp tables are dropped, the pooled connection answers the next evaluation
+    assert db.execute_query("SELECT name FROM sqlite_temp_master") == []
+    assert db.first_divergent("SELECT c FROM t", ["SELECT c FROM t WHERE k > 1", "SELECT c FROM t"]) is None
@@ -0,0 +1,66 @@
+import sqlite3
+import time
+
+import pytest
+from func_timeout import FunctionTimedOut
+
+from MapleRepair.Customized_Exception import QueryTimedOut
+from MapleRepair.utils.deadline import Query_Deadline
+
+# never ends without a deadline
+ENDLESS_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+# a few hundred milliseconds
+SLOW_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT 500000) SELECT COUNT(*) FROM n"
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (a INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    yield conn
+    conn.close()
+
+def test_deadline_interrupts_query(conn):
+    start = time.monotonic()
+    with pytest.raises(QueryTimedOut) as info:
+        with Query_Deadline(conn, 0.2):
+            conn.execute(ENDLESS_SQL).fetchall()
+    assert 0.2 <= time.monotonic() - start < 2
+    assert isinstance(info.value, FunctionTimedOut)
+    assert isinstance(info.value.__cause__, sqlite3.OperationalError)
+    # the connection runs the next query, without the handler
+    assert conn.execute("SELECT a FROM t").fetchall() == [(1,)]
+    time.sleep(0.2)
+    assert conn.execute(SLOW_SQL).fetchall() == [(500000,)]
+
+def test_handler_is_removed_after_fast_query(conn):
+    with Query_Deadline(conn, 0.05):
+        assert conn.execute("SELECT a FROM t").fetchall() == [(1,)]
+    time.sleep(0.1)
+    assert conn.execute(SLOW_SQL).fetchall() == [(500000,)]
+
+def test_deadline_is_per_statement_block(conn):
+    for _ in range(3):
+        with pytest.raises(QueryTimedOut):
+            with Query_Deadline(conn, 0.05):
+                conn.execute(ENDLESS_SQL).fetchall()
+    with Query_Deadline(conn, 30) as deadline:
+        assert conn.execute(SLOW_SQL).fetchall() == [(500000,)]
+    assert not deadline.expired
+
+def test_other_errors_pass_through(conn):
+    with pytest.raises(sqlite3.OperationalError, match='no such table'):
+        with Query_Deadline(conn, 1):
+            conn.execute("SELECT a FROM nope")
+    # only the interrupted statement turns into QueryTimedOut
+    with pytest.raises(ValueError):
+        with Query_Deadline(conn, 0.05) as deadline:
+            with pytest.raises(sqlite3.OperationalError, match='interrupted'):
+                conn.execute(ENDLESS_SQL)
+            raise ValueError
+    assert deadline.expired
+
+def test_no_deadline(conn):
+    with Query_Deadline(conn, None) as deadline:
+        assert conn.execute(SLOW_SQL).fetchall() == [(500000,)]
+    assert deadline.deadline is None and not deadline.expired
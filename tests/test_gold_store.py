@@ -0,0 +1,136 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+from func_timeout import FunctionTimedOut
+
+from MapleRepair.Customized_Exception import QueryTimedOut, StoredQueryError
+from MapleRepair.utils.gold_store import Gold_Result_Store
+from MapleRepair.utils.result_compare import query_fingerprint
+
+SLOW_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / 'gold.sqlite'
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [(1, 'x'), (1, 'x'), (2, None), (3, 'z')])
+    conn.close()
+    return db_path
+
+class Counting_Connection():
+    """
+    A connection to `db_path` counting the statements it runs.
+    """
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.statements = []
+        self.conn.set_trace_callback(self.statements.append)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+def gold_result(store, conn, db_path, sql, timeout=5, per_column=False):
+    return store.gold_result(conn.conn, 'gold', db_path, sql, timeout, per_column)
+
+def test_hit(tmp_path, db_path):
+    store = Gold_Result_Store(tmp_path / 'store.sqlite', max_rows=10)
+    conn = Counting_Connection(db_path)
+    fingerprint, rows = gold_result(store, conn, db_path, "SELECT a, b FROM t")
+    assert sorted(rows, key=repr) == [(1, 'x'), (2, None), (3, 'z')]
+    assert fingerprint.key() == query_fingerprint(conn.conn, "SELECT a, b FROM t").key()
+    executed = len(conn.statements)
+    # another store on the same file, e.g. the next run
+    other = Gold_Result_Store(tmp_path / 'store.sqlite', max_rows=10)
+    stored_fingerprint, stored_rows = gold_result(other, conn, db_path, "SELECT a, b FROM t")
+    assert stored_fingerprint.key() == fingerprint.key() and stored_rows == rows
+    assert len(conn.statements) == executed
+    assert (other.hits, other.misses) == (1, 0)
+    # a per-column fingerprint is computed once
+    assert gold_result(other, conn, db_path, "SELECT a, b FROM t", per_column=True)[0].columns is not None
+    assert gold_result(other, conn, db_path, "SELECT a, b FROM t", per_column=True)[0].columns is not None
+    assert (other.hits, other.misses) == (2, 1)
+
+def test_changed_database_is_recomputed(tmp_path, db_path):
+    store = Gold_Result_Store(tmp_path / 'store.sqlite', max_rows=10)
+    conn = Counting_Connection(db_path)
+    assert len(gold_result(store, conn, db_path, "SELECT a FROM t")[1]) == 3
+    conn.execute("INSERT INTO t VALUES (4, 'w')")
+    conn.commit()
+    assert len(gold_result(store, conn, db_path, "SELECT a FROM t")[1]) == 4
+    assert store.misses == 2
+
+def test_error_replay(tmp_path, db_path):
+    store = Gold_Result_Store(tmp_path / 'store.sqlite')
+    conn = Counting_Connection(db_path)
+    with pytest.raises(sqlite3.OperationalError, match='no such column'):
+        gold_result(store, conn, db_path, "SELECT nope FROM t")
+    executed = len(conn.statements)
+    with pytest.raises(StoredQueryError, match='no such column'):
+        gold_result(store, conn, db_path, "SELECT nope FROM t")
+    assert len(conn.statements) == executed
+
+def test_timeout_replay(tmp_path, db_path):
+    store = Gold_Result_Store(tmp_path / 'store.sqlite')
+    conn = Counting_Connection(db_path)
+    with pytest.raises(QueryTimedOut):
+        gold_result(store, conn, db_path, SLOW_SQL, timeout=0.2)
+    executed = len(conn.statements)
+    # replayed for deadlines up to the one it hit
+    for timeout in (0.2, 0.1):
+        with pytest.raises(FunctionTimedOut):
+            gold_result(store, conn, db_path, SLOW_SQL, timeout=timeout)
+    assert len(conn.statements) == executed and store.hits == 2
+    # a longer deadline runs the query again
+    with pytest.raises(QueryTimedOut):
+        gold_result(store, conn, db_path, SLOW_SQL, timeout=0.3)
+    assert len(conn.statements) > executed and store.misses == 2
+
+@pytest.mark.parametrize('max_rows, stored', [(0, False), (2, False), (3, True), (10, True)])
+def test_max_rows(tmp_path, db_path, max_rows, stored):
+    # 4 rows, 3 distinct ones
+    store = Gold_Result_Store(tmp_path / 'store.sqlite', max_rows=max_rows)
+    conn = Counting_Connection(db_path)
+    for _ in range(2):
+        fingerprint, rows = gold_result(store, conn, db_path, "SELECT a, b FROM t")
+        assert fingerprint.count == 3
+        assert (rows is not None) == stored
+        if stored:
+            assert sorted(rows, key=repr) == [(1, 'x'), (2, None), (3, 'z')]
+
+def write_results(store_path, db_path, worker, n):
+    store = Gold_Result_Store(store_path, max_rows=100)
+    conn = sqlite3.connect(db_path)
+    for i in range(n):
+        # the same queries in both processes and queries of this process only
+        store.gold_result(conn, 'gold', db_path, f"SELECT a + {i} FROM t", 5)
+        store.gold_result(conn, 'gold', db_path, f"SELECT a + {i}, {worker} FROM t", 5)
+
+def test_concurrent_writers(tmp_path, db_path):
+    store_path = tmp_path / 'store.sqlite'
+    # a store the parent opened before forking, as when workers are forked from the main process
+    parent = Gold_Result_Store(store_path, max_rows=100)
+    conn = sqlite3.connect(db_path)
+    parent.gold_result(conn, 'gold', db_path, "SELECT a FROM t", 5)
+    context = multiprocessing.get_context('fork')
+    def forked_writer(worker):
+        parent.gold_result(sqlite3.connect(db_path), 'gold', db_path, f"SELECT b, {worker} FROM t", 5)
+        write_results(store_path, db_path, worker, 50)
+    processes = [context.Process(target=forked_writer, args=(worker,)) for worker in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    with sqlite3.connect(store_path) as store_conn:
+        assert store_conn.execute("SELECT COUNT(*) FROM gold_results").fetchone()[0] == 1 + 2 + 50 + 2 * 50
+        assert store_conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    store_conn.close()
+    reader = Gold_Result_Store(store_path, max_rows=100)
+    for i in range(50):
+        for worker in range(2):
+            fingerprint, rows = reader.gold_result(conn, 'gold', db_path, f"SELECT a + {i}, {worker} FROM t", 5)
+            assert sorted(rows) == [(1 + i, worker), (2 + i, worker), (3 + i, worker)]
+    assert reader.misses == 0
@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from MapleRepair.utils import llm_api
+
+REQUEST = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+
+def status_error(cls, status_code):
+    return cls('error', response=httpx.Response(status_code, request=REQUEST), body=None)
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                           usage=SimpleNamespace(model_dump=lambda: {'total_tokens': 1}))
+
+class Fake_Completions():
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return completion('ok')
+
+    async def acreate(self, **kwargs):
+        return self.create(**kwargs)
+
+@pytest.fixture
+def client(monkeypatch):
+    def make(errors):
+        completions = Fake_Completions(errors)
+        monkeypatch.setattr(llm_api, 'openai_client', SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        monkeypatch.setattr(llm_api, 'async_openai_client', SimpleNamespace(chat=SimpleNamespace(
+            completions=SimpleNamespace(create=completions.acreate))))
+        monkeypatch.setattr(llm_api, '_async_semaphore', asyncio.Semaphore(1))
+        return completions
+    monkeypatch.setattr(llm_api, '_backoff_delay', lambda attempt: 0)
+    return make
+
+def request(asynchronous):
+    # a fresh prompt, never served from the response cache
+    prompt = f"prompt {uuid.uuid4()}"
+    if asynchronous:
+        return asyncio.run(llm_api.async_gpt_request(prompt))
+    return llm_api.gpt_request(prompt)
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+@pytest.mark.parametrize('error', [
+    status_error(openai.RateLimitError, 429),
+    status_error(openai.InternalServerError, 500),
+    status_error(openai.APIStatusError, 503),
+    openai.APIConnectionError(request=REQUEST),
+    openai.APITimeoutError(request=REQUEST),
+])
+def test_transient_errors_are_retried(client, asynchronous, error):
+    completions = client([error])
+    assert request(asynchronous)[0] == 'ok'
+    assert completions.calls == 2
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+@pytest.mark.parametrize('error', [
+    status_error(openai.BadRequestError, 400),
+    status_error(openai.AuthenticationError, 401),
+    status_error(openai.NotFoundError, 404),
+    ValueError('bug'),
+])
+def test_other_errors_are_raised_at_once(client, asynchronous, error):
+    completions = client([error])
+    with pytest.raises(type(error)):
+        request(asynchronous)
+    assert completions.calls == 1
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_last_error_is_raised(client, monkeypatch, asynchronous):
+    monkeypatch.setattr(llm_api, 'llm_max_retries', 3)
+    completions = client([status_error(openai.RateLimitError, 429)] * 3)
+    with pytest.raises(openai.RateLimitError):
+        request(asynchronous)
+    assert completions.calls == 3
+
+def test_max_retries_is_at_least_one(monkeypatch):
+    import importlib
+    import MapleRepair.config as config
+    monkeypatch.setenv('LLM_MAX_RETRIES', '0')
+    try:
+        assert importlib.reload(config).llm_max_retries == 1
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
@@ -0,0 +1,33 @@
+import pytest
+
+from MapleRepair.Customized_Exception import LLMCacheMissError
+from MapleRepair.utils.llm_cache import LLM_Response_Cache
+
+USAGE = {'total_tokens': 3}
+
+def test_roundtrip(tmp_path):
+    cache = LLM_Response_Cache(tmp_path / 'llm_cache.sqlite', mode='readwrite')
+    assert cache.lookup('m', 0, 'text', 'p') is None
+    cache.store('m', 0, 'text', 'p', 'r', USAGE)
+    assert cache.lookup('m', 0, 'text', 'p') == ('r', USAGE)
+    assert cache.lookup('m', 0, 'json_object', 'p') is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    replay = LLM_Response_Cache(tmp_path / 'llm_cache.sqlite', mode='replay')
+    assert replay.lookup('m', 0.0, 'text', 'p') == ('r', USAGE)
+    with pytest.raises(LLMCacheMissError):
+        replay.lookup('m', 0, 'text', 'other')
+
+def test_sampled_responses_are_not_cached(tmp_path):
+    cache = LLM_Response_Cache(tmp_path / 'llm_cache.sqlite', mode='readwrite')
+    cache.store('m', 0.7, 'text', 'p', 'r', USAGE)
+    assert cache.lookup('m', 0.7, 'text', 'p') is None
+    assert cache._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+    replay = LLM_Response_Cache(tmp_path / 'llm_cache.sqlite', mode='replay')
+    with pytest.raises(LLMCacheMissError):
+        replay.lookup('m', 0.7, 'text', 'p')
+
+def test_off(tmp_path):
+    cache = LLM_Response_Cache(tmp_path / 'llm_cache.sqlite', mode='off')
+    cache.store('m', 0, 'text', 'p', 'r', USAGE)
+    assert cache.lookup('m', 0, 'text', 'p') is None
+    assert not (tmp_path / 'llm_cache.sqlite').exists()
@@ -0,0 +1,95 @@
+import json
+import time
+
+import pytest
+
+import main
+from MapleRepair import config
+from MapleRepair.MapleRepair import MapleRepair
+from MapleRepair.utils import persistence
+from MapleRepair.utils.persistence import get_log_sink, read_log
+
+DB_ID = 'main_test'
+
+SCHEMA = """
+CREATE TABLE t (a INTEGER, b TEXT);
+INSERT INTO t VALUES (1, 'x'), (2, 'y'), (3, 'z');
+"""
+
+# not in `gold_err_idx`
+QUESTIONS = list(range(10000, 10024))
+
+def fake_repair(sql_statement, gold_sql, db_id, origin_res, question_id, question, evidence):
+    """
+    Stands in for `MapleRepair.repair`: statistics and logs depend on the question only,
+    later questions finish first.
+    """
+    R = main.R
+    time.sleep(0.002 * (QUESTIONS[-1] - question_id))
+    for step in range(question_id % 3 + 1):
+        get_log_sink().append("sql_logs", question_id, {"step": step, "sql": sql_statement})
+    entry = (question_id, sql_statement, gold_sql, db_id, origin_res)
+    (R.dcr.success_detected if question_id % 2 else R.dcr.false_detecting).append(entry)
+    R.nscr.anur.not_detected.append(entry)
+    R.llm.llm_call += question_id % 4
+    R.llm.llm_failure += question_id % 4 == 0
+    if question_id % 5 == 0:
+        R.resolved_exception.setdefault('ValueError', []).append((question_id, 'resolved'))
+    if question_id % 7 == 0:
+        raise RuntimeError(f"question {question_id}")
+    return f"SELECT a FROM t WHERE a = {question_id % 3 + 1}"
+
+@pytest.fixture
+def repair(sqlite_database, monkeypatch):
+    db = sqlite_database(DB_ID, SCHEMA)
+    monkeypatch.setattr(db, 'connect_vecDB', lambda: None)
+    R = MapleRepair(LLM_enable=False)
+    R.repair = fake_repair
+    monkeypatch.setattr(main, 'R', R)
+    monkeypatch.setattr(main, 'before_flag', True)
+    monkeypatch.setattr(persistence, '_log_sink', None)
+    return R
+
+def run(R, tmp_path, monkeypatch, name, workers):
+    # each run logs into a result directory of its own
+    monkeypatch.setattr(config, 'result_root_dir', tmp_path / name)
+    monkeypatch.setattr(persistence, '_log_sink', None)
+    results_list = [{'db_id': DB_ID, 'question': f"question {idx}", 'evidence': '', 'idx': idx,
+                     'gold': "SELECT a FROM t WHERE a = 1", 'pred': "SELECT a FROM t", 'pred_result': idx % 2}
+                    for idx in QUESTIONS]
+    outcome = main.repair_all(results_list, workers=workers)
+    get_log_sink().flush()
+    statistics = {name: {attribute: getattr(repairer, attribute) for attribute in repairer.STATISTIC_LISTS + repairer.STATISTIC_COUNTERS}
+                  for name, repairer in R.named_repairers().items()}
+    statistics['resolved_exception'] = R.resolved_exception
+    # reset `R` for the next run
+    R.drain_statistics()
+    return json.loads(json.dumps([outcome, statistics]))
+
+def test_workers_match_sequential_run(repair, tmp_path, monkeypatch):
+    sequential = run(repair, tmp_path, monkeypatch, 'sequential', workers=1)
+    parallel = run(repair, tmp_path, monkeypatch, 'parallel', workers=2)
+    (results, exceptions, actual_incorrect), statistics = sequential
+    assert [result['idx'] for result in results] == [idx for idx in QUESTIONS if idx % 7]
+    assert exceptions == {'RuntimeError': [[idx, f"question {idx}"] for idx in QUESTIONS if idx % 7 == 0]}
+    assert actual_incorrect == len(QUESTIONS) // 2
+    assert statistics['llm']['llm_call'] == sum(idx % 4 for idx in QUESTIONS)
+    assert parallel == sequential
+
+    assert (tmp_path / 'parallel' / 'sql_logs.jsonl').read_text() == (tmp_path / 'sequential' / 'sql_logs.jsonl').read_text()
+    for stream in ('sql_logs', 'total_overhead'):
+        sequential_log = read_log(tmp_path / 'sequential', stream)
+        parallel_log = read_log(tmp_path / 'parallel', stream)
+        assert list(parallel_log) == list(sequential_log) == QUESTIONS
+        assert [len(entries) for entries in parallel_log.values()] == [len(entries) for entries in sequential_log.values()]
+    assert read_log(tmp_path / 'parallel', 'sql_logs') == read_log(tmp_path / 'sequential', 'sql_logs')
+
+def test_read_log_of_legacy_result_directory(tmp_path):
+    (tmp_path / 'sql_logs').mkdir()
+    (tmp_path / 'sql_logs' / '3.json').write_text(json.dumps([{"step": 0}, {"step": 1}]))
+    (tmp_path / 'sql_logs' / '12.json').write_text(json.dumps({"step": 0}))
+    assert read_log(tmp_path, 'sql_logs') == {3: [{"step": 0}, {"step": 1}], 12: [{"step": 0}]}
+    assert read_log(tmp_path, 'db_overhead') == {}
+    # the JSON Lines stream is preferred once it exists
+    (tmp_path / 'sql_logs.jsonl').write_text(json.dumps({"idx": 3, "step": 2}) + '\n\n')
+    assert read_log(tmp_path, 'sql_logs') == {3: [{"step": 2}]}
@@ -0,0 +1,35 @@
+import pytest
+
+from MapleRepair.utils.nlp import _is_date_rules, _is_time_rules, _is_number_rules
+
+@pytest.mark.parametrize('value', [
+    '2020-01-05', '2020-01-05 10:30:00', '2020-01-05T10:30', '2020-01-05 10:30:00.123', ' 2020-01-05 ',
+    '20200105 103000', '01/05/2020', '2020/01/05', '12-25', '20-01-05',
+    'March 5, 2020', '5th of March', 'Monday', '1998', "1990's", 'yesterday',
+    # accepted by the `infer_format` prefix as well (BIRD codebase_community stores '...:SS.0')
+    '2010-07-19 19:12:12.0', '2020-01-01T10:00:00Z', '2020-01-01 10:00:00+00:00', '2012/3/4',
+])
+def test_dates(value):
+    assert _is_date_rules(value)
+
+@pytest.mark.parametrize('value', [
+    '18-25', '10-15 years', '12-34 Main St', '2020-01-05abc', '2020-13-05', '2020-01-05-07', '2020-01-05.5',
+    'Marchant', 'A-12', '',
+])
+def test_not_dates(value):
+    assert not _is_date_rules(value)
+
+@pytest.mark.parametrize('value', ['10:30', '10:30:15', '10:30:15.250', '10:30:00.5', '9:05', '5 pm', '5:30 a.m.', "7 o'clock", 'noon'])
+def test_times(value):
+    assert _is_time_rules(value)
+
+@pytest.mark.parametrize('value', ['10:30 verse', '25:61', '9:75', '10:30-11:00', 'Room 10:30b', 'pm'])
+def test_not_times(value):
+    assert not _is_time_rules(value)
+
+@pytest.mark.parametrize('value, expected', [
+    ('12', True), ('1,234', True), ('-3.5', True), ('.5', True), ('twenty-one', True), ('one hundred', True),
+    ('1,23', False), ('12abc', False), ('twentyone', False), ('', False),
+])
+def test_numbers(value, expected):
+    assert _is_number_rules(value) == expected
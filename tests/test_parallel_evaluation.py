@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+from data.utils import parallel_evaluation
+from data.utils.parallel_evaluation import estimate_costs, evaluate_chunk, evaluate_sql, parallel_evaluate, schedule, _task_key
+
+@pytest.fixture
+def db_paths(tmp_path):
+    paths = []
+    for name in ('first', 'second'):
+        path = tmp_path / name / f"{name}.sqlite"
+        path.parent.mkdir()
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+            conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"{name} {i % 3}") for i in range(20)])
+        conn.close()
+        paths.append(path)
+    return paths
+
+@pytest.fixture
+def pairs(db_paths):
+    pairs = []
+    for i in range(30):
+        db_path = db_paths[i % 3 % 2]
+        gold = f"SELECT a FROM t WHERE a < {i % 10}"
+        pred = [gold, f"SELECT a FROM t WHERE a <= {i % 10}", "SELECT nope FROM t", f"SELECT a FROM t WHERE a < {i % 10} ORDER BY a DESC"][i % 4]
+        pairs.append((pred, gold, db_path))
+    return pairs
+
+@pytest.fixture(autouse=True)
+def timings_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel_evaluation, 'TIMINGS_PATH', tmp_path / 'timings.json')
+    return tmp_path / 'timings.json'
+
+def test_estimate_costs(db_paths):
+    pairs = [("p0", "g", db_paths[0]), ("p1", "g", db_paths[0]), ("p2", "g", db_paths[1]), ("p3", "g", db_paths[1])]
+    timings = {_task_key(*pairs[0]): 4.0, _task_key(*pairs[2]): 2.0}
+    # own time, else the mean of its database
+    assert estimate_costs(pairs, timings) == [4.0, 4.0, 2.0, 2.0]
+    # else the mean of all known times
+    timings = {_task_key(*pairs[0]): 4.0, _task_key(*pairs[1]): 2.0}
+    assert estimate_costs(pairs, timings) == [4.0, 2.0, 3.0, 3.0]
+    assert estimate_costs(pairs, {}) == [1.0] * 4
+
+@pytest.mark.parametrize('workers', [1, 2, 7])
+def test_schedule(pairs, workers):
+    costs = [1.0 + i % 5 for i in range(len(pairs))]
+    chunks = schedule(pairs, costs, workers)
+    # every task once, chunks of one database, in input order within a chunk
+    assert sorted(idx for _, _, tasks in chunks for idx, _, _ in tasks) == list(range(len(pairs)))
+    target = sum(costs) / (parallel_evaluation.CHUNKS_PER_WORKER * workers)
+    for cost, db_path, tasks in chunks:
+        assert all(str(pairs[idx][2]) == db_path and (pred, gold) == pairs[idx][:2] for idx, pred, gold in tasks)
+        assert [idx for idx, _, _ in tasks] == sorted(idx for idx, _, _ in tasks)
+        assert cost == sum(costs[idx] for idx, _, _ in tasks)
+        # a chunk is closed as soon as it reaches the target
+        assert cost - costs[tasks[-1][0]] < target
+    # longest first
+    assert [cost for cost, _, _ in chunks] == sorted((cost for cost, _, _ in chunks), reverse=True)
+
+def test_evaluate_chunk(pairs):
+    tasks = [(idx, pred, gold) for idx, (pred, gold, db_path) in enumerate(pairs) if db_path == pairs[0][2]]
+    results = evaluate_chunk(pairs[0][2], tasks)
+    assert [(idx, res) for idx, res, _ in results] == [(idx, evaluate_sql(pred, gold, pairs[0][2])) for idx, pred, gold in tasks]
+    assert all(seconds >= 0 for _, _, seconds in results)
+    assert {res for _, res, _ in results} == {0, 1, 'no such column: nope'}
+
+def reversed_chunks(db_path, tasks):
+    # chunks of later tasks complete first
+    time.sleep(0.01 * (40 - tasks[0][0]))
+    return evaluate_chunk(db_path, tasks)
+
+def failing_chunks(db_path, tasks):
+    if 'second' in str(db_path):
+        raise RuntimeError(f"chunk of {len(tasks)} tasks failed")
+    return evaluate_chunk(db_path, tasks)
+
+def crashing_chunks(db_path, tasks):
+    if 'second' in str(db_path):
+        os._exit(1)
+    return evaluate_chunk(db_path, tasks)
+
+def read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_results_are_in_task_order(pairs, tmp_path, monkeypatch, timings_path):
+    expected = [(idx, evaluate_sql(pred, gold, db_path)) for idx, (pred, gold, db_path) in enumerate(pairs)]
+    monkeypatch.setattr(parallel_evaluation, 'evaluate_chunk', reversed_chunks)
+    output_path = tmp_path / 'out.jsonl'
+    assert parallel_evaluate(pairs, workers=3, output_path=output_path) == expected
+    assert read_output(output_path) == [{"id": idx, "res": res} for idx, res in expected]
+    # timings of this run are kept for the next schedule
+    timings = json.loads(timings_path.read_text())
+    assert sorted(timings) == sorted({_task_key(*pair) for pair in pairs})
+
+def test_failed_chunk_is_reported_per_task(pairs, tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel_evaluation, 'evaluate_chunk', failing_chunks)
+    output_path = tmp_path / 'out.jsonl'
+    results = parallel_evaluate(pairs, workers=2, output_path=output_path)
+    assert [idx for idx, _ in results] == list(range(len(pairs)))
+    for idx, res in results:
+        pred, gold, db_path = pairs[idx]
+        if 'second' in str(db_path):
+            assert res.startswith('chunk of') and res.endswith('tasks failed')
+        else:
+            assert res == evaluate_sql(pred, gold, db_path)
+    assert read_output(output_path) == [{"id": idx, "res": res} for idx, res in results]
+
+def test_crashed_worker_is_reported_per_task(pairs, monkeypatch):
+    monkeypatch.setattr(parallel_evaluation, 'evaluate_chunk', crashing_chunks)
+    results = parallel_evaluate(pairs, workers=2)
+    # tasks of the crashed chunk and of chunks that were pending get the error
+    assert [idx for idx, _ in results] == list(range(len(pairs)))
+    assert all(isinstance(res, str) for idx, res in results if 'second' in str(pairs[idx][2]))
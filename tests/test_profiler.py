@@ -0,0 +1,139 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from MapleRepair.config import db_root_path, DATE_FORMATS, TIME_FORMATS
+from MapleRepair.order_check import _is_orderable
+from MapleRepair.utils.profiler import Column_Profile, profile_table, sample_columns, format_coverage, infer_format
+
+DB_ID = 'profiler_test'
+
+COLUMNS = {
+    'name': ['b', 'a', 'c', 'a', None, 'b', 'é', '', 'a', None],
+    'code': ['A-01', 'A-12', 'A-03', 'A-12', 'A-07', None, 'A-01', 'A-99', 'A-12', 'A-03'],
+    'mixed': [1, 2.0, 'x1', 1e20, -0.0, b'\x00\x01', 1, '2', 3.25, 'x1'],
+    'empty': [None] * 10,
+}
+
+@pytest.fixture(scope='module')
+def conn():
+    # in the database root, so that `order_check._is_orderable` reads the same table
+    db_path = Path(db_root_path) / DB_ID / f"{DB_ID}.sqlite"
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (name TEXT, code TEXT, mixed, empty TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", list(zip(*COLUMNS.values())))
+    conn.commit()
+    yield conn
+    conn.close()
+
+def execute_query(conn):
+    return lambda sql: conn.execute(sql).fetchall()
+
+def sql_top_values(conn, column, k):
+    return [value for value, in conn.execute(f"SELECT `{column}` FROM t GROUP BY `{column}` ORDER BY COUNT(*) DESC LIMIT {k}")]
+
+def sql_length_and_count(conn, column):
+    return conn.execute(f"SELECT SUM(LENGTH(v)), COUNT(v) FROM (SELECT DISTINCT `{column}` AS v FROM t WHERE `{column}` IS NOT NULL)").fetchone()
+
+def sql_is_orderable(column):
+    try:
+        return _is_orderable(DB_ID, 't', column)
+    except Exception:
+        # `Database.init_orderable` treats failures as not orderable
+        return False
+
+def assert_matches_sql(conn, profile):
+    column = profile.name
+    for k in (1, 2, 3, 100):
+        assert profile.top_values(k) == sql_top_values(conn, column, k)
+    assert (profile.distinct_length_sum(), profile.distinct_count()) == sql_length_and_count(conn, column)
+    distinct = [value for value, in conn.execute(f"SELECT DISTINCT `{column}` FROM t WHERE `{column}` IS NOT NULL")]
+    assert sorted(map(repr, profile.distinct_values())) == sorted(map(repr, distinct))
+    assert profile.is_orderable() == sql_is_orderable(column)
+
+@pytest.mark.parametrize('column', list(COLUMNS))
+def test_profile_matches_sql(conn, column):
+    profile = profile_table(conn, 't', execute_query=execute_query(conn)).column(column)
+    assert profile.complete
+    assert_matches_sql(conn, profile)
+
+@pytest.mark.parametrize('column', list(COLUMNS))
+@pytest.mark.parametrize('caps', [{'max_distinct': 2}, {'max_length': 3}])
+def test_truncated_profile_matches_sql(conn, column, caps):
+    profile = Column_Profile(column, '', 't', execute_query(conn), **caps)
+    for value, in conn.execute(f"SELECT `{column}` FROM t"):
+        profile.add(value)
+    assert_matches_sql(conn, profile)
+
+@pytest.mark.parametrize('column', list(COLUMNS))
+@pytest.mark.parametrize('caps', [{'max_distinct': 2}, {'max_length': 3}, {}])
+def test_grouped_profile_matches_sql(conn, column, caps):
+    # as built by `profile_table`, from the groups of the column
+    profile = Column_Profile(column, '', 't', execute_query(conn), **caps)
+    for value, count in conn.execute(f"SELECT `{column}`, COUNT(*) FROM t GROUP BY `{column}`"):
+        profile.add(value, count)
+    assert_matches_sql(conn, profile)
+
+def test_truncation(conn):
+    profile = Column_Profile('name', 'TEXT', max_distinct=4)
+    for value in ['a', 'b', None, 'c', 'd', 'a']:
+        profile.add(value)
+    assert profile.complete and profile.distinct_count() == 4
+    profile.add('e')
+    assert profile.truncated and not profile.complete
+    profile = Column_Profile('name', 'TEXT', max_length=5)
+    for value in ['ab', 'cd', 'ab', 'e']:
+        profile.add(value)
+    assert profile.distinct_length_sum() == 5
+    profile.add('f')
+    assert profile.truncated
+
+def test_compacted_profile(conn):
+    queries = []
+    def query(sql):
+        queries.append(sql)
+        return conn.execute(sql).fetchall()
+    profile = profile_table(conn, 't', ['name'], query).column('name')
+    profile.compact(3)
+    assert profile.counts is None
+    assert profile.top_values(2) == sql_top_values(conn, 'name', 2)
+    assert profile.top_values(3) == sql_top_values(conn, 'name', 3)
+    assert not queries
+    assert profile.top_values(5) == sql_top_values(conn, 'name', 5)
+    assert len(queries) == 1
+
+def test_compacted_small_column_is_not_queried(conn):
+    profile = profile_table(conn, 't', ['empty'], execute_query=None).column('empty')
+    profile.compact(100)
+    assert profile.top_values(100) == [None]
+
+def test_default_columns(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS u (user_id INTEGER, home_url TEXT, score REAL)")
+    assert sorted(profile_table(conn, 'u').columns) == ['home_url', 'score']
+    assert profile_table(conn, 'U').column('SCORE') is not None
+
+def test_sample_columns():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE d (day TEXT, late TEXT, never TEXT, n INTEGER)")
+    conn.executemany("INSERT INTO d VALUES (?, ?, ?, ?)",
+                     [(f"2020-01-{i:02d}", None, '', i) for i in range(1, 31)] + [('2020-02-01', '10:30', None, 0)])
+    queries = []
+    def query(sql):
+        queries.append(sql)
+        return conn.execute(sql).fetchall()
+    samples = sample_columns(query, 'd', ['day', 'late', 'never', 'n'], samples=3, scan_rows=10)
+    assert samples == {'day': ['2020-01-01', '2020-01-02', '2020-01-03'], 'late': ['10:30'], 'never': [], 'n': ['1', '2', '3']}
+    # the scan, then one query for each column without a value in the scanned rows
+    assert len(queries) == 3
+
+def test_infer_format():
+    values = ['2020-01-05', '2020-01-06 10:30:00', '2020-01-07', 'unknown']
+    assert format_coverage(values, DATE_FORMATS)[DATE_FORMATS.index((r'(\d{4})-(\d{2})-(\d{2})', '%Y-%m-%d'))] == 0.75
+    assert infer_format(values, DATE_FORMATS) == ((r'(\d{4})-(\d{2})-(\d{2})', '%Y-%m-%d'), 0.75)
+    # ties go to the more specific (earlier) format
+    assert infer_format(['10:30:15'], TIME_FORMATS)[0] == (r'(\d{2}):(\d{2}):(\d{2})', '%H:%M:%S')
+    assert infer_format(['n/a'], TIME_FORMATS) == (None, 0.0)
+    assert infer_format([], TIME_FORMATS) == (None, 0.0)
@@ -0,0 +1,120 @@
+import functools
+import itertools
+import random
+import sqlite3
+
+import pytest
+
+from MapleRepair.utils import result_compare
+from MapleRepair.utils.result_compare import Fingerprint_Overflow, fingerprint_rows, query_fingerprint, results_match
+
+# values SQLite returns as distinct python values, incl. the ones python sets equate (1, 1.0 and -0.0)
+VALUES = [None, '', 0, 1, 1.0, -0.0, '1', 'a', 'A', 2.5, 2**53 + 1, float(2**53), b'1', 'é']
+
+def set_match(pred, gold, permute):
+    # the comparison before fingerprints: set(pred) == set(gold), optionally for some column order of pred
+    if set(pred) == set(gold):
+        return True
+    if not permute or not pred or not gold or len(pred[0]) != len(gold[0]):
+        return False
+    return any(set(tuple(row[j] for j in permutation) for row in pred) == set(gold)
+               for permutation in itertools.permutations(range(len(pred[0]))))
+
+def variant(rng, rows):
+    """
+    A result like `rows`: the same set written differently, or a small change of it.
+    """
+    rows = list(rows)
+    n_columns = len(rows[0]) if rows else 2
+    change = rng.choice(['duplicate', 'reorder', 'permute', 'null', 'numeric', 'replace', 'drop', 'add', 'columns', 'other'])
+    if change == 'duplicate' and rows:
+        rows += rng.choices(rows, k=rng.randint(1, len(rows)))
+    elif change == 'reorder':
+        rng.shuffle(rows)
+    elif change == 'permute':
+        permutation = list(range(n_columns))
+        rng.shuffle(permutation)
+        rows = [tuple(row[j] for j in permutation) for row in rows]
+    elif change == 'null':
+        # NULL and '' swapped
+        swap = {None: '', '': None}
+        rows = [tuple(swap.get(value, value) if isinstance(value, (str, type(None))) else value for value in row) for row in rows]
+    elif change == 'numeric':
+        # 1 and 1.0, equal in python sets
+        rows = [tuple(float(value) if isinstance(value, int) and abs(value) < 2**53 else value for value in row) for row in rows]
+    elif change == 'replace' and rows:
+        i = rng.randrange(len(rows))
+        row = list(rows[i])
+        row[rng.randrange(n_columns)] = rng.choice(VALUES)
+        rows[i] = tuple(row)
+    elif change == 'drop' and rows:
+        del rows[rng.randrange(len(rows))]
+    elif change == 'add':
+        rows.append(tuple(rng.choice(VALUES) for _ in range(n_columns)))
+    elif change == 'columns':
+        rows = [row + (row[0],) for row in rows] if rows else rows
+    elif change == 'other':
+        rows = random_rows(rng, n_columns)
+    return rows
+
+def random_rows(rng, n_columns):
+    return [tuple(rng.choice(VALUES) for _ in range(n_columns)) for _ in range(rng.randint(0, 12))]
+
+def store(conn, table, rows, n_columns):
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    # untyped columns, values are returned as stored
+    conn.execute(f"CREATE TABLE {table}({', '.join(f'c{i}' for i in range(n_columns))})")
+    if rows:
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * n_columns)})", rows)
+    return [tuple(row) for row in conn.execute(f"SELECT * FROM {table}")]
+
+def compare(conn, permute, exact):
+    pred = query_fingerprint(conn, "SELECT * FROM pred", per_column=permute)
+    gold = query_fingerprint(conn, "SELECT * FROM gold", per_column=permute)
+    return results_match(conn, "SELECT * FROM pred", pred, "SELECT * FROM gold", gold, permute=permute, exact=exact)
+
+@pytest.mark.parametrize('permute', [False, True])
+@pytest.mark.parametrize('exact', [False, True])
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_set_comparison(permute, exact, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(':memory:')
+    for _ in range(25):
+        n_columns = rng.randint(1, 3)
+        gold_rows = random_rows(rng, n_columns)
+        pred_rows = variant(rng, gold_rows)
+        if rng.random() < 0.5:
+            pred_rows = variant(rng, pred_rows)
+        gold = store(conn, 'gold', gold_rows, n_columns)
+        pred = store(conn, 'pred', pred_rows, len(pred_rows[0]) if pred_rows else n_columns)
+        assert compare(conn, permute, exact) == set_match(pred, gold, permute), (pred, gold)
+
+@pytest.mark.parametrize('permute', [False, True])
+def test_large_results(permute, monkeypatch):
+    conn = sqlite3.connect(':memory:')
+    gold = [(i % 5000, f"v{i % 5000}", None if i % 7 else '') for i in range(20000)]
+    store(conn, 'gold', gold, 3)
+    rows = gold[::-1]
+    store(conn, 'pred', [(b, a, c) for a, b, c in rows] if permute else rows, 3)
+    assert compare(conn, permute, exact=False) == set_match(rows, gold, permute=False)
+    # beyond the memory cap, SQLite removes the duplicates
+    monkeypatch.setattr(result_compare, 'fingerprint_rows', functools.partial(fingerprint_rows, max_distinct=1000))
+    assert compare(conn, permute, exact=False)
+    assert compare(conn, permute, exact=True)
+    store(conn, 'pred', rows[1:] + [(1, 'v1', None)], 3)
+    assert compare(conn, False, exact=False) == set_match(rows[1:] + [(1, 'v1', None)], gold, permute=False)
+
+def test_fingerprint_overflow():
+    rows = [(i,) for i in range(10)]
+    with pytest.raises(Fingerprint_Overflow):
+        fingerprint_rows(1, iter([rows]), max_distinct=5)
+    assert fingerprint_rows(1, iter([rows]), max_distinct=5, assume_distinct=True).key() == fingerprint_rows(1, iter([rows])).key()
+
+def test_rows_out():
+    rows = [(1, 'a'), (1.0, 'a'), (2, None)]
+    rows_out = []
+    fingerprint = fingerprint_rows(2, iter([rows]), rows_out=rows_out)
+    assert rows_out == [(1, 'a'), (2, None)] and fingerprint.count == 2
+    rows_out = []
+    fingerprint_rows(2, iter([rows]), rows_out=rows_out, rows_limit=1)
+    assert rows_out == []
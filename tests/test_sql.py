@@ -0,0 +1,187 @@
+import pytest
+import sqlglot
+import sqlglot.expressions
+
+import MapleRepair.SQL as SQL_module
+from MapleRepair.SQL import SQL, parse_statement
+
+DB_ID = 'sql_test'
+
+SCHEMA = """
+CREATE TABLE customer (id INTEGER PRIMARY KEY, name TEXT, city TEXT);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customer(id), amount REAL);
+INSERT INTO customer VALUES (1, 'Alice', 'Paris'), (2, 'Bob', 'Rome');
+INSERT INTO orders VALUES (1, 1, 10.5), (2, 1, 20), (3, 2, 5);
+"""
+
+# statement -> (statement, executable, execution_result, qualified, unaliased, parsed, used columns)
+# as computed when every stage ran in the constructor
+EAGER = {
+    "SELECT name FROM customer WHERE city = 'Paris'": (
+        "SELECT name FROM customer WHERE city = 'Paris'", True, None, True, True,
+        'SELECT "customer"."name" AS "name" FROM "customer" AS "customer" WHERE "customer"."city" = \'Paris\'',
+        {'customer': ['city', 'name']}),
+    "select c.name, o.amount from customer as c join orders as o on c.id = o.customer_id": (
+        "SELECT c.name, o.amount FROM customer AS c JOIN orders AS o ON c.id = o.customer_id", True, None, True, True,
+        'SELECT "c"."name" AS "name", "o"."amount" AS "amount" FROM "customer" AS "c" JOIN "orders" AS "o" ON "c"."id" = "o"."customer_id"',
+        {'customer': ['id', 'name'], 'orders': ['amount', 'customer_id']}),
+    "SELECT id FROM customer JOIN orders ON customer.id = orders.customer_id": (
+        "SELECT id FROM customer JOIN orders ON customer.id = orders.customer_id", False, "ambiguous column name: id", False, False,
+        "SELECT id FROM customer JOIN orders ON customer.id = orders.customer_id",
+        {}),
+    "SELECT nam FROM customer": (
+        "SELECT nam FROM customer", False, "no such column: nam", False, False,
+        "SELECT nam FROM customer",
+        {}),
+    "SELEC name FRM": (
+        "SELEC name FRM", False, 'near "SELEC": syntax error', False, False,
+        None,
+        {}),
+    "SELECT t.total FROM (SELECT customer_id, SUM(amount) AS total FROM orders GROUP BY customer_id) AS t": (
+        "SELECT t.total FROM (SELECT customer_id, SUM(amount) AS total FROM orders GROUP BY customer_id) AS t", True, None, True, False,
+        'SELECT "t"."total" AS "total" FROM (SELECT "orders"."customer_id" AS "customer_id", SUM("orders"."amount") AS "total" FROM "orders" AS "orders" GROUP BY "orders"."customer_id") AS "t"',
+        {}),
+    "SELECT name FROM customer WHERE id IN (SELECT customer_id FROM orders WHERE amount > 10)": (
+        "SELECT name FROM customer WHERE id IN (SELECT customer_id FROM orders WHERE amount > 10)", True, None, True, True,
+        'SELECT "customer"."name" AS "name" FROM "customer" AS "customer" WHERE "customer"."id" IN (SELECT "orders"."customer_id" AS "customer_id" FROM "orders" AS "orders" WHERE "orders"."amount" > 10)',
+        {'customer': ['id', 'name'], 'orders': ['amount', 'customer_id']}),
+    'SELECT name FROM customer WHERE city = "Paris"': (
+        "SELECT name FROM customer WHERE city = `Paris`", False, "no such column: Paris", False, False,
+        'SELECT name FROM customer WHERE city = "Paris"',
+        {}),
+}
+
+@pytest.fixture
+def db(sqlite_database, monkeypatch):
+    db = sqlite_database(DB_ID, SCHEMA)
+    # EXPLAIN of the exec stage
+    db.explained = []
+    is_executable = db.is_executable
+    def counting_is_executable(query, idx=None):
+        db.explained.append(query)
+        return is_executable(query, idx)
+    monkeypatch.setattr(db, 'is_executable', counting_is_executable)
+    return db
+
+def observed(sql:SQL):
+    return (sql.statement, sql.executable, sql.execution_result, sql.qualified, sql.unaliased,
+            sql.parsed.sql() if sql.parsed is not None else None,
+            {table: sorted(columns) for table, columns in sql.get_used_columns().items()})
+
+@pytest.mark.parametrize('statement', list(EAGER))
+def test_matches_eager_analysis(db, statement):
+    assert observed(SQL(statement, db_id=DB_ID)) == EAGER[statement]
+    # again, from the parse and analysis caches
+    assert observed(SQL(statement, db_id=DB_ID)) == EAGER[statement]
+
+def test_stages_run_on_first_read(db):
+    sql = SQL("select name from customer", db_id=DB_ID)
+    assert sql.statement == "SELECT name FROM customer"
+    assert sql.parsable
+    assert not db.explained
+    assert sql.executable and sql.qualified
+    assert db.explained == ["SELECT name FROM customer"]
+
+def test_parsable_does_not_explain(db):
+    assert not SQL("SELEC name FRM", db_id=DB_ID).parsable
+    assert SQL("SELECT nam FROM customer", db_id=DB_ID).parsable
+    assert not db.explained
+
+def test_update_invalidates_all_stages(db):
+    sql = SQL("SELECT name FROM customer", db_id=DB_ID)
+    assert sql.executable and sql.unaliased
+    sql.partial_result = [('Alice',)]
+    sql.update("SELECT nam FROM customer", 'test', 'no such column')
+    assert sql.partial_result is None
+    assert sql.repairer_log[-1]['before'] == "SELECT name FROM customer"
+    assert not sql.executable and sql.execution_result == "no such column: nam"
+    assert not sql.qualified and not sql.unaliased
+    assert sql.parsed.sql() == "SELECT nam FROM customer"
+    sql.update("SELECT city FROM customer", 'test', '')
+    assert observed(sql)[1:] == (True, None, True, True,
+                                 'SELECT "customer"."city" AS "city" FROM "customer" AS "customer"', {'customer': ['city']})
+    assert db.explained == ["SELECT name FROM customer", "SELECT nam FROM customer", "SELECT city FROM customer"]
+
+def test_partial_update_keeps_modified_tree(db):
+    sql = SQL("SELECT name FROM customer WHERE city = 'Paris'", db_id=DB_ID)
+    tree = sql.parsed
+    tree.find(sqlglot.expressions.Literal).replace(sqlglot.expressions.Literal.string('Rome'))
+    sql.partial_update()
+    # the statement follows the modified tree, which is analyzed again instead of parsed from text
+    assert sql.statement == "SELECT `customer`.`name` AS `name` FROM `customer` AS `customer` WHERE `customer`.`city` = 'Rome'"
+    assert sql.parsed is tree
+    assert sql.executable and sql.qualified and sql.unaliased
+    assert sql.execute() == [('Bob',)]
+    assert db.explained[-1] == sql.statement
+    # a modification the database rejects
+    tree.find(sqlglot.expressions.Column).this.set('this', 'nam')
+    sql.partial_update()
+    assert not sql.executable and "no such column" in sql.execution_result
+    assert not sql.qualified and sql.parsed is tree
+
+def test_partial_update_is_not_cached_as_text(db):
+    # the analysis of a modified tree must not answer for the statement it prints as
+    sql = SQL("SELECT name FROM customer WHERE id = 1", db_id=DB_ID)
+    sql.parsed.find(sqlglot.expressions.Literal).replace(sqlglot.expressions.Literal.number(2))
+    sql.partial_update()
+    assert sql.qualified
+    assert SQL_module._analysis_cache.get((DB_ID, sql.statement)) is None
+
+def rename_columns(tree):
+    for column in tree.find_all(sqlglot.expressions.Column):
+        column.this.set('this', 'changed')
+
+@pytest.mark.parametrize('statement', ["SELECT name FROM customer WHERE city = 'Paris'", "SELECT nam FROM customer"])
+def test_cached_trees_are_copied(db, statement):
+    expected = SQL(statement, db_id=DB_ID).parsed.sql()
+    rename_columns(SQL(statement, db_id=DB_ID).parsed)
+    assert SQL(statement, db_id=DB_ID).parsed.sql() == expected
+    # qualify rewrites in place: the parse cache keeps the tree as parsed
+    assert SQL_module._parse(statement)[0].sql() == sqlglot.parse_one(statement).sql()
+
+def test_parse_statement_is_a_copy():
+    statement = "SELECT name FROM customer WHERE city = 'Paris'"
+    rename_columns(parse_statement(statement))
+    assert parse_statement(statement).sql() == statement
+    assert parse_statement("SELEC name FRM") is None
+
+def test_cached_scope_refers_to_the_copy(db):
+    statement = "SELECT name FROM customer WHERE id IN (SELECT customer_id FROM orders)"
+    first, second = SQL(statement, db_id=DB_ID), SQL(statement, db_id=DB_ID)
+    assert first.parsed is not second.parsed
+    for sql in (first, second):
+        assert sql.scope_root.expression is sql.parsed
+        nodes = {id(node) for node in sql.parsed.walk()}
+        assert all(id(scope.expression) in nodes for scope in sql.scope_root.traverse())
+
+def test_fork_is_isolated(db):
+    statement = "SELECT name FROM customer WHERE id IN (SELECT customer_id FROM orders)"
+    sql = SQL(statement, db_id=DB_ID)
+    sql.repair_prompt.add('prompt')
+    sql.update(statement, 'test', '')
+    expected = observed(sql)
+    scope_expressions = [id(scope.expression) for scope in sql.scope_root.traverse()]
+    
+    fork = sql.fork()
+    assert observed(fork) == expected and fork.repairer_log == [] and fork.repair_prompt == set()
+    assert fork.parsed is not sql.parsed and fork.scope_root is not sql.scope_root
+    rename_columns(fork.parsed)
+    fork.repair_prompt.add('fork prompt')
+    fork.partial_update()
+    assert not fork.executable
+    assert observed(sql) == expected
+    assert [id(scope.expression) for scope in sql.scope_root.traverse()] == scope_expressions
+    assert sql.repair_prompt == {'prompt'} and len(sql.repairer_log) == 1
+    
+    fork = sql.fork()
+    fork.update("SELECT city FROM customer", 'test', '')
+    assert fork.statement == "SELECT city FROM customer" and len(fork.repairer_log) == 1
+    assert observed(sql) == expected and len(sql.repairer_log) == 1
+
+def test_fork_of_unanalyzed_sql(db):
+    sql = SQL("SELECT name FROM customer", db_id=DB_ID)
+    fork = sql.fork()
+    rename_columns(fork.parsed)
+    fork.partial_update()
+    assert sql.parsed.sql() == 'SELECT "customer"."name" AS "name" FROM "customer" AS "customer"'
+    assert SQL("SELEC name FRM", db_id=DB_ID).fork().parsed is None
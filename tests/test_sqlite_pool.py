@@ -0,0 +1,106 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+
+from MapleRepair.Customized_Exception import QueryTimedOut
+from MapleRepair.utils.deadline import Query_Deadline
+from MapleRepair.utils.sqlite_pool import SQLite_Connection_Pool, connection_pool
+
+SLOW_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+def make_db(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (a INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+    return path
+
+@pytest.fixture
+def db_path(tmp_path):
+    return make_db(tmp_path / 'pool.sqlite')
+
+def is_open(conn):
+    try:
+        conn.execute("SELECT 1")
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+def test_connections_are_reused(db_path):
+    pool = SQLite_Connection_Pool(pool_size=4)
+    with pool.connection(db_path) as first:
+        with pool.connection(db_path) as second:
+            # checked out by one user at a time
+            assert first is not second
+    with pool.connection(db_path) as conn:
+        assert conn in (first, second)
+        assert conn.execute("SELECT a FROM t").fetchall() == [(1,)]
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            conn.execute("INSERT INTO t VALUES (2)")
+
+@pytest.mark.parametrize('error', [sqlite3.OperationalError('no such table'), QueryTimedOut('deadline', 1)])
+def test_reused_after_query_errors(db_path, error):
+    pool = SQLite_Connection_Pool(pool_size=4)
+    with pytest.raises(type(error)):
+        with pool.connection(db_path) as conn:
+            raise error
+    with pool.connection(db_path) as again:
+        assert again is conn
+
+def test_reused_after_deadline(db_path):
+    pool = SQLite_Connection_Pool(pool_size=4)
+    with pytest.raises(QueryTimedOut):
+        with pool.connection(db_path) as conn:
+            with Query_Deadline(conn, 0.1):
+                conn.execute(SLOW_SQL).fetchall()
+    with pool.connection(db_path) as again:
+        assert again is conn
+        assert again.execute("SELECT a FROM t").fetchall() == [(1,)]
+
+@pytest.mark.parametrize('error', [RuntimeError('unknown state'), KeyboardInterrupt()])
+def test_closed_after_other_errors(db_path, error):
+    pool = SQLite_Connection_Pool(pool_size=4)
+    with pytest.raises(type(error)):
+        with pool.connection(db_path) as conn:
+            raise error
+    assert not is_open(conn)
+    with pool.connection(db_path) as again:
+        assert again is not conn
+
+def test_least_recently_used_database_is_closed(tmp_path):
+    pool = SQLite_Connection_Pool(pool_size=2)
+    paths = [make_db(tmp_path / f"{i}.sqlite") for i in range(3)]
+    conns = []
+    for path in paths[:2]:
+        with pool.connection(path) as conn:
+            conns.append(conn)
+    # touch the first database, the second one is the least recently used now
+    with pool.connection(paths[0]):
+        pass
+    with pool.connection(paths[2]) as conn:
+        conns.append(conn)
+    assert [is_open(conn) for conn in conns] == [True, False, True]
+    pool.close()
+    assert not any(is_open(conn) for conn in conns)
+
+def child_uses_pool(db_path, parent_conn_id, queue):
+    # the parent's idle connection is not handed out in the child
+    idle = connection_pool._idle_count
+    with connection_pool.connection(db_path) as conn:
+        queue.put((idle, id(conn) == parent_conn_id, conn.execute("SELECT a FROM t").fetchall()))
+
+def test_child_starts_with_empty_pool(db_path):
+    with connection_pool.connection(db_path) as parent_conn:
+        pass
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=child_uses_pool, args=(db_path, id(parent_conn), queue))
+    process.start()
+    result = queue.get(timeout=30)
+    process.join(30)
+    assert process.exitcode == 0
+    assert result == (0, False, [(1,)])
+    # the parent's connection is untouched by the child
+    with connection_pool.connection(db_path) as conn:
+        assert conn is parent_conn and is_open(conn)
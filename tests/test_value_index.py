@@ -0,0 +1,47 @@
+import pickle
+
+from MapleRepair.utils.ds import Value_Index
+
+SCHEMA = {
+    'customer': {
+        'name': {'distinct_val': {'Alice', 'Bob', 'alice'}},
+        'city': {'distinct_val': {'Paris', 'Berlin', 'Parma'}},
+        'age': {'distinct_val': None},
+    },
+    'store': {
+        'city': {'distinct_val': {'paris', 'Rome'}},
+        'owner': {'distinct_val': {'Bob'}},
+    },
+}
+
+def scan(value):
+    # the per-column comparison the index replaces
+    return [(table, column, val) for table in SCHEMA for column, info in SCHEMA[table].items()
+            if info['distinct_val'] is not None for val in info['distinct_val'] if val.lower() == value.lower()]
+
+def test_lookup_matches_scan():
+    index = Value_Index(SCHEMA)
+    for value in ['alice', 'ALICE', 'Bob', 'paris', 'Rome', 'Madrid', '']:
+        assert sorted(index.lookup(value)) == sorted(scan(value))
+    # columns in schema order
+    assert [(table, column) for table, column, _ in index.lookup('PARIS')] == [('customer', 'city'), ('store', 'city')]
+
+def test_prefix():
+    index = Value_Index(SCHEMA)
+    assert index.prefix('PAR') == ['paris', 'parma']
+    assert index.prefix('z') == []
+    assert index.prefix('') == index.keys
+
+def test_ngram():
+    index = Value_Index(SCHEMA)
+    assert index.ngram('Pariss', limit=1) == ['paris']
+    assert set(index.ngram('par', limit=10)) == {'paris', 'parma'}
+    assert index.ngram('xyz') == []
+
+def test_ngrams_are_not_pickled():
+    index = Value_Index(SCHEMA)
+    index.ngram('paris')
+    restored = pickle.loads(pickle.dumps(index))
+    assert restored._ngrams is None
+    assert restored.lookup('rome') == [('store', 'city', 'Rome')]
+    assert restored.ngram('pariss', limit=1) == ['paris']
@@ -0,0 +1,172 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from MapleRepair.utils import vector_store
+from MapleRepair.utils.cache import LRU_Cache
+from MapleRepair.utils.vector_store import Numpy_Vector_Store, build_ivf, sync_collection
+
+DIMENSIONS = 16
+
+def embedding(text:str) -> np.ndarray:
+    # deterministic stand-in for the fastembed model: equal texts, equal vectors
+    seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=4).digest(), 'little')
+    vector = np.random.default_rng(seed).standard_normal(DIMENSIONS).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class Hash_Vector_Store(Numpy_Vector_Store):
+    def embed(self, documents):
+        return np.stack([embedding(document) for document in documents])
+
+@pytest.fixture
+def store(tmp_path):
+    return Hash_Vector_Store(tmp_path / 'vectors')
+
+def add(store, name, documents, ids=None):
+    store.add(name, list(documents), [{'n': i} for i, _ in enumerate(documents)], ids or list(documents))
+
+def search(store, name, text, limit):
+    return [hit.document for hit in store.search_batch(name, [embedding(text)], limit)[0]]
+
+def test_add_search_delete(store):
+    name = 'db/table.column'
+    assert not store.collection_exists(name)
+    add(store, name, ['apple', 'banana', 'cherry'])
+    assert store.collection_exists(name) and store.count(name) == 3
+    assert search(store, name, 'banana', 1) == ['banana']
+    add(store, name, ['banana', 'date'])
+    assert store.count(name) == 4
+    assert store.points(name)['banana'] == {'n': 0, 'document': 'banana'}
+    store.delete(name, ['apple', 'unknown'])
+    assert sorted(store.points(name)) == ['banana', 'cherry', 'date']
+    store.delete_collection(name)
+    assert not store.collection_exists(name)
+
+def test_writes_switch_versions(store):
+    add(store, 'c', ['apple', 'banana'])
+    path = store._path('c')
+    first = (path / 'CURRENT').read_text()
+    reader = store._collection('c')
+    add(store, 'c', ['cherry'])
+    second = (path / 'CURRENT').read_text()
+    assert first != second
+    # only the current version is kept, an earlier reader keeps its memory map
+    assert sorted(entry.name for entry in path.iterdir()) == sorted(['CURRENT', second])
+    assert list(reader.ids) == ['apple', 'banana'] and reader.vectors.shape == (2, DIMENSIONS)
+    assert store.count('c') == 3
+
+def test_unfinished_write_is_invisible(store, tmp_path):
+    add(store, 'c', ['apple', 'banana'])
+    path = store._path('c')
+    # a writer that died before switching CURRENT
+    (path / 'partial').mkdir()
+    np.save(path / 'partial' / 'vectors.npy', np.zeros((1, DIMENSIONS), dtype=np.float32))
+    other = Hash_Vector_Store(tmp_path / 'vectors')
+    assert other.count('c') == 2
+    assert search(other, 'c', 'apple', 1) == ['apple']
+
+def test_other_store_sees_writes(store, tmp_path):
+    other = Hash_Vector_Store(tmp_path / 'vectors')
+    add(store, 'c', ['apple'])
+    assert other.count('c') == 1
+    add(store, 'c', ['banana'])
+    assert other.count('c') == 2
+
+def test_ivf_search(store, monkeypatch):
+    monkeypatch.setattr(vector_store, 'vector_ivf_min_points', 100)
+    monkeypatch.setattr(vector_store, 'vector_ivf_nprobe', 4)
+    documents = [f"value {i}" for i in range(400)]
+    add(store, 'c', documents)
+    collection = store._collection('c')
+    assert collection.ivf is not None
+    assert os.path.exists(collection.path / 'ivf.npz')
+    for document in documents[:20]:
+        assert search(store, 'c', document, 1) == [document]
+
+def test_build_ivf_partitions_all_points():
+    vectors = np.stack([embedding(str(i)) for i in range(200)])
+    ivf = build_ivf(vectors, 10)
+    assert ivf['offsets'][0] == 0 and ivf['offsets'][-1] == 200
+    assert sorted(ivf['order'].tolist()) == list(range(200))
+
+class Counting_Vector_Store(Hash_Vector_Store):
+    def __init__(self, root):
+        super().__init__(root)
+        self.embedded = []
+
+    def embed(self, documents):
+        self.embedded.extend(documents)
+        return super().embed(documents)
+
+@pytest.fixture
+def counting_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, 'db_cache_dir', str(tmp_path / 'cache'))
+    return Counting_Vector_Store(tmp_path / 'vectors')
+
+def sync(store, documents):
+    # documents: id -> (document, metadata)
+    ids = list(documents)
+    return sync_collection(store, 'c', [documents[i][0] for i in ids], [documents[i][1] for i in ids], ids)
+
+def test_sync_embeds_only_changes(counting_store):
+    documents = {'1': ('apple', {'t': 'a'}), '2': ('banana', {'t': 'b'}), '3': ('cherry', {'t': 'c'})}
+    assert sync(counting_store, documents) == (3, 0)
+    assert sync(counting_store, documents) == (0, 0)
+    documents['2'] = ('blueberry', {'t': 'b'})
+    del documents['3']
+    assert sync(counting_store, documents) == (1, 1)
+    assert counting_store.embedded == ['apple', 'banana', 'cherry', 'blueberry']
+    assert {point_id: payload['document'] for point_id, payload in counting_store.points('c').items()} == {'1': 'apple', '2': 'blueberry'}
+
+def test_sync_metadata_change_reembeds(counting_store):
+    assert sync(counting_store, {'1': ('apple', {'t': 'a'})}) == (1, 0)
+    assert sync(counting_store, {'1': ('apple', {'t': 'z'})}) == (1, 0)
+    assert counting_store.points('c')['1']['t'] == 'z' and counting_store.count('c') == 1
+
+def test_sync_adopts_collection_without_manifest(counting_store):
+    documents = {'1': ('apple', {}), '2': ('banana', {})}
+    sync(counting_store, documents)
+    vector_store._manifest_path(counting_store, 'c').unlink()
+    # stored under other ids: kept as they are
+    assert sync(counting_store, {'x': ('apple', {}), 'y': ('banana', {})}) == (0, 0)
+    assert counting_store.embedded == ['apple', 'banana']
+    assert sorted(counting_store.points('c')) == ['1', '2']
+
+def test_sync_rebuilds_other_model(counting_store, monkeypatch):
+    sync(counting_store, {'1': ('apple', {})})
+    monkeypatch.setattr(vector_store, 'vector_embedding_model', 'other-model')
+    assert sync(counting_store, {'1': ('apple', {})}) == (1, 0)
+    assert counting_store.embedded == ['apple', 'apple']
+
+class Fake_Model():
+    def __init__(self):
+        self.embedded = []
+
+    def query_embed(self, texts):
+        self.embedded.extend(texts)
+        return [embedding(text) for text in texts]
+
+@pytest.fixture
+def model(monkeypatch):
+    model = Fake_Model()
+    monkeypatch.setattr(vector_store, '_embedding_model', lambda model_name: model)
+    monkeypatch.setattr(vector_store, '_query_embeddings', LRU_Cache(16))
+    return model
+
+def test_query_embeddings_are_memoized(store, model):
+    first = store.embed_queries(['apple', 'banana', 'apple'])
+    assert model.embedded == ['apple', 'banana']
+    assert np.array_equal(first[0], first[2])
+    second = store.embed_queries(['banana', 'cherry'])
+    assert model.embedded == ['apple', 'banana', 'cherry']
+    assert np.array_equal(first[1], second[0])
+
+def test_search_batch_matches_single_queries(store, model):
+    add(store, 'c', [f"value {i}" for i in range(50)])
+    texts = ['value 3', 'value 17', 'something else']
+    batch = store.search_batch('c', store.embed_queries(texts), 5)
+    for text, hits in zip(texts, batch):
+        assert [hit.id for hit in hits] == [hit.id for hit in store.query('c', text, 5)]
+        assert [hit.score for hit in hits] == pytest.approx([hit.score for hit in store.query('c', text, 5)], abs=1e-6)